@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+
+"""
+wxPython interface for check_fastq.py.  Only imported when check_fastq.py
+is started without any FASTQ files.
+"""
+
+import os
+import wx
+import wx.richtext
+
+from check_fastq import VERSION, check_fastq
+
+#----gui.py-------------------------------------------------------------------
+
+class TestFastQ_App(wx.App):
+  def __init__(self, args, **kwargs):
+    self.args = args
+    wx.App.__init__(self, kwargs)
+
+  def OnInit(self):
+    self.frame = MainFrame(self.args)
+    self.frame.Show()
+    self.SetTopWindow(self.frame)
+    return True
+
+class MainRTC(wx.richtext.RichTextCtrl):
+  def __init__(self, parent):
+    wx.richtext.RichTextCtrl.__init__(self, parent, -1, "",
+            style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+    self.Bind(wx.EVT_MOUSE_EVENTS, self.DoNothing)
+    self.current_pos = 0
+    self.previous_pos = 0
+
+  def DoNothing(self, event):
+    pass
+
+  def AddIntroBlurb(self):
+    intro_blurb = "Check gzipped FASTQ files for corruption and get a"
+    intro_blurb += " count of the number of sequences in each file."
+    intro_items = [
+     " Drop 'Undetermined' FASTQ files here,"+\
+     " then click 'Check FASTQ files' button.",
+     " Each file takes 4-8 minutes to check.",
+    ]
+    self.BeginFontSize(10)
+    self.Newline()
+    self.Newline()
+    self.WriteText(intro_blurb)
+    self.Newline()
+    self.BeginSymbolBullet('*', 25, 30)
+    for descr in intro_items:
+      self.WriteText(descr)
+      self.Newline()
+    self.EndSymbolBullet()
+    self.EndFontSize()
+    self.Newline()
+    self.Newline()
+
+  def ScrollWindow(self):
+    pos = self.GetScrollRange(wx.VERTICAL)
+    self.Scroll(0, pos)
+
+  def WriteFormattedText(self, boldtext='', normaltext='', bullet=False,
+               red='', newline=True, pos=None):
+    self.previous_pos = self.current_pos
+    if pos:
+      self.SetCaretPosition(pos)
+    elif self.current_pos:
+#      self.MoveEnd()
+      self.SetCaretPosition(self.current_pos)
+    if bullet:
+      self.BeginSymbolBullet('*', 25, 30)
+    if boldtext:
+      self.BeginBold()
+      self.WriteText(boldtext)
+      self.EndBold()
+    if normaltext:
+      self.WriteText(normaltext)
+    if red:
+      self.BeginTextColour((255, 0, 0))
+      self.WriteText(red)
+      self.EndTextColour()
+    if newline: 
+      self.Newline()
+    if bullet:
+      self.EndSymbolBullet()
+    self.ScrollWindow()
+    self.current_pos = self.GetCaretPosition()
+
+class MainFrame(wx.Frame):
+  def __init__(self, args):
+    self.args = args
+    self.quit_flag = False
+    self.progress_pos = None
+    wx.Frame.__init__(self, None, size=(550,500),
+              title="Check FASTQ v"+VERSION, )
+
+    panel = wx.Panel(self)
+    label = wx.StaticText(panel, -1, "Drop FASTQ files here:")
+#    self.rtc = wx.richtext.RichTextCtrl(panel,-1, "",
+#            style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+    self.rtc = MainRTC(panel)
+    self.rtc.AddIntroBlurb()
+    self.button_check = wx.Button(panel, -1, "Check FASTQ files", style=wx.BU_EXACTFIT)
+    self.Bind(wx.EVT_BUTTON, self.CheckFastQ, self.button_check)
+    self.button_check.Enable(False)
+    self.button_stop = wx.Button(panel, -1, "Stop", style=wx.BU_EXACTFIT)
+    self.button_stop.SetToolTip(wx.ToolTip("Stop counting and clear file list"))
+    self.button_stop.Enable(False)
+    self.Bind(wx.EVT_BUTTON, self.StopCounting, self.button_stop)
+    button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
+    button_quit.SetToolTip(wx.ToolTip("Quit application"))
+    self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
+    self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
+
+    sizer = wx.BoxSizer(wx.VERTICAL)
+    sizer.Add(label, 0, wx.ALL, 5)
+    sizer.Add(self.rtc, 1, wx.EXPAND|wx.ALL, 5)
+
+    button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+    button_sizer.Add(self.button_check, 0, wx.ALIGN_CENTER_VERTICAL)
+    button_sizer.Add(self.button_stop, 0, wx.ALIGN_CENTER_VERTICAL)
+    button_sizer.AddStretchSpacer()
+    button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
+    sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
+    panel.SetSizer(sizer)
+
+    self.filedrop = FileDropProcessing(self, self.rtc, self.args)
+    self.rtc.SetDropTarget(self.filedrop)
+
+  def CheckFastQ(self, event):
+    self.button_check.Enable(False)
+    self.button_stop.Enable(True)
+    try:
+      filenames = self.filedrop.dropped_files
+      self.rtc.WriteFormattedText('', '{} files to process'.format(self.filedrop.num_files))
+      for fqfile, num in sorted(filenames.items(), key=lambda k: (k[1], k[0])):
+        if self.quit_flag:
+          break
+        self.rtc.WriteFormattedText("File {}: ".format(num), os.path.basename(fqfile))
+        wx.Yield()
+        numlines, errmsg, timeelapse = check_fastq(fqfile, progress=self)
+        if errmsg:
+          self.rtc.WriteFormattedText(red=errmsg)
+      self.rtc.WriteFormattedText(normaltext='Done.')
+      self.filedrop.Reset()
+      self.button_check.Enable(False)
+      self.button_stop.Enable(False)
+    except Exception as e:
+      err = "ERROR: {} {}".format(type(e).__name__, e)
+      self.rtc.WriteFormattedText(red=err)
+      self.button_check.Enable(True)
+      self.button_stop.Enable(False)
+    self.rtc.WriteFormattedText(newline=True)
+
+
+  def ShowProgress(self, numsequences, timeelapse):
+    """Called by check_fastq() to replace the running sequence count"""
+    if self.progress_pos:
+      self.rtc.Delete(wx.richtext.RichTextRange(self.progress_pos,
+      self.rtc.current_pos))
+      self.rtc.current_pos = self.progress_pos
+    else:
+      self.progress_pos = self.rtc.current_pos
+    self.rtc.WriteFormattedText(
+      normaltext="  {} sequences ({} time elapsed)".format(
+      numsequences, timeelapse))
+    wx.Yield()
+
+  def EndProgress(self, numsequences, timeelapse):
+    """Called by check_fastq() with the final count for the file"""
+    if self.progress_pos:
+      self.rtc.Delete(wx.richtext.RichTextRange(self.progress_pos,
+      self.rtc.current_pos))
+      self.rtc.current_pos = self.progress_pos
+      self.rtc.WriteFormattedText(
+        normaltext="  {} sequences ({} time elapsed)".format(numsequences,
+        timeelapse))
+    self.progress_pos = None
+
+  def StopCounting(self, event):
+    self.quit_flag = True
+    self.filedrop.Reset()
+    self.button_check.Enable(False)
+    self.button_stop.Enable(False)
+    self.rtc.WriteFormattedText('','Stopped.')
+
+  def OnCloseMe(self, event):
+    self.quit_flag = True
+    self.Close(True)
+
+  def OnCloseWindow(self, event):
+    self.Destroy()
+    
+class FileDropProcessing(wx.FileDropTarget):
+  def __init__(self, main, window, args):
+    wx.FileDropTarget.__init__(self)
+    self.main = main
+    self.window = window
+    self.args = args
+    self.dropped_files = {}
+    self.num_files = 0
+
+  def OnDropFiles(self, x, y, filenames):
+    for fqfile in filenames:
+      if fqfile not in self.dropped_files:
+        self.num_files += 1
+        self.dropped_files[fqfile] = self.num_files
+      self.window.WriteFormattedText("File {}: ".format(self.dropped_files[fqfile]), 
+                              os.path.basename(fqfile))
+    self.window.WriteFormattedText("", "{} file{} dropped\n".format(
+                            self.num_files, '' if self.num_files==1 else 's'))
+    if self.num_files>0:
+      self.main.quit_flag = False
+      self.main.button_check.Enable(True)
+
+  def Reset(self):
+    self.num_files = 0
+    self.dropped_files = {}
+
+def run_gui(args):
+  app = TestFastQ_App(args)
+  app.MainLoop()
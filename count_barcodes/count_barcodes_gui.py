@@ -0,0 +1,271 @@
+#!/usr/bin/python
+"""
+wxPython interface for count_barcodes.py.  Only imported when
+count_barcodes.py is started without any arguments.
+"""
+
+import sys
+import time
+from threading import Thread
+import wx
+import ParseFastQ as fq
+from count_barcodes import LABELS, LIMIT, check_infile, dict_items_by_val, \
+     get_sub_barcode, pad_with_ns, parse_sample2barcode, parse_samplesheetCSV
+
+#----gui.py-------------------------------------------------------------------
+
+class BarcodeCount_App(wx.App):
+    def __init__(self, **kwargs):
+        wx.App.__init__(self, kwargs)
+
+    def OnInit(self):
+        self.frame = BCFrame()
+        self.frame.Show()
+        self.SetTopWindow(self.frame)
+        return True
+
+class BCFrame(wx.Frame):
+    def __init__(self):
+        wx.Frame.__init__(self, None, title="Barcode counter", size=(725,550))
+        self.cb_thread = None
+        self.timer = wx.Timer(self, wx.ID_ANY)
+        panel = wx.Panel(self)
+
+        self.button_clear = wx.Button(panel, -1, "Clear")
+        clear_tooltip = "Clear input files and stop any currently "+\
+                        "running analysis."
+        self.button_clear.SetToolTip(wx.ToolTip(clear_tooltip))
+
+        self.button_count = wx.Button(panel, -1, "Count barcodes")
+        count_tooltip = "Count barcodes in index fastq file." 
+        self.button_count.SetToolTip(wx.ToolTip(count_tooltip))
+
+        self.button_print = wx.Button(panel, -1, "Save report")
+        print_tooltip = "Save barcode counts to text file."
+        self.button_print.SetToolTip(wx.ToolTip(print_tooltip))
+
+        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
+
+        label_in = wx.StaticText(panel, -1, "Drop index fastq file here:")
+        self.text_in = wx.TextCtrl(panel,-1, "", 
+                       style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+        drop_tooltip = "Drop index fastq file here. A sample2barcode.txt" +\
+                 " file can optionally be included to label barcodes of " +\
+                 "interest. For non-STAMP runs, include the SampleSheet.csv."
+        self.text_in.SetToolTip(wx.ToolTip(drop_tooltip))
+        self.filedrop = FileDrop(self.text_in, self)
+        self.text_in.SetDropTarget(self.filedrop)
+        label_out = wx.StaticText(panel, -1, "Barcode counts:")
+        self.text_out = wx.TextCtrl(panel,-1, "", size=(500,275),
+                        style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+        self.gauge = wx.Gauge(panel, -1, 100, size=(500,12))
+
+        self.Bind(wx.EVT_BUTTON, self.Reset, self.button_clear)
+        self.Bind(wx.EVT_BUTTON, self.CountBarcodes, self.button_count)
+        self.Bind(wx.EVT_BUTTON, self.SaveReport, self.button_print)
+        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
+        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
+
+        top_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        top_sizer.Add(label_in, 0, wx.ALIGN_CENTER_VERTICAL)
+        top_sizer.AddStretchSpacer()
+        top_sizer.Add(self.button_clear, 0, wx.ALIGN_CENTER_VERTICAL)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(top_sizer, 0, wx.ALL|wx.EXPAND, 5)
+        sizer.Add(self.text_in, 1, wx.EXPAND|wx.ALL, 5)
+        sizer.Add(label_out, 0, wx.ALL, 5)
+        sizer.Add(self.text_out, 1, wx.EXPAND|wx.ALL, 5)
+        sizer.Add(self.gauge, 0, wx.EXPAND|wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(self.button_count, 0, wx.ALIGN_CENTER_VERTICAL)
+        button_sizer.AddStretchSpacer()
+        button_sizer.Add(self.button_print, 0, wx.ALIGN_CENTER_VERTICAL)
+        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
+        panel.SetSizer(sizer)
+        self.Reset(None)
+
+
+    def CountBarcodes(self, event):
+        infiles = self.filedrop.infiles
+        if not infiles['i1_fq']:
+            self.text_out.AppendText("No index file to process.\n")
+            return
+        err = check_infile(infiles['i1_fq'])
+        if err:
+            self.text_out.AppendText(err)
+        else:
+            self.button_count.Enable(False)
+            self.is_stamp=True
+            self.barcode2sample = {}
+            if infiles['sample2barcode']:
+                sfile = infiles['sample2barcode']
+                self.barcode2sample = parse_sample2barcode(sfile)
+            elif infiles['samplesheetCSV']:
+                sfile = infiles['samplesheetCSV']
+                self.barcode2sample = parse_samplesheetCSV(sfile)
+                self.is_stamp=False
+            self.cb_thread = CountBarcodeThread(infiles['i1_fq'], self,
+                        callback=self.DoneCountingBarcodes, cbargs=['i1_fq',])
+            self.cb_thread.start()
+            self.Bind(wx.EVT_TIMER, self.WriteResults, self.timer)
+            self.timer.Start(6000)
+            time.sleep(3)
+            self.WriteResults()
+
+    def DoneCountingBarcodes(self, fqtype):
+        self.WriteResults()
+        if self.filedrop.infiles['i1_fq']:
+            self.button_count.Enable(True)
+        if self.barcode_counts:
+            self.button_print.Enable(True)
+        self.gauge.SetValue(0)
+        self.timer.Stop()
+
+    def WriteResults(self, to_window=True, ofh=sys.stderr, limit=LIMIT):
+        totfilesize = 0
+        progress = 0
+        numrds = self.num_reads
+        file_size = self.parser.file_size if self.parser else 0
+        loc = self.parser._file.tell()
+        perc_done = loc*100.0/file_size if file_size else 0
+        perc_format = " ({:.2f}%)".format(perc_done) if loc != file_size \
+                      else ''
+        msg = "Number of reads: {:,d}{}\n".format(numrds, perc_format)
+        msg += self.BarcodeCountStats(limit=limit)
+        if ofh:
+            ofh.write(msg)
+            ofh.flush()
+        if to_window:
+            self.text_out.SetValue(msg)
+            if perc_done:
+                self.gauge.SetValue(int(perc_done))
+
+    def BarcodeCountStats(self, limit=LIMIT):
+        labels = self.barcode2sample
+        sorted_barcode_counts = dict_items_by_val(self.barcode_counts)
+        numreads = self.num_reads
+        numbarcodes = len(sorted_barcode_counts)
+        num = 0
+        msg = "Number of unique barcodes: {}\n\n".format(numbarcodes)
+        for (key,val) in sorted_barcode_counts:
+            perc = val*100.0/numreads if numreads else 0
+            l = "\t"+labels[key] if key in labels else ''
+            barcode = pad_with_ns(key) if self.is_stamp else key
+            msg += "{}\t{:8d}\t{:.2f}%{}\n".format(barcode,val, perc, l)
+            num += 1
+            if limit and num == limit: break
+        return msg
+
+    def SaveReport(self, event):
+        self.text_out.AppendText("\nSaving report.\n")
+        if not self.barcode_counts:
+            self.text_out.AppendText("No results to save.\n\n")
+        else:
+            saveFileDialog = wx.FileDialog(self, 
+                             "Save barcode counts to file", "", "", "*.txt", 
+                             wx.FD_SAVE|wx.FD_OVERWRITE_PROMPT)
+            if saveFileDialog.ShowModal() == wx.ID_CANCEL:
+                self.text.AppendText("\nSave cancelled.\n")
+            else:
+                with open(saveFileDialog.GetPath(), 'w') as ofh:
+                    self.WriteResults(to_window=False, ofh=ofh, limit=None)
+                self.text.AppendText("\nBarcode counts saved to {}.\n".\
+                    format(saveFileDialog.GetPath()))
+
+    def Reset(self, event):
+        self.StopThreads()
+        self.barcode_counts = {}
+        self.num_reads = 0
+        self.parser = None
+        self.filedrop.ClearInput(None)
+        self.button_count.Enable(False)
+        self.button_print.Enable(False)
+
+    def StopThreads(self):
+        if self.cb_thread:
+            self.cb_thread.stop = True
+            self.cb_thread = None
+        if self.timer:
+            self.timer.Stop()
+        self.gauge.SetValue(0)
+
+
+    def OnCloseMe(self, event):
+        self.Close(True)
+
+    def OnCloseWindow(self, event):
+        self.StopThreads()
+        self.Destroy()
+        
+
+class FileDrop(wx.FileDropTarget):
+    def __init__(self, window, parent):
+        wx.FileDropTarget.__init__(self)
+        self.window = window
+        self.parent = parent
+        self.infiles = {}
+
+    def ClearInput(self, event):
+        self.infiles = {'i1_fq': None, 'r1_fq': None,'r2_fq': None, 
+                        'sample2barcode': None, 'samplesheetCSV': None,
+                        'unknown': [], }
+        self.UpdateInputText()
+
+    def UpdateInputText(self):
+        msg = ''
+        for k in sorted(LABELS.keys()):
+            if self.infiles[k]:
+                msg += "{:<12s}\t {}\n".format(LABELS[k].upper()+':', 
+                                           self.infiles[k])
+        if self.infiles['unknown']:
+            while self.infiles['unknown']:
+                unknown = self.infiles['unknown'].pop(0)
+                msg += "Unrecogized file: {}\n".format(unknown)
+        self.window.SetValue(msg)
+
+    def OnDropFiles(self, x, y, filenames):
+        counts = {}
+        unknown = []
+        for dropfile in filenames:
+            if '_I1_' in dropfile:
+                self.infiles['i1_fq'] = dropfile
+                self.parent.button_count.Enable(True)
+            elif 'sample2barcode' in dropfile:
+                self.infiles['sample2barcode'] = dropfile
+            elif '.csv' in dropfile:
+                self.infiles['samplesheetCSV'] = dropfile
+            else:
+                self.infiles['unknown'].append(dropfile)
+        self.UpdateInputText()
+
+class CountBarcodeThread(Thread):
+    def __init__(self, i1file, results, callback=None, cbargs=[]):
+        Thread.__init__(self)
+        self.setDaemon(True)
+        self.i1file = i1file
+        self.results = results
+        self.callback = callback
+        self.callback_args = cbargs
+        self.stop = False
+
+    def run(self):
+        i1p = fq.FastQParser(self.i1file)
+        self.results.parser = i1p
+        self.results.num_reads = 0
+        self.results.barcode_counts = {}
+        for index in i1p:
+            barcode = index.seq
+            bc = get_sub_barcode(barcode) if self.results.is_stamp else barcode
+            self.results.barcode_counts[bc] = \
+                self.results.barcode_counts.get(bc,0) + 1
+            self.results.num_reads += 1
+            if self.stop: break
+        if self.callback:
+            wx.CallAfter(self.callback, *self.callback_args)
+
+
+def run_gui():
+    app = BarcodeCount_App()
+    app.MainLoop()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""
+make_sample2barcode_gui.py
+
+wxPython interface for make_sample2barcode.py.  Only imported when
+make_sample2barcode.py is started without any coversheets.
+"""
+
+import os
+import sys
+import wx
+import wx.richtext
+
+from make_sample2barcode import PROGRAM, VERSION, STAMPCoversheet
+
+#----gui.py-------------------------------------------------------------------
+
+class Sample2Barcode_App(wx.App):
+    def __init__(self, args, **kwargs):
+        self.args = args
+        wx.App.__init__(self, kwargs)
+
+    def OnInit(self):
+        self.frame = StampFrame(self.args)
+        self.frame.Show()
+        self.SetTopWindow(self.frame)
+        return True
+
+class StampRTC(wx.richtext.RichTextCtrl):
+    def __init__(self, parent):
+        wx.richtext.RichTextCtrl.__init__(self, parent, -1, "",
+                        style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+        self.Bind(wx.EVT_MOUSE_EVENTS, self.DoNothing)
+
+    def DoNothing(self, event):
+        pass
+
+    def AddIntroBlurb(self):
+        intro_blurb="This script creates sample2barcode.txt files for"+\
+                    " use with the STAMP analysis software."+\
+                    " Input files must follow the STAMP coversheet conventions."
+        intro_items = [ ]
+        self.BeginFontSize(10)
+        self.Newline()
+        self.Newline()
+        self.WriteText(intro_blurb)
+        self.Newline()
+        self.BeginSymbolBullet('*', 25, 30)
+        for [label, descr] in intro_items:
+            self.BeginBold()
+            self.WriteText(label)
+            self.EndBold()
+            self.WriteText(' -- '+descr)
+            self.Newline()
+        self.EndSymbolBullet()
+        self.EndFontSize()
+        self.Newline()
+        self.Newline()
+
+class StampFrame(wx.Frame):
+    def __init__(self, args):
+        self.args = args
+        wx.Frame.__init__(self, None, size=(550,500),
+                          title="{} v{}".format(PROGRAM,VERSION))
+
+        panel = wx.Panel(self)
+        label = wx.StaticText(panel, -1, "Drop STAMP coversheets here:")
+#        self.rtc = wx.richtext.RichTextCtrl(panel,-1, "",
+#                        style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+        self.rtc = StampRTC(panel)
+        self.rtc.AddIntroBlurb()
+        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
+        button_quit.SetToolTip(wx.ToolTip("Quit application"))
+        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
+        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(label, 0, wx.ALL, 5)
+        sizer.Add(self.rtc, 1, wx.EXPAND|wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.AddStretchSpacer()
+        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
+        panel.SetSizer(sizer)
+
+        filedrop = FileDropProcessing(self.rtc, self.args)
+        self.rtc.SetDropTarget(filedrop)
+
+    def OnCloseMe(self, event):
+        self.Close(True)
+
+    def OnCloseWindow(self, event):
+        self.Destroy()
+        
+class FileDropProcessing(wx.FileDropTarget):
+    def __init__(self, window, args):
+        wx.FileDropTarget.__init__(self)
+        self.window = window
+        self.args = args
+        self.num_samples = 0
+        self.current_pos = 0
+
+    def ScrollWindow(self):
+        pos = self.window.GetScrollRange(wx.VERTICAL)
+        self.window.Scroll(0, pos)
+
+    def WriteFormattedText(self, boldtext='', normaltext='', bullet=False,
+                           newline=True):
+        self.window.MoveEnd()
+        if self.current_pos:
+            self.window.SetCaretPosition(self.current_pos)
+        if bullet:
+            self.window.BeginSymbolBullet('*', 25, 30)
+        if boldtext:
+            self.window.BeginBold()
+            self.window.WriteText(boldtext)
+            self.window.EndBold()
+        if normaltext:
+            self.window.WriteText(normaltext)
+        if newline: 
+            self.window.Newline()
+        if bullet:
+            self.window.EndSymbolBullet()
+        self.ScrollWindow()
+        self.current_pos = self.window.GetCaretPosition()
+
+    def OnDropFiles(self, x, y, coversheets):
+        coversheet_data = []
+        num = 0
+        for coversheet in coversheets:
+            s2bdata = STAMPCoversheet(coversheet, debug=self.args.debug)
+            if s2bdata.fields:
+                coversheet_data.append(s2bdata)
+            else:
+                self.WriteFormattedText(normaltext="Not a recognized input file:  {}".\
+                    format(os.path.basename(coversheet)))
+                sys.stderr.write("  WARNING: Unrecognized format {}\n".format(coversheet))
+            num += 1
+            label = " {}".format(num) if len(coversheets)>1 else ''
+            self.WriteFormattedText("\nCoversheet{}: ".format(label), 
+                                    os.path.basename(coversheet))
+            sys.stdout.write("\nCoversheet {}\n".format(coversheet))
+            formatted_data = s2bdata.format_sample2barcode()
+            if not formatted_data:
+                self.WriteFormattedText(newline=False,
+                    normaltext="No data in {}\n".format(os.path.basename(coversheet)))
+                sys.stdout.write("  WARNING: No data {}\n".format(s2bdata.coversheet))
+            else:
+                self.WriteFormattedText(normaltext="    "+"\n    ".join(formatted_data))
+                self.WriteFormattedText(newline=False,
+                    normaltext="Writing {}\n".format(s2bdata.outfile))
+                sys.stdout.write("  Writing {}\n".format(s2bdata.outfile))
+                s2bdata.write_sample2barcode_file()
+
+def run_gui(args):
+    app = Sample2Barcode_App(args)
+    app.MainLoop()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for creating the addendum document of a run.
+
+Makes a run folder of SAMPLES samples in a temp folder.  Each sample has
+a GA CSV with variants picked at random from VARIANTS, and the CNV and
+fusion files of the HD753 postprocess test data.  The pages cover the
+special cases: a special variant comment, a range comment, the TERT
+promoter, a sample with no pathogenic variants, an & in a sample name
+and a CNV file with no CSV.  Then times filter_input and
+create_word_docx_batch on the folder.
+
+    python benchmark_addendums.py [-n SAMPLES] [-r REPEATS] [-j JOBS]
+
+Prints the time of each repeat and the best one.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from pathology_report_addendums import SPECIAL_VARIANTS_DOC, \
+     create_word_docx_batch, filter_input, getScriptPath, \
+     parse_special_variants_file
+
+TEST_DATA = os.path.join(getScriptPath(), os.pardir, os.pardir,
+                         "stamp_postprocess", "testfiles", "v1.2data")
+CSV_HEADER = "##Variants Of Interest\n"+\
+             "#Chr:ChrPos,HGVSProtein,Gene,Pathogenicity,VariantComment\n"
+CSV_FOOTER = "#Other\nSample Status Change,v1.3\n"
+# Chr:ChrPos, HGVSProtein, Gene, Pathogenicity, VariantComment
+VARIANTS = [
+  ('7:140453136', 'NM_004333:p.Val600Glu', 'BRAF', 'Pathogenic', 'x'),
+  ('7:55242465', 'p.Glu746_Ala750del', 'EGFR', 'Likely Pathogenic', 'y'),
+  ('7:55259515', 'p.Leu858Arg', 'EGFR', 'Pathogenic', ''),
+  ('7:116412000', 'p.?', 'MET', 'Pathogenic', 'z'),
+  ('5:1295228', 'p.?', 'N/A', 'Pathogenic',
+   '"is a recurrent mutation in the TERT promoter, yes"'),
+  ('12:25398284', 'p.Gly12Asp', 'KRAS', 'Pathogenic', ''),
+  ('12:25398284', 'p.Gly12Asp', 'KRAS', 'Uncertain', 'q'),
+  ('17:7577120', 'p.Arg273His', 'TP53', 'Likely Pathogenic', ''),
+  ('3:178936091', 'p.Glu545Lys', 'PIK3CA', 'Pathogenic', ''),
+  ('1:115256529', 'p.Gln61Arg', 'NRAS', 'Benign', ''),
+]
+NO_VARIANTS_SAMPLE = 7 # sample with only an Uncertain variant
+
+def sample_name(num):
+  return 'S{:02d}&co'.format(num) if num==5 else 'S{:02d}'.format(num)
+
+def make_run(rundir, numsamples, seed):
+  """Write the CSV, CNV and fusion files of numsamples samples, and a
+  CNV file of a sample without a CSV, to rundir"""
+  os.mkdir(rundir)
+  rng = random.Random(seed)
+  for num in range(1, numsamples+1):
+    sample = os.path.join(rundir, sample_name(num))
+    if num==NO_VARIANTS_SAMPLE:
+      variants = [VARIANTS[6]]
+    else:
+      variants = rng.sample(VARIANTS, rng.randint(3, len(VARIANTS)))
+    with open(sample+'.csv', 'w') as fh:
+      fh.write(CSV_HEADER)
+      fh.write(''.join([ ','.join(v)+'\n' for v in variants ]))
+      fh.write(CSV_FOOTER)
+    shutil.copy(os.path.join(TEST_DATA, 'HD753.cnvs'), sample+'.cnvs')
+    shutil.copy(os.path.join(TEST_DATA, 'HD753.fusions.filtered.txt'),
+                sample+'.fusions.filtered.txt')
+  shutil.copy(os.path.join(TEST_DATA, 'SampleA.cnvs'),
+              os.path.join(rundir, 'NOCSV.cnvs'))
+
+def benchmark(numsamples, repeats, jobs, seed):
+  """List of (filter_input, create_word_docx_batch) times of repeats"""
+  special_vars = parse_special_variants_file(SPECIAL_VARIANTS_DOC)
+  tmpdir = tempfile.mkdtemp(prefix='benchmark_addendums')
+  stdout = sys.stdout
+  try:
+    rundir = os.path.join(tmpdir, 'run{}'.format(numsamples))
+    make_run(rundir, numsamples, seed)
+    times = []
+    for n in range(repeats):
+      sys.stdout = open(os.devnull, 'w')
+      start = time.time()
+      runs, badfiles = filter_input([rundir], jobs)
+      filtered = time.time()
+      results = list(create_word_docx_batch(runs, special_vars, 'RESIDENT',
+                                            'ATTENDING', jobs))
+      times.append((filtered-start, time.time()-filtered))
+      sys.stdout.close()
+      sys.stdout = stdout
+      for run, status, value, output in results:
+        if status!='ok':
+          sys.exit("{}\n  ERROR: {}".format(output, value))
+    return times
+  finally:
+    sys.stdout = stdout
+    shutil.rmtree(tmpdir)
+
+if __name__=='__main__':
+  parser = ArgumentParser(description="Time creating the addendum "+\
+                          "document of a generated run.")
+  parser.add_argument("-n", "--samples", type=int, default=96,
+                      help="Samples in the run (default: 96)")
+  parser.add_argument("-r", "--repeats", type=int, default=5,
+                      help="Times to create the document (default: 5)")
+  parser.add_argument("-j", "--jobs", type=int, default=1,
+                      help="Number of processes (default: 1)")
+  parser.add_argument("-s", "--seed", type=int, default=1,
+                      help="Random seed for the variants (default: 1)")
+  args = parser.parse_args()
+  times = benchmark(args.samples, args.repeats, args.jobs, args.seed)
+  for label, secs in (('filter_input', [ t[0] for t in times ]),
+                      ('create_word_docx_batch', [ t[1] for t in times ]),
+                      ('total', [ sum(t) for t in times ])):
+    print "{}, {} samples: {}  best {:.3f}s".format(label, args.samples,
+          ' '.join([ "{:.3f}s".format(t) for t in secs ]), min(secs))
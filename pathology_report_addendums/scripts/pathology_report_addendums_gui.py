@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+"""
+wxPython interface for pathology_report_addendums.py.  Only imported when
+pathology_report_addendums.py is started without any input.
+"""
+
+import os
+import sys
+import traceback
+import wx
+import wx.richtext
+
+from pathology_report_addendums import VERSION, create_word_docx, filter_input
+
+#----gui.py-------------------------------------------------------------------
+
+class AddendumApp(wx.App):
+  def __init__(self, special_vars, options, **kwargs):
+    self.special_vars = special_vars
+    self.options = options
+    wx.App.__init__(self, kwargs)
+
+  def OnInit(self):
+    self.frame = MainFrame(self.special_vars, self.options)
+    self.frame.Show()
+    self.SetTopWindow(self.frame)
+    return True
+
+class MainFrame(wx.Frame):
+  def __init__(self, special_vars, options, *args, **kwargs):
+    self.special_vars = special_vars
+    self.options = options
+    super(MainFrame, self).__init__(None, *args, size=(550,500),
+              title="STAMP Addendum Generator v"+VERSION, **kwargs)
+    panel = wx.Panel(self)
+    label = wx.StaticText(panel, -1, "Drop STAMP CSV files here:")
+    self.rtc = AddendumRTC(panel)
+    self.rtc.AddIntroBlurb()
+    self.entry_panel = EntryPanel(panel, options.resident, options.signout,
+                       options.outfile)
+    self.filedrop = FileDropProcessing(self, self.rtc, self.entry_panel)
+    self.rtc.SetDropTarget(self.filedrop)
+
+    button_run = wx.Button(panel, -1, "Create reports", style=wx.BU_EXACTFIT)
+    button_run.SetToolTip(wx.ToolTip("Create Word document"))
+    self.Bind(wx.EVT_BUTTON, self.createReport, button_run)
+    button_reset = wx.Button(panel, -1, "Reset", style=wx.BU_EXACTFIT)
+    button_reset.SetToolTip(wx.ToolTip("Reset CSV list"))
+    self.Bind(wx.EVT_BUTTON, self.resetValues, button_reset)
+    button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
+    button_quit.SetToolTip(wx.ToolTip("Quit application"))
+    self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
+    self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
+
+    button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+    button_sizer.Add(button_run, 0, wx.ALIGN_CENTER_VERTICAL)
+    button_sizer.AddStretchSpacer()
+    button_sizer.Add(button_reset, 0, wx.ALIGN_CENTER_VERTICAL)
+    button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
+
+    sizer = wx.BoxSizer(wx.VERTICAL)
+    sizer.Add(label, 0, wx.ALL, border=5)
+    sizer.Add(self.rtc, 1, wx.EXPAND|wx.ALL, border=5)
+    sizer.Add(self.entry_panel, 0, wx.EXPAND|wx.ALL, border=5)
+
+    sizer.Add(button_sizer, 0, wx.EXPAND|wx.ALL, border=5)
+    panel.SetSizer(sizer)
+
+
+  def createReport(self, event):
+    self.filedrop.createReport()
+
+  def resetValues(self, event):
+    self.filedrop.reset()
+
+  def OnCloseMe(self, event):
+    self.Close(True)
+
+  def OnCloseWindow(self, event):
+    self.Destroy()
+    
+class FileDropProcessing(wx.FileDropTarget):
+  def __init__(self, parent, window, entries):
+    wx.FileDropTarget.__init__(self)
+    self.parent = parent
+    self.window = window
+    self.entries = entries
+    self.current_pos = 0
+    self.runs = {}
+    self.num_samples = 0
+
+  def ScrollWindow(self):
+    pos = self.window.GetScrollRange(wx.VERTICAL)
+    self.window.Scroll(0, pos)
+
+  def WriteFormattedText(self, boldtext='', normaltext='', bullet=False,
+               newline=True):
+    self.window.MoveEnd()
+    if self.current_pos:
+      self.window.SetCaretPosition(self.current_pos)
+    if bullet:
+      self.window.BeginSymbolBullet('*', 25, 30)
+    if boldtext:
+      self.window.BeginBold()
+      self.window.WriteText(boldtext)
+      self.window.EndBold()
+    if normaltext:
+      self.window.WriteText(normaltext)
+    if newline: 
+      self.window.Newline()
+    if bullet:
+      self.window.EndSymbolBullet()
+    self.ScrollWindow()
+    self.current_pos = self.window.GetCaretPosition()
+    self.window.Refresh()
+
+  def OnDropFiles(self, x, y, filenames):
+    self.runs, badfiles = filter_input(filenames)
+    sys.stderr.write('\n'.join([ "{}: {}".format(err, f) for f, err in badfiles ]))
+    if badfiles:
+      self.window.MoveEnd()
+      for badfile, errmsg in badfiles:
+        self.WriteFormattedText(newline=False,
+          normaltext="{}: {}\n".format(errmsg, os.path.basename(badfile)))
+        self.ScrollWindow()
+    for i, (run, rundict) in enumerate(self.runs.items()):
+      self.WriteFormattedText("Run {}: ".format(i+1), os.path.basename(run))
+      for sample, sampledict in sorted(rundict.items()):
+        filetypes = sorted(sampledict.keys())
+        note = '' if 'csv' in filetypes else ' -- No CSV.  Skipping'
+        self.WriteFormattedText(newline=False,
+          normaltext="  {} ({}){}\n".format(sample, ', '.join(filetypes),
+          note))
+    self.WriteFormattedText(newline=True)
+
+  def createReport(self):
+    try:
+      if self.runs:
+        i=None
+        self.entries.updateInfo()
+        for num, run in enumerate(self.runs):
+          samples = self.runs[run]
+          if len(self.runs)>1:
+            i=num+1
+          create_word_docx(samples, self.parent.special_vars,
+            self.entries.resident, self.entries.signout, i=i,
+            outdir=run, write_progress=self.WriteFormattedText)
+    except Exception as e:
+      errormsg = "{} {}\n\n".format(type(e).__name__, e)
+      self.WriteFormattedText("  ERROR: ", errormsg)
+      traceback.print_exc(file=sys.stderr)
+      sys.stderr.flush()
+
+  def reset(self):
+    self.csvinfo = []
+    self.num_samples = 0
+    self.WriteFormattedText("CSV files: ", "None")
+
+class AddendumRTC(wx.richtext.RichTextCtrl):
+  def __init__(self, parent):
+    wx.richtext.RichTextCtrl.__init__(self, parent, -1, "",
+            style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+    self.Bind(wx.EVT_MOUSE_EVENTS, self.DoNothing)
+
+  def DoNothing(self, event):
+    pass
+
+  def AddIntroBlurb(self):
+    intro_blurb="One Word document will be created for each set of CSV"+\
+        " files dropped. The Word document will be saved in the same"+\
+        " directory as the first CSV file processed unless otherwise "+\
+        "specified."
+    intro_items = [   
+    ]
+    self.BeginFontSize(10)
+    self.Newline()
+    self.Newline()
+    self.WriteText(intro_blurb)
+    self.Newline()
+    self.BeginSymbolBullet('*', 25, 30)
+    for [label, descr] in intro_items:
+      self.BeginBold()
+      self.WriteText(label)
+      self.EndBold()
+      self.WriteText(' -- '+descr)
+      self.Newline()
+    self.EndSymbolBullet()
+    self.EndFontSize()
+    self.Newline()
+    self.Newline()
+
+class EntryPanel(wx.Panel):
+  def __init__(self, parent, resident='RESIDENTSNAME',
+               signout='SIGNOUTATTENDING', outfile="addendums.docx", **kwargs):
+    wx.Panel.__init__(self, parent, **kwargs)
+    self.resident = resident
+    self.signout = signout
+    self.outfile = outfile
+
+    self.createWidgets()
+    self.doLayout()
+    self.updateInfo(resident, signout, outfile)
+
+  def createWidgets(self):
+    self.resident_label = wx.StaticText(self, -1, "Resident's name: ")
+    self.resident_entry = wx.TextCtrl(self, -1, self.resident)
+    self.signout_label = wx.StaticText(self, -1, "  Sign-out attending: ")
+    self.signout_entry = wx.TextCtrl(self, -1, self.signout)
+    self.outfile_label = wx.StaticText(self, -1, "  Output file name: ")
+    self.outfile_entry = wx.TextCtrl(self, -1, self.outfile)
+#    self.resident_entry.Bind(wx.EVT_TEXT, self.updateInfo)
+#    self.signout_entry.Bind(wx.EVT_TEXT, self.updateInfo)
+#    self.outfile_entry.Bind(wx.EVT_TEXT, self.updateInfo)
+
+  def doLayout(self):
+    self.entry_sizer = wx.FlexGridSizer(cols=2, hgap=5, vgap=5)
+    self.entry_sizer.AddGrowableCol(1)
+    self.entry_sizer.Add(self.resident_label, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+    self.entry_sizer.Add(self.resident_entry, 0, wx.EXPAND)
+    self.entry_sizer.Add(self.signout_label, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+    self.entry_sizer.Add(self.signout_entry, 0, wx.EXPAND)
+    self.entry_sizer.Add(self.outfile_label, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+    self.entry_sizer.Add(self.outfile_entry, 0, wx.EXPAND)
+    self.SetSizer(self.entry_sizer)
+
+  def updateInfo(self, resident='', signout='', outfile=''):
+    if resident:
+      self.resident_entry.SetValue(resident)
+      self.resident=resident
+    else:
+      self.resident = self.resident_entry.GetValue()
+    if signout:
+      self.signout_entry.SetValue(signout)
+      self.signout=signout
+    else:
+      self.signout = self.signout_entry.GetValue()
+    if outfile:
+      self.outfile_entry.SetValue(outfile)
+      self.outfile=outfile
+    else:
+      self.outfile = self.outfile_entry.GetValue()
+
+  def output_file(self, csvreference):
+    """Save output in parent directory of csvreference unless output file name
+    already specifies valid directory"""
+    outfile = None
+    if not self.outfile:
+      outfile = csvreference.replace('.csv', '') + '_addendums.docx'
+    else:
+      dirpath = os.path.dirname(self.outfile)
+      if os.path.isdir(dirpath):
+        outfile = self.outfile
+      else:
+        csvpath = os.path.dirname(csvreference)
+        outfile1 = os.path.abspath(os.path.join(csvpath, os.pardir, self.outfile))
+        outfile2 = os.path.abspath(os.path.join(csvpath, os.pardir, os.path.basename(self.outfile)))
+        if os.path.isdir(os.path.dirname(outfile1)):
+          outfile = outfile1
+        else:
+          outfile = outfile2
+      return outfile
+
+
+def run_gui(args, special_vars):
+  app = AddendumApp(special_vars, args)
+  app.MainLoop()
@@ -0,0 +1,19 @@
+"""
+stamp_common
+
+Code shared by the STAMP scripts.  Scripts add the top of the
+stamp_scripts checkout to sys.path and import what they need, ie.
+
+    from stamp_common.fileops import parse_tab_file
+
+fileops.py -- tab-delimited report reader and safe file replacement
+dbops.py -- sqlite connections, write transactions and schema migrations
+spreadsheet.py -- xlsxwriter helpers
+vcfops.py -- VCF record sorting in contig order
+depthops.py -- depth reports and wl_depths files as numpy arrays
+cnvtiles.py -- CNV tile matrices of control runs, baselines and drift
+fusionops.py -- fusion index matching breakpoints within a bp tolerance
+hgvsops.py -- HGVS p. amino acid change conversion and parsing
+commentrules.py -- variant comment rules compiled into dispatch tables
+discovery.py -- input file listing and suffix classification
+"""
@@ -0,0 +1,334 @@
+"""
+cnvtiles.py
+
+CNV tile tables (*.tiles.cnvs) of many runs as tiles x runs numpy
+matrices, with robust per-tile baselines over the runs and per-gene
+aggregates.  The gene mean-z in a .cnvs file is the mean z-score of the
+gene's tiles, so the change in a gene's mean-z from its baseline is the
+sum of the changes of its tiles divided by the number of tiles; tile
+contributions show which tiles drive a gene's drift.
+
+Parsed tile files are cached on disk keyed by file name, size and
+modification time, so only new or changed runs are read.
+
+PanelOfNormals keeps the scaled_depth of each tile of the control runs
+saved so far, with each tile's median and scaled MAD over the runs as a
+baseline for computing the z-scores of a new sample's tiles.
+"""
+
+import cPickle
+import os
+import sys
+import warnings
+import numpy
+from stamp_common.depthops import region_gene
+from stamp_common.fileops import TabReader, replace_file
+
+TILE_COLUMNS = ['norm_depth', 'scaled_depth', 'z-score']
+TILE_CACHE_VERSION = 1 # change when the cached tile data changes
+MAD_SCALE = 1.4826 # scales MAD to the std dev of normally distributed data
+
+def _float(v):
+    try:
+        return float(v)
+    except ValueError:
+        return numpy.nan
+
+def read_tile_file(tilefile):
+    """Returns (tile descriptions, chroms, values) where values is a
+    tiles x TILE_COLUMNS array; NaN for values that are not numbers"""
+    reader = TabReader(tilefile, columns=['Description', 'Chr']+TILE_COLUMNS)
+    if reader.missing:
+        reader.close()
+        sys.exit("{} Bad format.  ".format(tilefile) +\
+                 "{} column not found.".format(reader.missing[0]))
+    tiles = []
+    chroms = []
+    values = []
+    for row in reader:
+        tiles.append(row[0])
+        chroms.append(row[1])
+        values.append([ _float(v) for v in row[2:] ])
+    values = numpy.array(values, dtype=float).reshape(len(tiles),
+                                                     len(TILE_COLUMNS))
+    return tiles, chroms, values
+
+def _file_key(tilefile):
+    st = os.stat(tilefile)
+    return (st.st_size, st.st_mtime)
+
+def read_tile_cache(cachefile):
+    """Dict keyed by tile file of (file key, tiles, chroms, values), or
+    empty if cachefile does not exist or is from another version"""
+    if not cachefile or not os.path.exists(cachefile):
+        return {}
+    try:
+        with open(cachefile, 'rb') as fh:
+            cache = cPickle.load(fh)
+    except Exception, e:
+        sys.stderr.write("  Ignoring tile cache {}: {}{}\n".format(
+                         cachefile, type(e).__name__, e))
+        return {}
+    if cache.get('version')!=TILE_CACHE_VERSION:
+        return {}
+    return cache['files']
+
+def save_tile_cache(cachefile, files):
+    tmpfile = cachefile+'.tmp{}'.format(os.getpid())
+    try:
+        with open(tmpfile, 'wb') as fh:
+            cPickle.dump({ 'version': TILE_CACHE_VERSION, 'files': files },
+                         fh, cPickle.HIGHEST_PROTOCOL)
+        replace_file(tmpfile, cachefile)
+    except (IOError, OSError), e:
+        sys.stderr.write("  Could not save tile cache {}: {}\n".format(
+                         cachefile, e))
+
+def _group_starts(codes):
+    """Start index of each run of the same value in sorted codes"""
+    return numpy.concatenate([[0], numpy.flatnonzero(numpy.diff(codes)) + 1])
+
+def gene_codes(tiles):
+    """(sorted genes of tiles, index in genes of each tile)"""
+    tilegenes = [ region_gene(tile) for tile in tiles ]
+    genes = sorted(set(tilegenes))
+    index = dict([ (g, i) for i, g in enumerate(genes) ])
+    return genes, numpy.array([ index[g] for g in tilegenes ],
+                              dtype=numpy.intp)
+
+def gene_sums(gene_code, m):
+    """Sum and number of the non-NaN values of each gene's tiles in m,
+    an array with a row for each tile"""
+    order = numpy.argsort(gene_code, kind='mergesort')
+    starts = _group_starts(gene_code[order])
+    m = m[order]
+    counts = numpy.add.reduceat((~numpy.isnan(m)).astype(numpy.int64),
+                                starts, axis=0)
+    sums = numpy.add.reduceat(numpy.nan_to_num(m), starts, axis=0)
+    return sums, counts
+
+def gene_means(gene_code, m):
+    """Mean of the non-NaN values of each gene's tiles in m; NaN if
+    none"""
+    sums, counts = gene_sums(gene_code, m)
+    with numpy.errstate(invalid='ignore', divide='ignore'):
+        return sums / counts
+
+def robust_baseline(m):
+    """(median, MAD) of each row of m ignoring NaN.  MAD is scaled to
+    estimate the std dev."""
+    with numpy.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # all-NaN rows
+        median = numpy.nanmedian(m, axis=1)
+        mad = MAD_SCALE * numpy.nanmedian(numpy.abs(m - median[:,None]),
+                                          axis=1)
+    return median, mad
+
+class TileMatrix(object):
+    """Tile values of CNV runs.
+
+    Attributes:
+    runs -- run names, one per matrix column
+    tiles, chroms -- description and chrom of each tile (matrix row), in
+            the order first seen in the tile files
+    genes, gene_code -- genes of the tiles; index in genes of each tile
+    values -- dict keyed by TILE_COLUMNS of tiles x runs arrays; NaN for
+            tiles not in a run
+    """
+    def __init__(self, runfiles, cachefile=None):
+        """runfiles -- list of (run name, tile file)"""
+        cache = read_tile_cache(cachefile)
+        files = {}
+        tileruns = []
+        for run, tilefile in runfiles:
+            key = _file_key(tilefile)
+            cached = cache.get(tilefile)
+            if cached and cached[0]==key:
+                files[tilefile] = cached
+            else:
+                files[tilefile] = (key,) + read_tile_file(tilefile)
+            tileruns.append(files[tilefile][1:])
+        if cachefile and any(files[f] is not cache.get(f) for f in files):
+            cache.update(files)
+            save_tile_cache(cachefile, cache)
+        self.runs = [ run for run, tilefile in runfiles ]
+        self.tiles = []
+        self.chroms = []
+        index = {}
+        for tiles, chroms, values in tileruns:
+            for tile, chrom in zip(tiles, chroms):
+                if tile not in index:
+                    index[tile] = len(self.tiles)
+                    self.tiles.append(tile)
+                    self.chroms.append(chrom)
+        matrix = numpy.full((len(TILE_COLUMNS), len(self.tiles),
+                             len(self.runs)), numpy.nan)
+        for j, (tiles, chroms, values) in enumerate(tileruns):
+            if tiles==self.tiles[:len(tiles)]:
+                matrix[:, :len(tiles), j] = values.T
+            else:
+                rows = [ index[tile] for tile in tiles ]
+                matrix[:, rows, j] = values.T
+        self.values = dict(zip(TILE_COLUMNS, matrix))
+        self.genes, self.gene_code = gene_codes(self.tiles)
+
+    def baseline(self, column='z-score'):
+        """(median, MAD) of each tile over the runs, ignoring runs
+        without the tile.  MAD is scaled to estimate the std dev."""
+        return robust_baseline(self.values[column])
+
+    def deviation(self, column='z-score'):
+        """tiles x runs array of the deviation of each run from the tile
+        baseline in MADs; NaN where the MAD is 0"""
+        median, mad = self.baseline(column)
+        mad = numpy.where(mad > 0, mad, numpy.nan)
+        return (self.values[column] - median[:,None]) / mad[:,None]
+
+    def gene_means(self, column='z-score'):
+        """genes x runs array of the mean value of the gene's tiles, ie.
+        the gene mean-z for z-score"""
+        return gene_means(self.gene_code, self.values[column])
+
+    def tile_contributions(self, column='z-score'):
+        """tiles x runs array of the change of each tile from its
+        baseline median divided by the number of the gene's tiles in the
+        run, which sum to the change of the gene mean from the mean of
+        its tile baselines"""
+        median, mad = self.baseline(column)
+        m = self.values[column]
+        sums, counts = gene_sums(self.gene_code, m)
+        with numpy.errstate(invalid='ignore', divide='ignore'):
+            return (m - median[:,None]) / counts[self.gene_code]
+
+    def gene_drift(self, column='z-score'):
+        """genes x runs array of the change of the gene mean from the mean
+        of its tile baselines"""
+        sums, counts = gene_sums(self.gene_code,
+                                 self.tile_contributions(column))
+        return numpy.where(counts > 0, sums, numpy.nan)
+
+PON_VERSION = 1 # change when the panel of normals file format changes
+PON_MIN_RUNS = 5 # runs needed in the panel before z-scores are computed
+
+class PanelOfNormals(object):
+    """Panel of normals for CNV tiles: the scaled_depth of each tile in
+    each control run added, with the median and std dev (scaled MAD) of
+    each tile over the runs as its robust mean and variance.  The runs
+    saved together are added at once, without reading the tile files of
+    earlier runs.  Saved in a compressed numpy .npz file, which keeps
+    the raw tiles x runs matrix of scaled_depth as well as the median
+    and sd, so a run can be replaced or removed and the baseline
+    recomputed exactly.  The file grows by a column of float32 values
+    for each run.
+
+    Attributes:
+    tiles -- tile descriptions, one per row
+    runs -- run names, one per column
+    values -- tiles x runs float32 array of scaled_depth; NaN for tiles
+            not in a run
+    median, sd -- robust mean and std dev of each tile; sd is NaN if
+            the tile does not vary
+    """
+    def __init__(self, ponfile=None):
+        self.tiles = []
+        self.runs = []
+        self.values = numpy.zeros((0, 0), dtype=numpy.float32)
+        self.median = numpy.zeros(0)
+        self.sd = numpy.zeros(0)
+        self._index = {} # row of each tile
+        if ponfile and os.path.exists(ponfile):
+            self.read(ponfile)
+
+    def read(self, ponfile):
+        with numpy.load(ponfile) as data:
+            if int(data['version'])!=PON_VERSION:
+                sys.exit("{} is panel of normals version {}.  ".format(
+                         ponfile, int(data['version'])) +\
+                         "Expected version {}.".format(PON_VERSION))
+            self.tiles = data['tiles'].tolist()
+            self.runs = data['runs'].tolist()
+            self.values = data['values']
+            self.median = data['median']
+            self.sd = data['sd']
+        self._index = dict([ (t, i) for i, t in enumerate(self.tiles) ])
+
+    def save(self, ponfile):
+        tmpfile = ponfile+'.tmp{}'.format(os.getpid())
+        with open(tmpfile, 'wb') as fh:
+            numpy.savez_compressed(fh, version=PON_VERSION,
+                tiles=numpy.array(self.tiles, dtype=str),
+                runs=numpy.array(self.runs, dtype=str),
+                values=self.values, median=self.median, sd=self.sd)
+        replace_file(tmpfile, ponfile)
+
+    def update_baseline(self):
+        self.median, self.sd = robust_baseline(self.values)
+        with numpy.errstate(invalid='ignore'):
+            # z-scores are NaN for tiles that do not vary over the panel
+            self.sd[~(self.sd > 0)] = numpy.nan
+
+    def add_runs(self, runs):
+        """Add the scaled depths of tiles for each of runs, a list of 
+        (run, tiles, scaled), replacing runs added before.  The new rows
+        and columns are added to the matrix at once and the baseline is
+        updated once."""
+        if not runs:
+            return
+        numtiles = len(self.tiles)
+        for run, tiles, scaled in runs:
+            for t in tiles:
+                if t not in self._index:
+                    self._index[t] = len(self.tiles)
+                    self.tiles.append(t)
+        column = dict([ (r, j) for j, r in enumerate(self.runs) ])
+        for run, tiles, scaled in runs:
+            if run not in column:
+                column[run] = len(self.runs)
+                self.runs.append(run)
+        values = numpy.full((len(self.tiles), len(self.runs)), numpy.nan,
+                            numpy.float32)
+        values[:numtiles,:self.values.shape[1]] = self.values
+        for run, tiles, scaled in runs:
+            j = column[run]
+            values[:,j] = numpy.nan
+            values[[ self._index[t] for t in tiles ], j] = scaled
+        self.values = values
+        self.update_baseline()
+
+    def remove_runs(self, runs):
+        """Remove those of runs in the panel and update the baseline"""
+        runs = set(runs)
+        keep = [ j for j, r in enumerate(self.runs) if r not in runs ]
+        if len(keep) < len(self.runs):
+            self.runs = [ self.runs[j] for j in keep ]
+            self.values = self.values[:,keep]
+            self.update_baseline()
+
+    def zscores(self, tiles, scaled):
+        """z-score of the scaled depth of each of tiles against the
+        panel; NaN for tiles not in the panel, or if the panel has less
+        than PON_MIN_RUNS runs"""
+        z = numpy.full(len(tiles), numpy.nan)
+        if len(self.runs) < PON_MIN_RUNS:
+            return z
+        rows = numpy.array([ self._index.get(t, -1) for t in tiles ],
+                           dtype=numpy.intp)
+        known = rows >= 0
+        z[known] = (scaled[known] - self.median[rows[known]]) / \
+                   self.sd[rows[known]]
+        return z
+
+    def gene_mean_z(self, tiles, scaled):
+        """(genes, mean-z of each gene) for the scaled depths of tiles,
+        with the tile z-scores from zscores"""
+        genes, gene_code = gene_codes(tiles)
+        return genes, gene_means(gene_code, self.zscores(tiles, scaled))
+
+    def run_gene_mean_z(self):
+        """(genes, genes x runs array of mean-z) for the runs in the
+        panel, each against the baseline of the panel"""
+        genes, gene_code = gene_codes(self.tiles)
+        if len(self.runs) < PON_MIN_RUNS:
+            return genes, numpy.full((len(genes), len(self.runs)), numpy.nan)
+        z = (self.values - self.median[:,None]) / self.sd[:,None]
+        return genes, gene_means(gene_code, z)
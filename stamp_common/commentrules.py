@@ -0,0 +1,182 @@
+"""
+commentrules.py
+
+Variant comment rules.  A tab-delimited rules file is compiled once into
+dispatch tables: a dict keyed by (gene, p. change) for exact rules, a
+dict of the genes with a rule for all their variants, the range rules
+of each gene and chrom sorted by start, and the pattern rules in file
+order.  Finding the rule for a variant is a dict lookup for
+exact rules and a binary search for range rules.
+
+Rules file columns (others are ignored):
+Gene -- gene of the rule; blank for pattern rules for any gene
+Variant -- p. change in three letter codes, or * for all variants of
+        the gene
+Range -- chrom:start_end the variant position must be in.  Ranges of
+        a gene on a chrom must not overlap.
+Pattern -- regex the p. change (in three letter codes) must match
+CDS Pattern -- regex the CDS change (without c.) must match
+Comment -- comment template, with {names} of the variant values
+        (gene, pdot, aa, cds, codon, ref, alt, a_alt).  A rule whose
+        template needs a value the variant does not have is skipped.
+
+ref and alt are the lower case names of the amino acids of a single
+amino acid change, codon its codon, and a_alt 'a' or 'an' for alt.
+"""
+
+import re
+import string
+import sys
+from bisect import bisect_right
+from stamp_common.fileops import TabReader
+from stamp_common.hgvsops import AA_NAMES, lru_cache, parse_aa_change, \
+     three_to_one
+
+RULE_COLUMNS = ['Gene', 'Variant', 'Range', 'Pattern', 'CDS Pattern',
+                'Comment']
+ALL_VARIANTS = '*'
+
+def normalize_chrom(chrom):
+    return chrom[3:] if chrom.startswith('chr') else chrom
+
+class Template(object):
+    """Comment template compiled once; names are the values it needs"""
+    def __init__(self, text):
+        self.text = text
+        self.names = set([ name for literal, name, spec, conv in \
+                           string.Formatter().parse(text) if name ])
+
+    def format(self, values):
+        """Comment with values filled in, or None if a value is missing"""
+        if not self.names:
+            return self.text
+        if any(values.get(name) is None for name in self.names):
+            return None
+        return self.text.format(**values)
+
+def variant_values(gene, pdot, cds=None):
+    """Dict of the values comment templates can use"""
+    values = {'gene': gene, 'pdot': pdot, 'cds': cds,
+              'aa': three_to_one(pdot)[2:] if pdot.startswith('p.') else None}
+    change = parse_aa_change(pdot)
+    if change:
+        values['codon'] = change.codon
+        values['ref'] = AA_NAMES[change.ref].lower()
+        values['alt'] = AA_NAMES[change.alt].lower()
+        values['a_alt'] = 'an' if values['alt'][0] in ('a', 'i') else 'a'
+    return values
+
+class CommentRules(object):
+    """Rules compiled from rulesfile into dispatch tables.  Rules are
+    tried in the order exact, all variants of the gene, range, then
+    pattern rules in file order; the first rule giving a comment is used.
+    defaults is a list of (gene, comment) all variant rules used if the
+    rules file has none for the gene.
+
+    Attributes:
+    exact -- dict keyed by (gene, p. change) of Template
+    allvariants -- dict keyed by gene of Template
+    ranges -- dict keyed by (gene, chrom) of (starts, ends, Templates)
+            sorted by start
+    patterns -- list of (gene, p. regex, CDS regex, Template)
+    """
+    def __init__(self, rulesfile=None, defaults=()):
+        self.rulesfile = rulesfile
+        self.exact = {}
+        self.allvariants = {}
+        self.ranges = {}
+        self.patterns = []
+        self._gene_patterns = {}
+        if rulesfile:
+            self._compile(rulesfile)
+        for gene, comment in defaults:
+            self.allvariants.setdefault(gene, Template(comment))
+        self.comment_for = lru_cache()(self._comment)
+
+    def _bad_rule(self, rule, msg):
+        sys.exit("{} Bad format.  {} in rule: {}".format(self.rulesfile, msg,
+                 '\t'.join([ v or '' for v in rule ])))
+
+    def _compile(self, rulesfile):
+        ranges = {}
+        reader = TabReader(rulesfile, columns=RULE_COLUMNS)
+        for num, rule in enumerate(reader):
+            gene, variant, generange, pattern, cdspattern, comment = rule
+            if not comment:
+                continue
+            template = Template(comment)
+            if variant==ALL_VARIANTS and gene:
+                self.allvariants[gene] = template
+            elif variant and gene:
+                self.exact[(gene, variant)] = template
+            elif generange and gene:
+                try:
+                    chrom, startend = generange.split(':')
+                    start, end = [ int(v) for v in startend.split('_') ]
+                except ValueError:
+                    self._bad_rule(rule, "Range is not chrom:start_end")
+                ranges.setdefault((gene, normalize_chrom(chrom)), []).append(
+                    (start, end, num, template, rule))
+            elif pattern or cdspattern:
+                try:
+                    patt = re.compile(pattern) if pattern else None
+                    cdspatt = re.compile(cdspattern) if cdspattern else None
+                except re.error, e:
+                    self._bad_rule(rule, "Bad pattern {}".format(e))
+                self.patterns.append((gene, patt, cdspatt, template))
+        for key, rows in ranges.items():
+            rows.sort()
+            # one bisect finds the range covering a position only if
+            # the ranges do not overlap
+            for prev, row in zip(rows, rows[1:]):
+                if row[0] <= prev[1]:
+                    self._bad_rule(max(prev, row, key=lambda r: r[2])[4],
+                                   "Range overlaps another range of the gene")
+            self.ranges[key] = ([ r[0] for r in rows ], [ r[1] for r in rows ],
+                                [ r[3] for r in rows ])
+
+    def gene_patterns(self, gene):
+        """Pattern rules for gene or any gene, in file order"""
+        if gene not in self._gene_patterns:
+            self._gene_patterns[gene] = [ rule for rule in self.patterns \
+                                          if not rule[0] or rule[0]==gene ]
+        return self._gene_patterns[gene]
+
+    def range_rule(self, gene, chrom, pos):
+        """Template of the range rule for gene covering chrom pos, or 
+        None"""
+        key = (gene, normalize_chrom(chrom))
+        if key not in self.ranges:
+            return None
+        starts, ends, templates = self.ranges[key]
+        i = bisect_right(starts, pos) - 1
+        if i >= 0 and ends[i] >= pos:
+            return templates[i]
+        return None
+
+    def comment(self, gene, pdot, cds=None, chrom=None, pos=None):
+        """Comment of the first rule for the variant with p. change pdot
+        in three letter codes, or None if no rule applies"""
+        return self.comment_for((gene, pdot, cds, chrom, pos))
+
+    def _comment(self, key):
+        gene, pdot, cds, chrom, pos = key
+        values = variant_values(gene, pdot, cds)
+        templates = [ self.exact.get((gene, pdot)),
+                      self.allvariants.get(gene) ]
+        if chrom is not None and pos is not None:
+            templates.append(self.range_rule(gene, chrom, pos))
+        for template in templates:
+            if template:
+                text = template.format(values)
+                if text is not None:
+                    return text
+        for rulegene, patt, cdspatt, template in self.gene_patterns(gene):
+            if patt and not patt.search(pdot):
+                continue
+            if cdspatt and (cds is None or not cdspatt.search(cds)):
+                continue
+            text = template.format(values)
+            if text is not None:
+                return text
+        return None
@@ -0,0 +1,181 @@
+"""
+dbops.py
+
+sqlite helpers shared by the STAMP QC and water barcode dbs: pooled
+autocommit connections, short write transactions that wait for other
+users' locks, and numbered schema migrations.
+
+Messages go to logfh, sys.stdout unless given.
+"""
+
+import datetime
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# The dbs are on a shared drive used from several computers at once, so
+# they keep the rollback journal (DELETE); users wait for each other's
+# locks with the busy timeout and BEGIN IMMEDIATE.  WAL lets the
+# spreadsheet be read while another user saves data, but it needs shared
+# memory, so only use it (--journal-mode WAL) for a db on a local disk.
+DB_JOURNAL_MODE = 'DELETE'
+DB_TIMEOUT = 30 # secs to wait for another user's lock
+DB_RETRIES = 4 # tries if db is still locked after DB_TIMEOUT
+DB_POOL_SIZE = 2 # idle connections kept per db
+
+def current_time():
+    return datetime.datetime.now()
+
+def results_as_dict(cursor):
+    """Convert each row from db to dict keyed by column name.
+    Returns a list of dicts"""
+    columns = [ d[0] for d in cursor.description ]
+    data = []
+    for ans in cursor.fetchall():
+        d = dict(zip(columns, ans))
+        data.append(d)
+    return data
+
+def connect_db(dbfile, journal_mode=None, logfh=None):
+    """Connect in autocommit mode; writes are grouped explicitly with
+    write_transaction.  Waits up to DB_TIMEOUT secs for locks held by
+    other users."""
+    (logfh or sys.stdout).write("  Connecting to db {}\n".format(dbfile))
+    dbh = sqlite3.connect(dbfile, timeout=DB_TIMEOUT, isolation_level=None,
+                          check_same_thread=False)
+    journal_mode = journal_mode or DB_JOURNAL_MODE
+    ans = retry_locked(dbh.execute,
+                       "PRAGMA journal_mode={}".format(journal_mode))
+    if ans.fetchone()[0].upper()=='WAL':
+        dbh.execute("PRAGMA synchronous=NORMAL")
+    return dbh
+
+def is_locked_error(e):
+    msg = str(e)
+    return 'locked' in msg or 'busy' in msg
+
+def retry_locked(func, *args):
+    """Call func(*args), retrying with increasing waits if the db is
+    still locked by another user after the busy timeout"""
+    for i in range(DB_RETRIES):
+        try:
+            return func(*args)
+        except sqlite3.OperationalError as e:
+            if not is_locked_error(e) or i==DB_RETRIES-1:
+                raise
+            sys.stderr.write("  Database locked, retrying ({})\n".format(i+1))
+            sys.stderr.flush()
+            time.sleep(2**i)
+
+@contextmanager
+def write_transaction(dbh):
+    """Run block in a write transaction.  BEGIN IMMEDIATE takes the write
+    lock up front, so a second writer waits for it instead of failing
+    partway through its changes.  Keep the block short."""
+    retry_locked(dbh.execute, "BEGIN IMMEDIATE")
+    try:
+        yield dbh.cursor()
+        retry_locked(dbh.execute, "COMMIT")
+    except:
+        dbh.execute("ROLLBACK")
+        raise
+
+class ConnectionPool:
+    """Small pool of connections to one db.  Each connection is used by
+    one caller at a time, so the GUI, the code saving data and the
+    spreadsheet generator can share them between threads."""
+    def __init__(self, dbfile, size=DB_POOL_SIZE, journal_mode=None,
+                 logfh=None):
+        self.dbfile = dbfile
+        self.size = size
+        self.journal_mode = journal_mode
+        self.logfh = logfh
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def get(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return connect_db(self.dbfile, self.journal_mode, self.logfh)
+
+    def put(self, dbh):
+        with self.lock:
+            if len(self.idle) < self.size:
+                self.idle.append(dbh)
+                return
+        dbh.close()
+
+    @contextmanager
+    def connection(self):
+        dbh = self.get()
+        try:
+            yield dbh
+        finally:
+            self.put(dbh)
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for dbh in idle:
+            dbh.close()
+
+def add_schema(dbh, schemafile, logfh=None):
+    (logfh or sys.stdout).write("  Reading schema {}\n".format(schemafile))
+    with open(schemafile, 'r') as fh:
+        schema = ' '.join(fh.readlines())
+    # executescript would commit first, so run statements one at a time
+    # to keep them in the caller's transaction
+    for stmt in schema.split(';'):
+        if stmt.strip():
+            dbh.execute(stmt)
+
+def has_tables(cursor):
+    cursor.execute("SELECT COUNT(*) FROM sqlite_master WHERE type='table'")
+    return cursor.fetchone()[0] > 0
+
+def get_tables(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    return set([ ans[0] for ans in cursor.fetchall() ])
+
+#  Schema migrations.  The schema file is version 0; migrate_db applies
+#  any migration newer than the version recorded in schema_version, so
+#  existing dbs get new indexes and derived tables.  Migrations must be
+#  safe to rerun.
+
+def get_schema_version(cursor):
+    if not 'schema_version' in get_tables(cursor):
+        return 0
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    ans = cursor.fetchone()
+    return ans[0] or 0
+
+def set_schema_version(cursor, version, description):
+    cursor.execute("CREATE TABLE IF NOT EXISTS schema_version ("+\
+                   "version INTEGER PRIMARY KEY, description TEXT, "+\
+                   "last_modified TIMESTAMP)")
+    cursor.execute("REPLACE INTO schema_version (version, description, "+\
+                   "last_modified) VALUES (?,?,?)",
+                   (version, description, current_time()))
+
+def migrate_db(dbh, migrations, logfh=None):
+    """Apply migrations newer than the db's schema version.  migrations
+    is a list of (version, description, schema change, backfill run
+    after schema change).  Each schema change runs in its own
+    transaction; its backfill then runs in short batches and the new
+    version is recorded once the backfill is done."""
+    version = get_schema_version(dbh.cursor())
+    for num, description, upgrade, backfill in migrations:
+        if num <= version:
+            continue
+        (logfh or sys.stdout).write(
+            "  Migrating db to version {}: {}\n".format(num, description))
+        with write_transaction(dbh) as cursor:
+            upgrade(cursor)
+        if backfill:
+            backfill(dbh)
+        with write_transaction(dbh) as cursor:
+            set_schema_version(cursor, num, description)
+    return get_schema_version(dbh.cursor())
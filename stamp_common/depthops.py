@@ -0,0 +1,281 @@
+"""
+depthops.py
+
+Depth reports and whitelist depth (wl_depths) files as numpy arrays.
+The Min Depth of each depth report row is kept as an integer array, and
+the Chr and gene (from Description) of each row as codes into arrays of
+the distinct names, so sorting and coverage checks are done with array
+operations instead of per-row Python code.  The per-base depths of the
+whitelist hotspots are kept in arrays for each contig.  RegionIndex
+looks up the depth report region covering a position.
+"""
+
+import heapq
+import sys
+import numpy
+from bisect import bisect_right
+
+MINDEPTH_COLUMNS = ['Min Depth', 'Min_Depth']
+
+def region_gene(description):
+    """Gene name of a depth report region"""
+    # '_' for STAMPv1 regions; '-' for STAMPv2 regions
+    return description.split('_')[0].split('-')[0]
+
+def _codes(values):
+    """(distinct values, code of each value) as numpy arrays"""
+    if not values:
+        return numpy.array([], dtype=str), numpy.array([], dtype=numpy.intp)
+    return numpy.unique(values, return_inverse=True)
+
+class DepthTable(object):
+    """Min Depth, chrom, region and gene of each row of a depth report.
+    Made from the rows read from tabfile with column names fields; rows
+    are not kept.  chroms, starts and genes are None if the report has
+    no Chr, Start and End, or Description column.  Exits if there is no
+    Min Depth column.
+
+    Attributes:
+    mindepth -- Min Depth of each row
+    chroms, chrom_code -- distinct chroms; index in chroms of each row
+    starts, ends -- region of each row
+    genes, gene_code -- distinct genes; index in genes of each row
+    """
+    def __init__(self, tabfile, fields, rows, outfile=None):
+        self.tabfile = tabfile
+        self.outfile = outfile
+        self.numrows = len(rows)
+        for col in MINDEPTH_COLUMNS:
+            if col in fields:
+                i = fields.index(col)
+                break
+        else:
+            sys.exit("{} Bad format.  ".format(tabfile) +\
+                     "Min Depth column not found.")
+        self.mindepth = numpy.array([ row[i] for row in rows ],
+                                    dtype=str).astype(numpy.int64)
+        self.chroms = self.chrom_code = None
+        if 'Chr' in fields:
+            i = fields.index('Chr')
+            self.chroms, self.chrom_code = _codes([ row[i] for row in rows ])
+        self.starts = self.ends = None
+        if 'Start' in fields and 'End' in fields:
+            i, j = fields.index('Start'), fields.index('End')
+            self.starts = numpy.array([ row[i] for row in rows ],
+                                      dtype=str).astype(numpy.int64)
+            self.ends = numpy.array([ row[j] for row in rows ],
+                                    dtype=str).astype(numpy.int64)
+        self.genes = self.gene_code = None
+        if 'Description' in fields:
+            i = fields.index('Description')
+            self.genes, self.gene_code = _codes([ region_gene(row[i]) \
+                                                  for row in rows ])
+
+    def sort_order(self):
+        """Row indexes sorted by Min Depth; rows with the same Min Depth
+        stay in report order"""
+        return numpy.argsort(self.mindepth, kind='mergesort')
+
+    def low_coverage(self, mincov):
+        """Boolean mask of rows with Min Depth < mincov"""
+        return self.mindepth < mincov
+
+    def low_coverage_genes(self, mincov):
+        """Dict of genes with a row with Min Depth < mincov, with value
+        the chrom of the last such row"""
+        rows = numpy.flatnonzero(self.low_coverage(mincov))
+        genes = self.genes[self.gene_code[rows]].tolist()
+        chroms = self.chroms[self.chrom_code[rows]].tolist()
+        return dict(zip(genes, chroms))
+
+    def chrom_has_coverage(self, chrom, mincov):
+        """True if a row on chrom has Min Depth >= mincov"""
+        code = numpy.flatnonzero(self.chroms==chrom)
+        if not len(code):
+            return False
+        return bool(numpy.any((self.chrom_code==code[0]) & \
+                              (self.mindepth >= mincov)))
+
+def _segment_depths(starts, ends, mindepth):
+    """Split the regions [start, end] at every start and end + 1.
+    Returns (segment starts, Min Depth of each segment) lists, where a
+    segment runs to the next segment start and its Min Depth is the
+    lowest of the regions covering it, or None if none do."""
+    bounds = numpy.unique(numpy.concatenate([starts, ends+1]))
+    first = numpy.searchsorted(bounds, starts).tolist()
+    last = numpy.searchsorted(bounds, ends+1).tolist()
+    order = numpy.argsort(first, kind='mergesort').tolist()
+    mindepth = mindepth.tolist()
+    depths = []
+    covering = [] # heap of (Min Depth, segment after region) of regions
+    j = 0
+    for seg in range(len(bounds)):
+        while j < len(order) and first[order[j]]==seg:
+            heapq.heappush(covering, (mindepth[order[j]], last[order[j]]))
+            j += 1
+        # regions ending before seg are only removed once lowest
+        while covering and covering[0][1] <= seg:
+            heapq.heappop(covering)
+        depths.append(covering[0][0] if covering else None)
+    return bounds.tolist(), depths
+
+class RegionIndex(object):
+    """Index of the regions of a DepthTable, for looking up the Min Depth
+    of the region covering a position with one bisect.  Overlapping
+    regions are split into segments that do not overlap, each with the
+    lowest Min Depth of the regions covering it.  contigs is a dict
+    keyed by chrom of (segment starts, Min Depth) lists."""
+    def __init__(self, table):
+        self.contigs = {}
+        for code, chrom in enumerate(table.chroms.tolist()):
+            rows = numpy.flatnonzero(table.chrom_code==code)
+            self.contigs[chrom] = _segment_depths(table.starts[rows],
+                                                  table.ends[rows],
+                                                  table.mindepth[rows])
+
+    def min_depth(self, chrom, pos):
+        """Min Depth of the region covering chrom pos, or the lowest one
+        if regions overlap.  None if pos is not in a region."""
+        if chrom not in self.contigs:
+            return None
+        bounds, depths = self.contigs[chrom]
+        i = bisect_right(bounds, pos) - 1
+        return depths[i] if i >= 0 else None
+
+WL_DEPTHS_CHUNK = 1 << 24 # bytes of a wl_depths file parsed at a time
+WL_DEPTHS_COLUMNS = 4 # chrom, pos, hotspot, depth
+
+def _int_array(wlfile, values):
+    """numpy array of the integers in list of strings values"""
+    ints = numpy.fromstring(' '.join(values), dtype=numpy.int64, sep=' ')
+    if len(ints) != len(values):
+        sys.exit("{} Bad format.  Position or depth ".format(wlfile) +\
+                 "is not an integer.")
+    return ints
+
+def _wl_depths_chunks(wlfile, chunksize):
+    """Yield (chroms, positions, hotspots, depths) arrays for the lines
+    in each chunk of about chunksize bytes of wl_depths file"""
+    with open(wlfile, 'r') as fh:
+        while True:
+            text = fh.read(chunksize)
+            if not text:
+                break
+            text += fh.readline() # to the end of the last line
+            if '\r' in text:
+                text = text.replace('\r', '')
+            text = text.rstrip('\n')
+            if not text:
+                continue
+            values = text.replace('\n', '\t').split('\t')
+            if len(values) % WL_DEPTHS_COLUMNS:
+                sys.exit("{} Bad format.  Expected ".format(wlfile) +\
+                         "chrom, pos, hotspot and depth columns.")
+            yield (numpy.array(values[0::4]),
+                   _int_array(wlfile, values[1::4]),
+                   numpy.array(values[2::4]),
+                   _int_array(wlfile, values[3::4]))
+
+def _runs(*arrays):
+    """Start index and length of each run of rows with the same values
+    in arrays"""
+    changed = numpy.zeros(len(arrays[0]) - 1, dtype=bool)
+    for a in arrays:
+        changed |= a[1:] != a[:-1]
+    starts = numpy.concatenate([[0], numpy.flatnonzero(changed) + 1])
+    return starts, numpy.diff(numpy.append(starts, len(arrays[0])))
+
+class WhitelistDepths(object):
+    """Per-base depths of the whitelist hotspots in a wl_depths file,
+    which has tab-delimited chrom, pos, hotspot and depth columns and
+    no header.  The file is parsed in chunks with the string columns
+    reduced to the runs of lines with the same chrom and hotspot, so
+    only the positions and depths are kept for each line.
+
+    Attributes:
+    hotspots -- hotspot names, in file order
+    hotspot_chroms -- chrom of each hotspot
+    chroms -- chroms, in file order
+    contigs -- dict keyed by chrom of (pos, depth, hotspot code) arrays
+            for the bases on that chrom, where hotspot code is the
+            index in hotspots
+    """
+    def __init__(self, wlfile, chunksize=WL_DEPTHS_CHUNK):
+        self.wlfile = wlfile
+        self.hotspots = []
+        self.hotspot_chroms = []
+        hotspot_codes = {}
+        runs = [] # [chrom, hotspot code, num bases] of each run of lines
+        positions = []
+        depths = []
+        for chroms, pos, hotspots, depth in _wl_depths_chunks(wlfile,
+                                                              chunksize):
+            if not len(pos):
+                continue
+            positions.append(pos)
+            depths.append(depth)
+            starts, lengths = _runs(chroms, hotspots)
+            for chrom, hotspot, n in zip(chroms[starts].tolist(),
+                                         hotspots[starts].tolist(),
+                                         lengths.tolist()):
+                if hotspot not in hotspot_codes:
+                    hotspot_codes[hotspot] = len(self.hotspots)
+                    self.hotspots.append(hotspot)
+                    self.hotspot_chroms.append(chrom)
+                code = hotspot_codes[hotspot]
+                if runs and runs[-1][:2]==[chrom, code]:
+                    runs[-1][2] += n # run continues from previous chunk
+                else:
+                    runs.append([chrom, code, n])
+        self.chroms = []
+        self.contigs = {}
+        if not runs:
+            return
+        pos = numpy.concatenate(positions)
+        depth = numpy.concatenate(depths)
+        lengths = [ n for chrom, code, n in runs ]
+        codes = numpy.repeat([ code for chrom, code, n in runs ], lengths)
+        for chrom, code, n in runs:
+            if chrom not in self.chroms:
+                self.chroms.append(chrom)
+        contig = numpy.repeat([ self.chroms.index(chrom) for \
+                                chrom, code, n in runs ], lengths)
+        # group the bases of each contig if not already grouped in the file
+        if numpy.any(contig[1:] < contig[:-1]):
+            order = numpy.argsort(contig, kind='mergesort')
+            pos, depth, codes, contig = (pos[order], depth[order],
+                                         codes[order], contig[order])
+        bounds = numpy.searchsorted(contig, numpy.arange(len(self.chroms)+1))
+        for i, chrom in enumerate(self.chroms):
+            s = slice(bounds[i], bounds[i+1])
+            self.contigs[chrom] = (pos[s], depth[s], codes[s])
+
+    def hotspot_coverage(self, mincov):
+        """Coverage of each hotspot.  Returns (min depth, mean depth,
+        fraction of bases with depth >= mincov) arrays, in the order of
+        hotspots"""
+        if not self.hotspots:
+            empty = numpy.array([], dtype=float)
+            return empty, empty, empty
+        depth = numpy.concatenate([ self.contigs[c][1] for c in self.chroms ])
+        codes = numpy.concatenate([ self.contigs[c][2] for c in self.chroms ])
+        if numpy.any(codes[1:] < codes[:-1]):
+            order = numpy.argsort(codes, kind='mergesort')
+            depth, codes = depth[order], codes[order]
+        # every hotspot has a base, so the runs of codes are 0, 1, 2, ...
+        starts, counts = _runs(codes)
+        counts = counts.astype(float)
+        mindepth = numpy.minimum.reduceat(depth, starts)
+        meandepth = numpy.add.reduceat(depth, starts) / counts
+        covered = (depth >= mincov).astype(numpy.int64)
+        fraction = numpy.add.reduceat(covered, starts) / counts
+        return mindepth, meandepth, fraction
+
+    def low_coverage_hotspots(self, mincov):
+        """List of (hotspot, chrom, min depth, mean depth, fraction of
+        bases with depth >= mincov) for hotspots with a base with
+        depth < mincov, in file order"""
+        mindepth, meandepth, fraction = self.hotspot_coverage(mincov)
+        return [ (self.hotspots[i], self.hotspot_chroms[i],
+                  int(mindepth[i]), meandepth[i], fraction[i]) \
+                 for i in numpy.flatnonzero(mindepth < mincov) ]
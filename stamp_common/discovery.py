@@ -0,0 +1,121 @@
+"""
+discovery.py
+
+Finding and classifying the input files given to the STAMP scripts as
+files and folders.  Folders are listed with scandir where it is
+available (os.scandir, or the scandir package in Python 2), whose
+directory entries tell files from folders without a stat of each entry;
+otherwise with os.listdir and a stat of each entry.  On network shares
+each listing and stat is a round trip, so the folders of each level can
+be listed in a pool of threads.
+
+Files are classified by name suffix with a SuffixTable, matching the
+longest suffix with one dict lookup per suffix length.
+"""
+
+import os
+from multiprocessing.pool import ThreadPool
+from operator import itemgetter
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+def list_dir(folder):
+    """(files, folders) in folder as paths, in listing order.  Symlinks
+    are followed; other entries, ie. broken links, are left out."""
+    files = []
+    folders = []
+    if scandir is not None:
+        for entry in scandir(folder):
+            try:
+                if entry.is_dir():
+                    folders.append(entry.path)
+                elif entry.is_file():
+                    files.append(entry.path)
+            except OSError:
+                continue
+    else:
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if os.path.isfile(path):
+                files.append(path)
+            elif os.path.isdir(path):
+                folders.append(path)
+    return files, folders
+
+def find_input_files(inputs, depth=1, threads=1):
+    """List of (file, folders) of the files in inputs, and of the files in
+    the folders in inputs and their subfolders down to depth levels.
+    folders is a tuple of the input folder and the subfolders down to the
+    one holding the file; () for files given in inputs.  Files are listed
+    in the order of inputs, then by level.  The folders of each level are
+    listed in a pool of threads if threads > 1."""
+    found = []
+    level = []
+    for num, path in enumerate(inputs):
+        if os.path.isfile(path):
+            found.append((num, path, ()))
+        elif os.path.isdir(path):
+            level.append((num, path, (path,)))
+    pool = None
+    try:
+        for n in range(depth):
+            if not level:
+                break
+            folders = [ folder for num, folder, parents in level ]
+            if threads > 1 and len(folders) > 1:
+                if pool is None:
+                    pool = ThreadPool(threads)
+                listings = pool.map(list_dir, folders)
+            else:
+                listings = map(list_dir, folders)
+            sublevel = []
+            for (num, folder, parents), (files, subfolders) in \
+                zip(level, listings):
+                found.extend([ (num, f, parents) for f in files ])
+                sublevel.extend([ (num, d, parents + (d,)) \
+                                  for d in subfolders ])
+            level = sublevel
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    # stable, so files of an input keep their level and listing order
+    found.sort(key=itemgetter(0))
+    return [ (f, parents) for num, f, parents in found ]
+
+class SuffixTable(object):
+    """File kinds keyed by file name suffix.  The longest suffix of a file
+    name in the table gives its kind, so a kind of None rejects files
+    that a shorter suffix would match, ie. '_rejected.vcf' before '.vcf'.
+
+    Attributes:
+    kinds -- dict keyed by suffix (lower case if ignorecase) of kind
+    lengths -- suffix lengths, longest first
+    """
+    def __init__(self, suffixes, ignorecase=False):
+        self.ignorecase = ignorecase
+        self.kinds = dict([ (s.lower() if ignorecase else s, kind) \
+                            for s, kind in suffixes.items() ])
+        self.lengths = sorted(set([ len(s) for s in self.kinds ]),
+                              reverse=True)
+
+    def match(self, filename):
+        """(kind, name without the suffix) of the file name of filename;
+        (None, None) if it has no suffix in the table or is rejected"""
+        name = os.path.basename(filename)
+        key = name.lower() if self.ignorecase else name
+        kinds = self.kinds
+        for n in self.lengths:
+            suffix = key[-n:]
+            if suffix in kinds:
+                kind = kinds[suffix]
+                if kind is None:
+                    break
+                return kind, name[:-n]
+        return None, None
@@ -0,0 +1,354 @@
+"""
+fileops.py
+
+Reader for the tab-delimited reports written by the STAMP pipeline
+(variant, fusion, CNV and depth reports) and the truth files, plus
+helpers for replacing output files safely and for locking files shared
+between users.
+"""
+
+import csv
+import errno
+import os
+import socket
+import time
+from contextlib import contextmanager
+from operator import itemgetter
+
+# Reports are plain tab-delimited text with no quoting or escapes, so
+# quotes and backslashes in values are kept as is
+TAB_DIALECT = 'stamp-tab'
+csv.register_dialect(TAB_DIALECT, delimiter='\t', quoting=csv.QUOTE_NONE,
+                     lineterminator='\n')
+LOCK_TIMEOUT = 60 # secs to wait for another user's lock file
+LOCK_STALE = 600 # secs after which a lock file was left by a killed run
+LOCK_POLL = 0.2 # secs between tries to take a lock file
+
+def intern_field(f):
+    return intern(f) if type(f) is str else f
+
+class TabReader(object):
+    """Streaming reader for a tab-delimited file with column headers.
+    Lines starting with commentstart are saved in header; the first
+    other line holds the column names, saved in fields.  Iterating
+    returns a list of values for each non-blank line after that, or a
+    tuple of just the requested values if columns is given.  Columns
+    not in the file, or past the end of a short row, are None.
+    The file is closed once all rows have been read.
+
+    Keyword arguments:
+    columns -- only return these columns, in this order.  Column
+            indexes are looked up once from the column header.
+    fieldfunc -- function to reformat field names from header.
+    commentstart -- comment line prefix; None if the file has no comments.
+    strip -- strip whitespace from values.
+    keeplines -- save the original line of the current row in line.  """
+    def __init__(self, tabfile, columns=None, fieldfunc=None,
+                 commentstart='#', strip=True, keeplines=False):
+        self.tabfile = tabfile
+        self.commentstart = commentstart
+        self.strip = strip
+        self.keeplines = keeplines
+        self.header = []
+        self.fields = []
+        self.line = None
+        self.columns = None
+        self.missing = []
+        self._getter = None
+        self.fh = open(tabfile, 'r')
+        try:
+            self._read_fields(fieldfunc)
+            if columns is not None:
+                self.set_columns(columns)
+        except:
+            self.fh.close()
+            raise
+
+    def _read_fields(self, fieldfunc):
+        commentstart = self.commentstart
+        for line in self.fh:
+            if commentstart and line.startswith(commentstart):
+                self.header.append(line.rstrip())
+            elif line.rstrip('\n\r'):
+                fields = line.rstrip('\t\n\r').split("\t")
+                if self.strip:
+                    fields = [ f.strip() for f in fields ]
+                if fieldfunc:
+                    fields = [ fieldfunc(f) for f in fields ]
+                self.fields = [ intern_field(f) for f in fields ]
+                break
+
+    def set_columns(self, columns):
+        index = {}
+        for i, f in enumerate(self.fields):
+            index.setdefault(f, i)
+        self.columns = list(columns)
+        self.indexes = [ index.get(c) for c in self.columns ]
+        self.missing = [ c for c, i in zip(self.columns, self.indexes) \
+                         if i is None ]
+        if self.missing:
+            self._getter = None
+        elif len(self.indexes)==1:
+            i = self.indexes[0]
+            self._getter = lambda row: (row[i],)
+        else:
+            self._getter = itemgetter(*self.indexes)
+
+    def _project(self, row):
+        """Slow path for missing columns and short rows"""
+        n = len(row)
+        vals = [ row[i] if i is not None and i < n else None \
+                 for i in self.indexes ]
+        if self.strip:
+            vals = [ v.strip() if v is not None else v for v in vals ]
+        return tuple(vals)
+
+    def _lines(self):
+        for line in self.fh:
+            self.line = line
+            yield line
+
+    def __iter__(self):
+        commentstart = self.commentstart
+        strip = self.strip
+        project = self.columns is not None
+        getter = self._getter
+        lines = self._lines() if self.keeplines else self.fh
+        try:
+            for row in csv.reader(lines, TAB_DIALECT):
+                if not row:
+                    continue
+                if commentstart and row[0].startswith(commentstart):
+                    self.header.append('\t'.join(row).rstrip())
+                    continue
+                if not project:
+                    yield map(str.strip, row) if strip else row
+                    continue
+                if getter:
+                    try:
+                        vals = getter(row)
+                    except IndexError:
+                        yield self._project(row)
+                        continue
+                    yield tuple(map(str.strip, vals)) if strip else vals
+                else:
+                    yield self._project(row)
+        finally:
+            self.close()
+
+    def close(self):
+        self.fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class MissingValue(object):
+    """Placeholder for fields a TabRow does not have a value for"""
+
+class TabHeader(object):
+    """Field name to column index map shared by all rows of a tab file.
+    Fields set on rows that are not in the file header are appended."""
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.index = dict([ (f, i) for i, f in enumerate(self.fields) ])
+
+    def add_field(self, field):
+        if not field in self.index:
+            self.index[field] = len(self.fields)
+            self.fields.append(field)
+        return self.index[field]
+
+class TabRow(object):
+    """Row of a tab file stored as a list of values in header order.
+    Behaves like a dict keyed by field name so rows can be used in place
+    of the dicts returned by results_as_dict.  Use asdict() to get a
+    real dict."""
+    __slots__ = ('header', 'values')
+
+    def __init__(self, header, values):
+        self.header = header
+        self.values = values
+
+    def __getstate__(self):
+        return (self.header, self.values)
+
+    def __setstate__(self, state):
+        (self.header, self.values) = state
+
+    def __getitem__(self, key):
+        try:
+            v = self.values[self.header.index[key]]
+        except (KeyError, IndexError):
+            raise KeyError(key)
+        if v is MissingValue:
+            raise KeyError(key)
+        return v
+
+    def __setitem__(self, key, value):
+        i = self.header.index.get(key)
+        if i is None:
+            i = self.header.add_field(key)
+        values = self.values
+        if i >= len(values):
+            values.extend([MissingValue]*(i+1-len(values)))
+        values[i] = value
+
+    def __delitem__(self, key):
+        self[key] # raises KeyError if missing
+        self.values[self.header.index[key]] = MissingValue
+
+    def __contains__(self, key):
+        i = self.header.index.get(key)
+        return i is not None and i < len(self.values) and \
+               self.values[i] is not MissingValue
+
+    def get(self, key, default=None):
+        i = self.header.index.get(key)
+        if i is None or i >= len(self.values) or \
+           self.values[i] is MissingValue:
+            return default
+        return self.values[i]
+
+    def keys(self):
+        return [ f for f in self.header.fields if f in self ]
+
+    def items(self):
+        return [ (f, self[f]) for f in self.keys() ]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def asdict(self):
+        return dict(self.items())
+
+    def copy(self):
+        return TabRow(self.header, self.values[:])
+
+    def __repr__(self):
+        return repr(self.asdict())
+
+def parse_tab_file(tabfile, keyfunc=None, fieldfunc=None, requiredfield=None,
+                   keepline=False, commentstart='#', strip=True, columns=None):
+    """Parse a tab-delimited file with column headers.  Returns a dict with
+       key values:
+       'fields': a list of fields in the order they appear in the column header
+       'header': a list of the comment lines in the file
+       'data': a list of TabRow objects containing the values of each row in
+               the order they appear in the file.  Rows act as dicts keyed by
+               field name with values the row values.  If the optional arg
+               keyfunc is supplied, then and additional key 'dkey' is added
+               with value the result from the keyfunc function on that row.
+       'datadict': (optional) a dict keyed by the result of keyfunc operated on
+               the row with value the row.  This value only appears
+               if keyfunc is present.
+
+       Keyword arguments:
+       keyfunc -- function to create a unique key for each row of data.  The
+               supplied function should take a dict as its only argument and
+               return a unique key for each data row.
+       fieldfunc -- function to reformat field names from header.
+       requiredfield -- skip rows where this field is empty.
+       keepline -- add key 'line' to each row with the original line from
+               the file.
+       commentstart, strip -- as for TabReader.
+       columns -- only keep these columns, in this order.  Columns not in
+               the file are left out of 'fields' and the rows.  """
+    data = []
+    datadict = {}
+    reader = TabReader(tabfile, fieldfunc=fieldfunc,
+                       commentstart=commentstart, strip=strip,
+                       keeplines=keepline)
+    if columns is not None:
+        if requiredfield and not requiredfield in columns:
+            columns = list(columns) + [requiredfield]
+        index = set(reader.fields)
+        keep = []
+        for c in columns:
+            if c in index and not c in keep:
+                keep.append(c)
+        reader.set_columns(keep)
+        fields = keep
+    else:
+        fields = reader.fields
+    numfields = len(fields)
+    tabheader = TabHeader(fields)
+    i_required = tabheader.index.get(requiredfield)
+    for vals in reader:
+        if columns is not None:
+            vals = [ MissingValue if v is None else v for v in vals ]
+        elif len(vals) > numfields:
+            del vals[numfields:]
+        if requiredfield and (i_required is None or \
+           i_required >= len(vals) or \
+           vals[i_required] in ('', MissingValue)):
+            continue
+        d = TabRow(tabheader, vals)
+        if keepline:
+            d['line'] = reader.line
+        data.append(d)
+        if keyfunc:
+            dkey = keyfunc(d)
+            d['dkey'] = dkey
+            datadict[dkey] = d
+    tabfileinfo = {'fields':fields, 'data':data, 'header':reader.header}
+    if keyfunc:
+        tabfileinfo['datadict'] = datadict
+    return tabfileinfo
+
+def temp_outfile(outfile):
+    """Name for temp file next to outfile, so other users never open
+    a partly written file"""
+    base, ext = os.path.splitext(outfile)
+    return "{}.tmp{}{}".format(base, os.getpid(), ext)
+
+def replace_file(src, dst):
+    """Move src over dst.  os.rename will not replace a file on Windows"""
+    if os.name=='nt' and os.path.exists(dst):
+        os.remove(dst)
+    os.rename(src, dst)
+
+@contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT, stale=LOCK_STALE):
+    """Hold the lock file path.lock while the block runs, so one process
+    at a time reads, changes and saves path.  The lock file is created
+    with O_EXCL, which also works on a network drive shared between
+    computers.  Waits up to timeout secs for another process's lock and
+    removes a lock file older than stale secs.  Raises IOError on 
+    timeout."""
+    lockfile = path+'.lock'
+    owner = "{} {}\n".format(socket.gethostname(), os.getpid())
+    start = time.time()
+    while True:
+        try:
+            fd = os.open(lockfile, os.O_CREAT|os.O_EXCL|os.O_WRONLY)
+            break
+        except OSError, e:
+            if e.errno!=errno.EEXIST:
+                raise
+        try:
+            if time.time()-os.path.getmtime(lockfile) > stale:
+                os.remove(lockfile)
+                continue
+        except OSError:
+            continue # released or removed by another process
+        if time.time()-start > timeout:
+            try:
+                with open(lockfile) as fh:
+                    holder = fh.read().strip()
+            except IOError:
+                holder = 'unknown'
+            raise IOError("Timed out waiting for lock file {} held by {}".\
+                          format(lockfile, holder))
+        time.sleep(LOCK_POLL)
+    try:
+        os.write(fd, owner)
+        os.close(fd)
+        yield lockfile
+    finally:
+        os.remove(lockfile)
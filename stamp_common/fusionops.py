@@ -0,0 +1,157 @@
+"""
+fusionops.py
+
+Fusion breakpoints and an index for matching fusion calls.  Calls of
+the same fusion event often have breakpoints a few bases apart between
+runs, so fusions are matched by gene pair with both breakpoints within
+a bp tolerance instead of by their exact breakpoint strings.
+FusionIndex keeps the break1 positions of each gene pair in sorted
+lists for each chrom and finds the matches by binary search.
+
+TranscriptIndex holds the transcript of each fusion gene and, if given,
+the exons of those transcripts, for annotating fusion reports.
+"""
+
+import sys
+from bisect import bisect_left, bisect_right
+from stamp_common.fileops import TabReader
+
+FUSION_BREAK_TOLERANCE = 10 # max bp between breakpoints of the same fusion
+EXON_COLUMNS = ['Transcript', 'Exon', 'Chr', 'Start', 'End']
+
+def parse_breakpoint(breakpoint):
+    """(chrom, pos) of a chrom:pos breakpoint.  Breakpoints not in that
+    format are (breakpoint, 0), so they only match the same string."""
+    chrom, sep, pos = str(breakpoint).rpartition(':')
+    if sep and pos.isdigit():
+        return chrom, int(pos)
+    return str(breakpoint), 0
+
+class FusionIndex(object):
+    """Fusions keyed by gene pair (region1, region2), with the break1
+    positions on each chrom in sorted lists.  Each fusion is added with
+    a key, returned when a fusion call matches it.
+
+    Attributes:
+    pairs -- dict keyed by gene pair of dicts keyed by break1 chrom of
+            (sorted break1 positions, (break2 chrom, break2 pos, key) of
+            each)
+    """
+    def __init__(self):
+        self.pairs = {}
+
+    def add(self, region1, region2, break1, break2, key):
+        chrom1, pos1 = parse_breakpoint(break1)
+        chrom2, pos2 = parse_breakpoint(break2)
+        contigs = self.pairs.setdefault((region1, region2), {})
+        positions, fusions = contigs.setdefault(chrom1, ([], []))
+        i = bisect_right(positions, pos1)
+        positions.insert(i, pos1)
+        fusions.insert(i, (chrom2, pos2, key))
+
+    def find(self, region1, region2, break1, break2,
+             tolerance=FUSION_BREAK_TOLERANCE):
+        """Key of the fusion of region1-region2 with break1 and break2
+        both within tolerance bp, the closest one if more than one.
+        None if no fusion matches."""
+        chrom1, pos1 = parse_breakpoint(break1)
+        chrom2, pos2 = parse_breakpoint(break2)
+        contigs = self.pairs.get((region1, region2))
+        if not contigs or chrom1 not in contigs:
+            return None
+        positions, fusions = contigs[chrom1]
+        match = None
+        closest = None
+        for i in range(bisect_left(positions, pos1 - tolerance),
+                       bisect_right(positions, pos1 + tolerance)):
+            chrom, pos, key = fusions[i]
+            if chrom!=chrom2 or abs(pos - pos2) > tolerance:
+                continue
+            dist = abs(positions[i] - pos1) + abs(pos - pos2)
+            if closest is None or dist < closest:
+                match, closest = key, dist
+        return match
+
+def transcript_id(transcript):
+    """Transcript name without the version, ie. NM_005157 for
+    NM_005157.4"""
+    return transcript.strip().split('.')[0]
+
+def read_gene_transcripts(transcriptfile):
+    """Dict keyed by gene of transcript from a tab-delimited file with
+    gene and transcript columns"""
+    transcripts = {}
+    with open(transcriptfile, 'r') as fh:
+        for l in fh:
+            if not l.startswith('#'):
+                data = l.rstrip().split("\t")
+                if len(data)>1:
+                    transcripts[data[0]] = data[1]
+    return transcripts
+
+def read_transcript_exons(exonfile, transcripts=None):
+    """Dict keyed by transcript id of (chrom, starts, ends, exon numbers)
+    with the exons sorted by start, from a tab-delimited file with 
+    EXON_COLUMNS.  Start and End are 1-based and inclusive.  Only the
+    transcripts in transcripts are kept if given."""
+    reader = TabReader(exonfile, columns=EXON_COLUMNS)
+    if reader.missing:
+        reader.close()
+        sys.exit("{} Bad format.  ".format(exonfile) +\
+                 "{} column not found.".format(reader.missing[0]))
+    keep = None
+    if transcripts is not None:
+        keep = set([ transcript_id(t) for t in transcripts ])
+    rows = {}
+    for transcript, exon, chrom, start, end in reader:
+        tid = transcript_id(transcript or '')
+        if not tid or (keep is not None and tid not in keep):
+            continue
+        try:
+            rows.setdefault(tid, []).append((int(start), int(end), chrom,
+                                             int(exon)))
+        except (TypeError, ValueError):
+            sys.exit("{} Bad format.  Exon, Start or End ".format(exonfile)+\
+                     "is not an integer for {}.".format(transcript))
+    exons = {}
+    for tid, tidrows in rows.items():
+        tidrows.sort()
+        exons[tid] = (tidrows[0][2], [ r[0] for r in tidrows ],
+                      [ r[1] for r in tidrows ], [ r[3] for r in tidrows ])
+    return exons
+
+class TranscriptIndex(object):
+    """Transcript of each gene for annotating fusion reports, and the
+    exons of the transcripts if there is an exon file.  Not changed once
+    loaded, so one index is shared by all the reports annotated.
+
+    Attributes:
+    transcripts -- dict keyed by gene of transcript
+    exons -- dict keyed by transcript id of (chrom, starts, ends, exon
+            numbers) with the exons sorted by start
+    """
+    def __init__(self, transcripts, exons=None):
+        self.transcripts = transcripts
+        self.exons = exons
+
+    def has_exons(self):
+        return self.exons is not None
+
+    def transcript(self, gene):
+        return self.transcripts.get(gene, '')
+
+    def exon(self, gene, breakpoint):
+        """'exon N' or 'intron N' of the transcript of gene at the
+        chrom:pos breakpoint; '' if not in the transcript"""
+        tid = transcript_id(self.transcripts.get(gene, ''))
+        if not self.exons or tid not in self.exons:
+            return ''
+        chrom, starts, ends, numbers = self.exons[tid]
+        bchrom, pos = parse_breakpoint(breakpoint)
+        if bchrom!=chrom or pos < starts[0] or pos > ends[-1]:
+            return ''
+        i = bisect_right(starts, pos) - 1
+        if pos <= ends[i]:
+            return 'exon {}'.format(numbers[i])
+        # introns are numbered by the lower exon in transcript order
+        return 'intron {}'.format(min(numbers[i], numbers[i+1]))
@@ -0,0 +1,109 @@
+"""
+hgvsops.py
+
+HGVS p. (protein) notation.  Amino acid changes are converted between
+one letter codes (V600E) and three letter codes (Val600Glu) with maps
+built once from AMINO_ACIDS, and single amino acid changes are parsed
+into an AAChange.  Reports repeat the same changes on many rows, so the
+results for each distinct string are kept in an LRU cache.
+"""
+
+import re
+from collections import namedtuple
+from functools import wraps
+
+HGVS_CACHE_SIZE = 10000 # distinct strings cached by each function
+
+# (one letter code, three letter code, name)
+AMINO_ACIDS = [
+    ('A', 'Ala', 'Alanine'),
+    ('R', 'Arg', 'Arginine'),
+    ('N', 'Asn', 'Asparagine'),
+    ('D', 'Asp', 'Aspartic acid'),
+    ('C', 'Cys', 'Cysteine'),
+    ('Q', 'Gln', 'Glutamine'),
+    ('E', 'Glu', 'Glutamic acid'),
+    ('G', 'Gly', 'Glycine'),
+    ('H', 'His', 'Histidine'),
+    ('I', 'Ile', 'Isoleucine'),
+    ('L', 'Leu', 'Leucine'),
+    ('K', 'Lys', 'Lysine'),
+    ('M', 'Met', 'Methionine'),
+    ('F', 'Phe', 'Phenylalanine'),
+    ('P', 'Pro', 'Proline'),
+    ('O', 'Pyl', 'Pyrrolysine'),
+    ('S', 'Ser', 'Serine'),
+    ('U', 'Sec', 'Selenocysteine'),
+    ('T', 'Thr', 'Threonine'),
+    ('W', 'Trp', 'Tryptophan'),
+    ('Y', 'Tyr', 'Tyrosine'),
+    ('V', 'Val', 'Valine'),
+    ('B', 'Asx', 'Aspartic acid or Asparagine'),
+    ('Z', 'Glx', 'Glutamic acid or Glutamine'),
+    ('J', 'Xle', 'Leucine of Isoleucine'),
+    ('X', 'Ter', 'Termination codon'),
+]
+AA_ONE_TO_THREE = dict([ (one, three) for one, three, name in AMINO_ACIDS ])
+AA_THREE_TO_ONE = dict([ (three, one) for one, three, name in AMINO_ACIDS ])
+AA_NAMES = dict([ (one, name) for one, three, name in AMINO_ACIDS ])
+AA_THREE_PATT = re.compile('[A-Z][a-z][a-z]')
+SINGLE_AA_CHANGE = re.compile(r'(?:p\.)?([A-Z](?:[a-z][a-z])?)(\d+)' +\
+                              r'([A-Z](?:[a-z][a-z])?)$')
+
+AAChange = namedtuple('AAChange', ['ref', 'codon', 'alt'])
+
+def lru_cache(maxsize=HGVS_CACHE_SIZE):
+    """Decorator keeping the results of a function of one string for
+    about the maxsize most recently used strings.  Results are kept in
+    a new and an old generation; a hit in the old one moves the result
+    to the new one, and the old one is dropped when the new one is full.
+    A hit in the new generation is one dict lookup."""
+    def decorator(func):
+        cache = [{}, {}] # new, old generation
+        @wraps(func)
+        def wrapper(s):
+            try:
+                return cache[0][s]
+            except KeyError:
+                pass
+            old = cache[1]
+            value = old.pop(s) if s in old else func(s)
+            if len(cache[0]) >= maxsize:
+                cache[1] = cache[0]
+                cache[0] = {}
+            cache[0][s] = value
+            return value
+        wrapper.cache = cache
+        return wrapper
+    return decorator
+
+def _three_to_one(matchobj):
+    m = matchobj.group(0)
+    return AA_THREE_TO_ONE.get(m, m)
+
+@lru_cache()
+def one_to_three(change):
+    """Amino acid change with one letter codes in three letter codes,
+    ie. Val600Glu for V600E.  Every capital letter is a code."""
+    return ''.join([ AA_ONE_TO_THREE.get(c, c) for c in change ])
+
+@lru_cache()
+def three_to_one(change):
+    """Amino acid change with three letter codes in one letter codes,
+    ie. p.V600E for p.Val600Glu"""
+    return AA_THREE_PATT.sub(_three_to_one, change)
+
+@lru_cache()
+def parse_aa_change(change):
+    """AAChange with one letter ref and alt and the codon of a single
+    amino acid change in one or three letter codes, ie. ('V', '600', 'E')
+    for V600E or p.Val600Glu.  None for other changes."""
+    match = SINGLE_AA_CHANGE.match(change)
+    if not match:
+        return None
+    ref, codon, alt = match.groups()
+    ref = AA_THREE_TO_ONE.get(ref, ref)
+    alt = AA_THREE_TO_ONE.get(alt, alt)
+    if ref not in AA_NAMES or alt not in AA_NAMES:
+        return None
+    return AAChange(ref, codon, alt)
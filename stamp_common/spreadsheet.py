@@ -0,0 +1,24 @@
+"""
+spreadsheet.py
+
+xlsxwriter helpers shared by the STAMP spreadsheets.
+"""
+
+def convert_to_excel_col(colnum):
+    """Excel column letters for 0-based column number"""
+    mod = colnum % 26
+    let = chr(mod+65)
+    if colnum >= 26:
+        rep = colnum/26
+        let1 = chr(rep+64)
+        let = let1 + let
+    return let
+
+def add_formats_to_workbook(workbook, formats):
+    """Add formats to workbook.  formats is a dict keyed by format name
+    with value the xlsxwriter format properties.  Returns a dict keyed
+    by format name with value the workbook format."""
+    wbformat = {}
+    for name, props in sorted(formats.items()):
+        wbformat[name] = workbook.add_format(props)
+    return wbformat
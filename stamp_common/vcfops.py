@@ -0,0 +1,133 @@
+"""
+vcfops.py
+
+Reading and sorting VCF records.  Records are sorted by contig, in the
+order of the ##contig lines in the VCF header, then by position.
+Contigs not in the header follow in natural order: 1-22, X, Y, MT, then
+any others by name.  Records at the same position keep their file order.
+"""
+
+import heapq
+import re
+import tempfile
+
+VCF_SORT_CHUNK = 100000 # max records sorted in memory at a time
+CONTIG_LINE = re.compile(r'##contig=<(?:.*,)?ID=([^,>]+)')
+NAMED_CONTIGS = ['X', 'Y', 'M', 'MT']
+
+def record_pos(line):
+    """(chrom, pos) of a VCF record"""
+    row = line.split("\t", 2)
+    return row[0], int(row[1])
+
+def natural_contig_key(chrom):
+    """Sort key for contigs not in the VCF header"""
+    name = chrom[3:] if chrom.startswith('chr') else chrom
+    if name.isdigit():
+        return (0, int(name), name)
+    if name in NAMED_CONTIGS:
+        return (1, NAMED_CONTIGS.index(name), name)
+    return (2, 0, name)
+
+class ContigOrder(object):
+    """Integer rank for each contig; header contigs in header order,
+    followed by other contigs in natural order"""
+    def __init__(self, headercontigs, othercontigs=()):
+        self.rank = {}
+        for chrom in headercontigs:
+            self.rank.setdefault(chrom, len(self.rank))
+        others = set(othercontigs).difference(self.rank)
+        for chrom in sorted(others, key=natural_contig_key):
+            self.rank[chrom] = len(self.rank)
+
+    def key(self, line):
+        """(contig rank, pos) sort key for a VCF record"""
+        row = line.split("\t", 2)
+        return self.rank[row[0]], int(row[1])
+
+def scan_vcf(vcffile):
+    """Read VCF once.  Returns the header lines, the ContigOrder for
+    the contigs in the header and records, and whether the records are
+    already in sorted order."""
+    vcfhead = []
+    headercontigs = []
+    runs = [] # contigs in record order, one entry per run of records
+    in_order = True # positions increase within each run
+    lastchrom = None
+    lastpos = 0
+    with open(vcffile, 'r') as fh:
+        for line in fh:
+            if line.startswith('#'):
+                vcfhead.append(line)
+                match = CONTIG_LINE.match(line)
+                if match:
+                    headercontigs.append(match.group(1))
+                continue
+            chrom, pos = record_pos(line)
+            if chrom==lastchrom:
+                if pos < lastpos:
+                    in_order = False
+            else:
+                runs.append(chrom)
+            lastchrom = chrom
+            lastpos = pos
+    order = ContigOrder(headercontigs, runs)
+    ranks = [ order.rank[chrom] for chrom in runs ]
+    is_sorted = in_order and all(a < b for a, b in zip(ranks, ranks[1:]))
+    return vcfhead, order, is_sorted
+
+def vcf_records(vcffile):
+    """Yield VCF records in file order"""
+    with open(vcffile, 'r') as fh:
+        for line in fh:
+            if not line.startswith('#'):
+                yield line
+
+def _keyed_records(fh, order, chunknum):
+    fh.seek(0)
+    for i, line in enumerate(fh):
+        yield order.key(line), chunknum, i, line
+
+def sorted_vcf_records(vcffile, order, chunksize=VCF_SORT_CHUNK):
+    """Yield VCF records sorted by order, a ContigOrder from scan_vcf.
+    At most chunksize records are held in memory; larger files are
+    sorted in chunks saved to temp files, which are then merged."""
+    chunks = []
+    records = []
+    try:
+        for line in vcf_records(vcffile):
+            records.append(line)
+            if len(records) >= chunksize:
+                records.sort(key=order.key)
+                tmpfh = tempfile.TemporaryFile()
+                tmpfh.writelines(records)
+                chunks.append(tmpfh)
+                records = []
+        records.sort(key=order.key)
+        if not chunks:
+            for line in records:
+                yield line
+            return
+        tmpfh = tempfile.TemporaryFile()
+        tmpfh.writelines(records)
+        chunks.append(tmpfh)
+        records = []
+        merged = heapq.merge(*[ _keyed_records(tmpfh, order, i) \
+                                for i, tmpfh in enumerate(chunks) ])
+        for key, chunknum, i, line in merged:
+            yield line
+    finally:
+        for tmpfh in chunks:
+            tmpfh.close()
+
+def write_sorted_vcf(vcffile, outfile, chunksize=VCF_SORT_CHUNK):
+    """Write VCF with records in sorted order to outfile"""
+    vcfhead, order, is_sorted = scan_vcf(vcffile)
+    if is_sorted:
+        records = vcf_records(vcffile)
+    else:
+        records = sorted_vcf_records(vcffile, order, chunksize)
+    with open(outfile, 'w') as ofh:
+        ofh.writelines(vcfhead)
+        ofh.writelines(records)
+    return outfile
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for writing a sorted depth report xlsx.
+
+Makes a depth report of ROWS rows in a temp folder from the rows of a
+test depth report, with the depths of each copy scaled at random so the
+rows sort and highlight differently, then times create_depth_report_xlsx
+on it.
+
+    python benchmark_depth_report.py [-n ROWS] [-r REPEATS] [-s SEED]
+
+Prints the time of each repeat and the best one.
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+
+from stamp_postprocess import create_depth_report_xlsx, getScriptPath
+
+TEST_REPORT = os.path.join(getScriptPath(), os.pardir, "testfiles",
+                           "v1.2data", "HD753.depth_report_snvs.txt")
+DEPTH_COLUMNS = ('Min_Depth', 'Max_Depth', 'Average_Depth', 'Median_Depth')
+
+def make_depth_report(outfile, numrows, seed):
+    """Write a depth report with numrows rows copied from TEST_REPORT,
+    each copy with its depths scaled by a random factor"""
+    with open(TEST_REPORT) as fh:
+        lines = fh.readlines()
+    # comment lines, then the column names
+    numheader = [ l.startswith('#') for l in lines ].index(False) + 1
+    header = lines[:numheader]
+    rows = [ l.rstrip('\n').split('\t') for l in lines[numheader:] ]
+    fields = header[-1].rstrip('\n').split('\t')
+    depthcols = [ fields.index(f) for f in DEPTH_COLUMNS ]
+    rng = random.Random(seed)
+    with open(outfile, 'w') as out:
+        out.write(''.join(header))
+        for n in range(numrows):
+            row = list(rows[n % len(rows)])
+            scale = rng.uniform(0.05, 2.0)
+            for i in depthcols:
+                value = float(row[i])*scale
+                row[i] = "{:g}".format(value) if '.' in row[i] else \
+                         str(int(value))
+            out.write('\t'.join(row)+'\n')
+
+def benchmark(numrows, repeats, seed):
+    tmpdir = tempfile.mkdtemp(prefix='benchmark_depth_report')
+    try:
+        report = os.path.join(tmpdir, 'BENCH.depth_report_snvs.txt')
+        make_depth_report(report, numrows, seed)
+        args = Namespace(outdir=tmpdir, debug=False)
+        times = []
+        for n in range(repeats):
+            start = time.time()
+            create_depth_report_xlsx(report, args)
+            times.append(time.time()-start)
+        return times
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__=='__main__':
+    parser = ArgumentParser(description="Time writing a depth report "+\
+                            "xlsx for a generated depth report.")
+    parser.add_argument("-n", "--rows", type=int, default=5000,
+                        help="Rows in the depth report (default: 5000)")
+    parser.add_argument("-r", "--repeats", type=int, default=3,
+                        help="Times to write the xlsx (default: 3)")
+    parser.add_argument("-s", "--seed", type=int, default=1,
+                        help="Random seed for the depths (default: 1)")
+    args = parser.parse_args()
+    times = benchmark(args.rows, args.repeats, args.seed)
+    print "create_depth_report_xlsx, {} rows: {}".format(args.rows,
+          ' '.join([ "{:.3f}s".format(t) for t in times ]))
+    print "best of {}: {:.3f}s".format(args.repeats, min(times))
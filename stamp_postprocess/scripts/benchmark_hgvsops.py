@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for the HGVS p. notation conversions in stamp_common.hgvsops.
+
+Reads the AA Change column of every variant report in the testfiles
+folders of the stamp_scripts tree, then times converting all of them
+PASSES times, as the reports are processed:
+
+  one to three letter -- one_to_three, for the stamp_postprocess pdot
+  names and codon -- parse_aa_change and AA_NAMES, for comment snippets
+  three to one letter -- three_to_one, for the addendum variant lines
+
+The caches are cleared before each repeat.
+
+    python benchmark_hgvsops.py [-p PASSES] [-r REPEATS]
+
+Prints the best time of the repeats for each conversion.
+"""
+
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+# the shared stamp_common package is at the top of the stamp_scripts tree
+ROOT_DIR = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])),
+                        os.pardir, os.pardir)
+sys.path.insert(1, ROOT_DIR)
+from stamp_common.fileops import TabReader
+from stamp_common.hgvsops import AA_NAMES, one_to_three, parse_aa_change, \
+     three_to_one
+
+def find_variant_reports(folder):
+    """Variant reports in the testfiles folders under folder"""
+    reports = []
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames[:] = [ d for d in dirnames if d!='.git' ]
+        if not 'testfiles' in dirpath.split(os.sep):
+            continue
+        reports.extend([ os.path.join(dirpath, f) for f in filenames \
+                         if f.endswith('.variant_report.txt') ])
+    return sorted(reports)
+
+def read_aa_changes(reports):
+    """AA Change values of all rows of reports"""
+    changes = []
+    for report in reports:
+        changes.extend([ aa for (aa,) in TabReader(report,
+                         columns=['AA Change']) if aa ])
+    return changes
+
+def clear_caches():
+    for func in (one_to_three, three_to_one, parse_aa_change):
+        func.cache[:] = [{}, {}]
+
+def convert_one_to_three(changes, pdots):
+    for aa in changes:
+        one_to_three(aa)
+
+def convert_names_and_codon(changes, pdots):
+    for pdot in pdots:
+        change = parse_aa_change(pdot)
+        if change:
+            values = (AA_NAMES[change.ref], change.codon, 
+                      AA_NAMES[change.alt])
+
+def convert_three_to_one(changes, pdots):
+    for pdot in pdots:
+        three_to_one(pdot)
+
+CONVERSIONS = [
+    ('one to three letter', convert_one_to_three),
+    ('names and codon', convert_names_and_codon),
+    ('three to one letter', convert_three_to_one),
+]
+
+def benchmark(changes, passes, repeats):
+    """List of (label, best time) of each conversion"""
+    pdots = [ 'p.'+one_to_three(aa) for aa in changes ]
+    results = []
+    for label, convert in CONVERSIONS:
+        times = []
+        for n in range(repeats):
+            clear_caches()
+            start = time.time()
+            for p in range(passes):
+                convert(changes, pdots)
+            times.append(time.time()-start)
+        results.append((label, min(times)))
+    return results
+
+if __name__=='__main__':
+    parser = ArgumentParser(description="Time the hgvsops conversions "+\
+                            "on the AA changes of the test variant reports.")
+    parser.add_argument("-p", "--passes", type=int, default=5,
+                        help="Times to convert all the AA changes "+\
+                             "(default: 5)")
+    parser.add_argument("-r", "--repeats", type=int, default=3,
+                        help="Times to repeat each benchmark (default: 3)")
+    args = parser.parse_args()
+    reports = find_variant_reports(ROOT_DIR)
+    changes = read_aa_changes(reports)
+    print "{} variant reports, {} AA changes, {} distinct".format(
+          len(reports), len(changes), len(set(changes)))
+    for label, secs in benchmark(changes, args.passes, args.repeats):
+        print "  {:20s} {:.3f}s".format(label, secs)
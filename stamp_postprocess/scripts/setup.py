@@ -1,4 +1,12 @@
+import os
+import sys
 from distutils.core import setup
 import py2exe
 
-setup(console=['scripts/stamp_postprocess.py'])
+# bundle the shared stamp_common package from the top of the stamp_scripts
+# tree with the script
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.realpath(__file__)),
+                                os.pardir, os.pardir))
+
+setup(console=['scripts/stamp_postprocess.py'],
+      options={'py2exe': {'packages': ['stamp_common']}})
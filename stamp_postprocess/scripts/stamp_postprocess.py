@@ -4,7 +4,8 @@
 Variant report:
 Separate ACCEPTED, CHECK_COMPOUND, CHECK_1-5PCT from NOT_REPORTED 
 by yellow hightlighted row and save as Excel file.  Add comment
-snippet
+snippet, and the min depth of the depth report region of each 
+variant if there are depth reports.
 
 Variant report and VCF file:
 Create accepted and rejected VCFs where NOT_REPORTED variants
@@ -15,26 +16,75 @@ Sort depth files by min depth, highlight rows < 200 and
 save as Excel file.
 
 SNV and indel depth reports:
-Create text file with low coverage comment.
+Create text file with low coverage comment.  If there is a whitelist
+depth (wl_depths) file, hotspots with low coverage are added.
 
 Fusion reports with transcripts:
-Add transcripts to fusions.filtered.txt files
+Add transcripts to fusions.filtered.txt files, and the exon or intron
+of each breakpoint if there is a transcript exon file
 
 """
 
+import cPickle
+import math
+import multiprocessing
 import os
+import Queue
 import sys
+import traceback
 import xlsxwriter
-import openpyxl
-import re
-import wx
-import wx.richtext 
 from collections import defaultdict
+from itertools import izip_longest
 from argparse import ArgumentParser
+from cStringIO import StringIO
+
+# the shared stamp_common package is at the top of the stamp_scripts tree;
+# found from the script path since py2exe builds have no __file__
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])),
+                                os.pardir, os.pardir))
+from stamp_common.commentrules import CommentRules
+from stamp_common.depthops import DepthTable, RegionIndex, WhitelistDepths
+from stamp_common.discovery import SuffixTable, find_input_files
+from stamp_common.fileops import TabReader
+from stamp_common.fusionops import TranscriptIndex, read_gene_transcripts, \
+     read_transcript_exons
+from stamp_common.hgvsops import one_to_three
+from stamp_common.spreadsheet import add_formats_to_workbook
+from stamp_common.vcfops import record_pos, scan_vcf, sorted_vcf_records, \
+     vcf_records
 
 VERSION="1.2"
 BUILD="160719"
 
+# changes 261019
+#   list input folders with the shared discovery module and find the
+#   type of each sample file with one suffix table
+#   comment snippet - the frameshift, termination and substitution comments
+#   are rules in docs/comment_snippet_rules.tsv
+#   comment snippet - convert amino acid codes with the shared stamp_common
+#   hgvsops module, cached for each distinct AA change
+#   fusion reports - stream rows to the output file; add the fusions of
+#   all samples in one job sharing the transcript index; add the exon of
+#   each breakpoint with -e
+#   variant report xlsx - add Region Min Depth column from the depth 
+#   reports
+#   low coverage comment - add hotspots with low coverage from the 
+#   wl_depths file
+#   depth reports - sort and find low coverage with numpy arrays; the
+#   low coverage comment uses the tables read for the depth xlsx
+#   write xlsx in one pass without the openpyxl reload; convert the
+#   values of each column with one converter (int, float or text) found
+#   from all its values
+#   run the tasks for each sample in a process pool (-j); the GUI always
+#   runs them in the pool, from a background thread
+#   split vcf - sort by the ##contig order in the vcf header, with integer
+#   (contig rank, pos) keys
+#   split vcf - stream records if vcf is sorted, else sort in chunks
+#   with bounded memory; records not in variant report are rejected
+#   split vcf and low coverage comment only read the report columns they use
+#   use the shared stamp_common package to read reports
+#   move GUI to stamp_postprocess_gui.py so wx is only loaded for the GUI
+
 # version 1.2 changes 160719
 #   add transcripts to fusion files
 #   add comment to variant report xlsx
@@ -59,44 +109,18 @@ LOWCOV_TEXT = "Portions of the following gene(s) failed to meet the"+\
 
 FUSION_TRANSCRIPT_FILE = os.path.join(getScriptPath(), os.pardir, "docs", 
                          "stamp2_fusion_gene_transcripts.txt")
-FUSION_TRANSCRIPTS = {}
-
-AAPATT = re.compile('([A-Z])')
-AA_convert = {
-    'A': ['Ala', 'Alanine',], 
-    'R': ['Arg', 'Arginine',], 
-    'N': ['Asn', 'Asparagine',], 
-    'D': ['Asp', 'Aspartic acid',], 
-    'C': ['Cys', 'Cysteine',], 
-    'Q': ['Gln', 'Glutamine',], 
-    'E': ['Glu', 'Glutamic acid',], 
-    'G': ['Gly', 'Glycine',], 
-    'H': ['His', 'Histidine',], 
-    'I': ['Ile', 'Isoleucine',], 
-    'L': ['Leu', 'Leucine',], 
-    'K': ['Lys', 'Lysine',], 
-    'M': ['Met', 'Methionine',], 
-    'F': ['Phe', 'Phenylalanine',], 
-    'P': ['Pro', 'Proline',], 
-    'O': ['Pyl', 'Pyrrolysine',], 
-    'S': ['Ser', 'Serine',], 
-    'U': ['Sec', 'Selenocysteine',], 
-    'T': ['Thr', 'Threonine',], 
-    'W': ['Trp', 'Tryptophan',], 
-    'Y': ['Tyr', 'Tyrosine',], 
-    'V': ['Val', 'Valine',], 
-    'B': ['Asx', 'Aspartic acid or Asparagine',], 
-    'Z': ['Glx', 'Glutamic acid or Glutamine',], 
-    'J': ['Xle', 'Leucine of Isoleucine',], 
-    'X': ['Ter', 'Termination codon',], 
-}
-
-def aa_expand(matchobj, num=0):
-    m = matchobj.group(0)
-    expansion = m
-    if m in AA_convert:
-        expansion = AA_convert[m][num]
-    return expansion
+COMMENT_RULES_FILE = os.path.join(getScriptPath(), os.pardir, "docs",
+                     "comment_snippet_rules.tsv")
+COMMENT_RULES = {} # compiled once per process by comment_rules
+
+def comment_rules():
+    """CommentRules from COMMENT_RULES_FILE, compiled once per process"""
+    if 'rules' not in COMMENT_RULES:
+        if not os.path.isfile(COMMENT_RULES_FILE):
+            sys.exit("  Comment rules file {} not found".format(
+                     COMMENT_RULES_FILE))
+        COMMENT_RULES['rules'] = CommentRules(COMMENT_RULES_FILE)
+    return COMMENT_RULES['rules']
 
 def is_float(v):
     try:
@@ -107,14 +131,14 @@ def is_float(v):
 
 #----spreadsheet.py-----------------------------------------------------------
 
-def convert_to_excel_col(colnum):
-    mod = colnum % 26
-    let = chr(mod+65)
-    if colnum > 26:
-        rep = colnum/26
-        let1 = chr(rep+64)
-        let = let1 + let
-    return let
+WB_FORMATS = {
+    'yellow': {'bg_color': '#FFFF00', 'border': 1, 'border_color':'#CDCDCD'},
+    'gold': {'bg_color': '#FFC000', },
+    'red': {'bg_color': '#FF0000', },
+    'green': {'bg_color': '#92D050', },
+}
+
+FLOAT_START = set('0123456789+-.') # first chars of finite numbers
 
 class ExcelRowData:
     def __init__(self, data=None, highlight=None, cell=None):
@@ -122,39 +146,89 @@ class ExcelRowData:
         self.highlight = highlight
         self.cell = cell
 
-def add_formats_to_workbook(workbook):
-    wbformat = {}
-    wbformat['yellow'] = workbook.add_format({'bg_color': '#FFFF00',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['gold'] = workbook.add_format({'bg_color': '#FFC000', })
-    wbformat['red'] = workbook.add_format({'bg_color': '#FF0000', })
-    wbformat['green'] = workbook.add_format({'bg_color': '#92D050', })
-    return wbformat
+def excel_value(r):
+    if r.isdigit():
+        return int(r)
+    elif is_float(r):
+        return float(r)
+    return r
+
+def finite_float(v):
+    """float(v), but ValueError for nan and inf, which xlsx cells can't
+    hold, so they are written as text"""
+    value = float(v)
+    if math.isnan(value) or math.isinf(value):
+        raise ValueError("not a finite number: {}".format(v))
+    return value
+
+def is_number(v):
+    try:
+        finite_float(v)
+    except ValueError:
+        return False
+    return True
+
+def column_converter(values):
+    """int if the non-empty values of a column are all digits, 
+    finite_float if they are all numbers, str if none are.  If only some
+    are numbers, int or finite_float for those; the rest fail to
+    convert."""
+    values = [ v for v in values if v ]
+    if not values:
+        return str
+    if all(v.isdigit() for v in values):
+        return int
+    try:
+        for v in values:
+            finite_float(v)
+        return finite_float
+    except ValueError:
+        pass
+    numbers = [ v for v in values \
+                if v.lstrip()[:1] in FLOAT_START and is_number(v) ]
+    if not numbers:
+        return str
+    return int if all(v.isdigit() for v in numbers) else finite_float
+
+def column_converters(data):
+    """Converter of each column of the ExcelRowData rows in data"""
+    columns = izip_longest(*[ rowdat.data for rowdat in data ],
+                           fillvalue='')
+    return [ column_converter(values) for values in columns ]
 
 def print_spreadsheet_excel(header, data, outfile, sheetname=None):
 #    sys.stderr.write("  Writing {}\n".format(outfile))
     if sheetname and len(sheetname)>30:
         sheetname = sheetname[:30]
-    workbook = xlsxwriter.Workbook(outfile)
+    # rows are written in order so each row can be flushed to the file
+    workbook = xlsxwriter.Workbook(outfile, {'constant_memory': True})
     worksheet = workbook.add_worksheet(sheetname)
-    wbformat = add_formats_to_workbook(workbook)
+    wbformat = add_formats_to_workbook(workbook, WB_FORMATS)
+    converters = column_converters(data)
     numlines = 0
     for i, rowdat in enumerate(header+data):
         fmt = wbformat[rowdat.highlight] if rowdat.highlight else None
         numlines += 1
+        is_header = i < len(header)
         for j, r in enumerate(rowdat.data):
-            if r.isdigit():
-                r = int(r)
-            elif is_float(r):
-                r = float(r)
-            if not rowdat.cell or j==rowdat.cell:
-                worksheet.write(i, j, r, fmt)
+            cellfmt = fmt if not rowdat.cell or j==rowdat.cell else None
+            if is_header:
+                worksheet.write(i, j, excel_value(r), cellfmt)
+            elif not r:
+                if cellfmt:
+                    worksheet.write_blank(i, j, r, cellfmt)
+            elif converters[j] is str:
+                worksheet.write_string(i, j, r, cellfmt)
             else:
-                worksheet.write(i, j, r)
+                try:
+                    value = converters[j](r)
+                except ValueError:
+                    # text in a column with numbers
+                    worksheet.write_string(i, j, r, cellfmt)
+                else:
+                    worksheet.write_number(i, j, value, cellfmt)
 #    worksheet.freeze_panes(len(header), 0)
     workbook.close()
-    wb = openpyxl.load_workbook(outfile)
-    wb.save(outfile)
     return numlines
 
 
@@ -171,20 +245,11 @@ class TabData:
         self.outfile = outfile
 
 def parse_tab_file(tabfile, outfile=None, commentstart='#'):
-    header = []
-    fields = []
-    data = []
-    numlines = 0
-    with open(tabfile, 'r') as fh:
-        for line in fh:
-            numlines += 1
-            if line.startswith(commentstart):
-                header.append(line.rstrip())
-            elif fields: # have fields so data lines follow
-                data.append(line.rstrip().split("\t"))
-            else:
-                fields = line.rstrip().split("\t")
-    return TabData(tabfile, data, fields, header, numlines, outfile)
+    reader = TabReader(tabfile, commentstart=commentstart)
+    data = list(reader)
+    numlines = len(reader.header) + 1 + len(data)
+    return TabData(tabfile, data, reader.fields, reader.header, numlines, 
+                   outfile)
 
 def outfile_name(report, outdir=None, outext='', inext='.txt'):
     outfile = report.replace(inext, '') 
@@ -201,66 +266,48 @@ def create_depth_report_xlsx(report, args):
     if args.debug:
         sys.stderr.write("    Writing {}\n".format(outfile))
     sheetname = os.path.basename(outfile).replace('.xlsx','')
-    header = []
-    fields = None
-    data = defaultdict(list)
     tabdata = parse_tab_file(report, outfile=outfile)
+    table = DepthTable(report, tabdata.fields, tabdata.data, outfile)
     header = [ ExcelRowData([l,]) for l in tabdata.header ]
     header.append(ExcelRowData(tabdata.fields))
-    i_mindepth = None
-    if 'Min Depth' in tabdata.fields:
-        i_mindepth = tabdata.fields.index('Min Depth')
-    elif 'Min_Depth' in tabdata.fields:
-        i_mindepth = tabdata.fields.index('Min_Depth')
-    else:
-        sys.exit("{} Bad format.  ".format(report) +\
-                 "Min Depth column not found.")
-    for row in tabdata.data: # create dict keyed by min depth
-        data[int(row[i_mindepth])].append(row)
-    rows = []
-    for mindepth, row in sorted(data.items()):
-        hi = 'yellow' if mindepth < MINCOVERAGE else None
-        for r in row:
-            rows.append(ExcelRowData(r, hi))
+    lowcov = table.low_coverage(MINCOVERAGE)
+    rows = [ ExcelRowData(tabdata.data[i], 'yellow' if lowcov[i] else None) \
+             for i in table.sort_order() ]
     numxlines = print_spreadsheet_excel(header, rows, outfile, sheetname)
     if tabdata.numlines != numxlines:
         sys.stderr.write("    {} lines in report\n".format(tabdata.numlines))
         sys.stderr.write("    {} lines in spreadsheet\n".format(numxlines))
         sys.exit("  ERROR: Num lines don't match\n")
-    return tabdata
-
-def generate_low_coverage_comment(outlabel, dpindelinfo, dpsnvinfo):
+    return table
+
+def low_coverage_hotspots_text(wldepths):
+    """Lines listing the hotspots in WhitelistDepths wldepths with bases
+    with depth < MINCOVERAGE; empty if there are none"""
+    hotspots = wldepths.low_coverage_hotspots(MINCOVERAGE)
+    if not hotspots:
+        return ''
+    text = "Hotspots with coverage < {}x:\n".format(MINCOVERAGE)
+    for hotspot, chrom, mindepth, meandepth, fraction in hotspots:
+        text += "{} ({}): min {}x, mean {:.0f}x, {:.0%} >= {}x\n".format(
+                hotspot, chrom, mindepth, meandepth, fraction, MINCOVERAGE)
+    return text
+
+def generate_low_coverage_comment(outlabel, dpindeltable, dpsnvtable,
+                                  wldepths=None):
+    """Write low coverage comment for the DepthTables of the indel and 
+    snv depth reports, with low coverage hotspots if given the 
+    WhitelistDepths wldepths.  Returns (outfile, is_female)"""
     low_cov_genes = {}
     is_female = True
-    for tabdata in (dpindelinfo, dpsnvinfo):
-        i_chr = None
-        i_mindepth = None
-        i_description = None
-        if 'Min Depth' in tabdata.fields:
-            i_mindepth = tabdata.fields.index('Min Depth')
-        elif 'Min_Depth' in tabdata.fields:
-            i_mindepth = tabdata.fields.index('Min_Depth')
-        else:
-            sys.exit("{} Bad format.  ".format(tabdata.tabfile) +\
-                     "Min Depth column not found.")
-        if 'Description' in tabdata.fields:
-            i_description = tabdata.fields.index('Description')
-        else:
-            sys.exit("{} Bad format.  ".format(tabdata.tabfile) +\
-                     "Description column not found.")
-        if 'Chr' in tabdata.fields:
-            i_chr = tabdata.fields.index('Chr')
-        else:
-            sys.exit("{} Bad format.  ".format(tabdata.tabfile) +\
-                     "Chr column not found.")
-        for row in tabdata.data: 
-            mindepth = int(row[i_mindepth])
-            if mindepth < MINCOVERAGE:
-                # '_' for STAMPv1 regions; '-' for STAMPv2 regions
-                gene = row[i_description].split('_')[0].split('-')[0]
-                low_cov_genes[gene] = row[i_chr]
-            if row[i_chr]=='chrY' and mindepth >= MALE_MINCOV:
-                is_female = False
+    for table in (dpindeltable, dpsnvtable):
+        for col, names in (('Description', table.genes),
+                           ('Chr', table.chroms)):
+            if names is None:
+                sys.exit("{} Bad format.  ".format(table.tabfile) +\
+                         "{} column not found.".format(col))
+        low_cov_genes.update(table.low_coverage_genes(MINCOVERAGE))
+        if table.chrom_has_coverage('chrY', MALE_MINCOV):
+            is_female = False
     genestr = ', '.join(sorted(low_cov_genes))
     genestr = ', and '.join(genestr.rsplit(', ', 1))
     male_lcc = LOWCOV_TEXT.replace('GENELIST', genestr)
@@ -274,6 +321,10 @@ def generate_low_coverage_comment(outlabel, dpindelinfo, dpsnvinfo):
                female_lcc, male_lcc)
     else:
         lcc = male_lcc
+    if wldepths:
+        hotspot_text = low_coverage_hotspots_text(wldepths)
+        if hotspot_text:
+            lcc += "\n\n" + hotspot_text.rstrip('\n')
     outfile = outlabel + '.low_coverage_comment.txt'
     with open(outfile, 'w') as ofh:
         ofh.write(lcc + '\n')
@@ -281,27 +332,6 @@ def generate_low_coverage_comment(outlabel, dpindelinfo, dpsnvinfo):
     sys.stderr.flush()
     return outfile, is_female
 
-def is_substitution_bases(cdot):
-    """Checks if mutation is simple substitution"""
-    flag = False
-    if '>' in cdot:
-        bases = cdot.lstrip('1234567890').split('>')
-        if len(bases)==2 and len(bases[0])==1 and len(bases[1])==1:
-            flag = True
-    return flag 
-
-def aa_change_names_and_codon(pdot):
-    """Returns full amino acid names and codon for amino acids in AA change"""
-    match = re.match(r"([A-Z])(\d+)([A-Z])$", pdot)
-    result = None
-    if match:
-        (aa1, codon, aa2) = match.groups()
-        aa1_name = AA_convert.get(aa1, ['',''])[1].lower()
-        aa2_name = AA_convert.get(aa2, ['',''])[1].lower()
-        if aa1_name and aa2_name:
-            result = [aa1_name, codon, aa2_name]
-    return result
-
 def add_comment_snippet(tabdata):
     """Variant comments crafted by the fellows generally start with a set
     format that can be auto-generated to save them time.  For examples:  
@@ -316,39 +346,67 @@ def add_comment_snippet(tabdata):
     substitution of alanine for threonine at codon 41
     4. If pdot and AA Change are identical
     The p.747_753del (c.2240_2257del) mutation in the EGFR gene
+    The rest of the comment is from the first rule in COMMENT_RULES_FILE
+    matching the variant.
     """
+    rules = comment_rules()
     tabdata.fields.append('Comment snippet')
     i_aa = tabdata.fields.index('AA Change')
     i_cds = tabdata.fields.index('CDS Change')
     i_gene = tabdata.fields.index('Gene')
     for row in tabdata.data:
         if row[i_aa] != '.' and row[i_cds] != '.':
-            pdot = 'p.'+AAPATT.sub(aa_expand, row[i_aa])
+            pdot = 'p.'+one_to_three(row[i_aa])
             cdot = 'c.'+row[i_cds]
             gene = row[i_gene]
             mutation = '{} ({}, p.{})'.format(pdot, cdot, row[i_aa]) \
                 if pdot != 'p.'+row[i_aa] else '{} ({})'.format(pdot, cdot)
             comment = 'The {} mutation in the {} gene'.format(mutation, gene)
-            if pdot.endswith('fs'):
-                comment += ' results in a frameshift'
-            elif pdot.endswith('Ter'):
-                comment += ' results in a premature termination codon'
-                p = aa_change_names_and_codon(row[i_aa])
-                if p:
-                    comment += ' at amino acid position {}'.format(p[1])
-            elif is_substitution_bases(row[i_cds]):
-                p = aa_change_names_and_codon(row[i_aa])
-#                sys.stderr.write("substitution p {} -> {}\n".format(row[i_aa], p))
-                if p:
-                    n = 'n' if p[2][0] in ('a','i') else ''
-                    comment += ' results in a substitution of '+\
-                      'a{} {} for the wild-type {} at codon {}'.format(n,
-                      p[2], p[0], p[1])
-#            sys.stderr.write(comment+'\n')
+            snippet = rules.comment(gene, pdot, row[i_cds])
+            if snippet:
+                comment += ' '+snippet
             row.append(comment)
     return tabdata
 
-def create_variant_report_xlsx(report, args):
+def add_region_min_depth(tabdata, dpindeltable, dpsnvtable):
+    """Insert Region Min Depth column after Filtered Depth with the Min
+    Depth of the depth report region covering each variant; from the
+    indel depth report for indels and the snv depth report for others.
+    A depth report without regions, or not given, is not used."""
+    indexes = []
+    for table in (dpindeltable, dpsnvtable):
+        if table and table.chroms is not None and table.starts is not None:
+            indexes.append(RegionIndex(table))
+        else:
+            indexes.append(None)
+    if not any(indexes):
+        return tabdata
+    for col in ('Chr', 'Position', 'Ref', 'Var'):
+        if not col in tabdata.fields:
+            sys.exit("{} Bad format.  ".format(tabdata.tabfile) +\
+                     "{} column not found.".format(col))
+    i_chr = tabdata.fields.index('Chr')
+    i_pos = tabdata.fields.index('Position')
+    i_ref = tabdata.fields.index('Ref')
+    i_var = tabdata.fields.index('Var')
+    if 'Filtered Depth' in tabdata.fields:
+        i_new = tabdata.fields.index('Filtered Depth') + 1
+    else:
+        i_new = i_pos + 1
+    tabdata.fields.insert(i_new, 'Region Min Depth')
+    indelindex, snvindex = indexes
+    for row in tabdata.data:
+        is_indel = len(row[i_ref]) != len(row[i_var]) or \
+                   '-' in (row[i_ref], row[i_var])
+        index = indelindex if is_indel else snvindex
+        mindepth = None
+        if index and row[i_pos].isdigit():
+            mindepth = index.min_depth(row[i_chr], int(row[i_pos]))
+        row.insert(i_new, '' if mindepth is None else str(mindepth))
+    return tabdata
+
+def create_variant_report_xlsx(report, args, dpindeltable=None, 
+                               dpsnvtable=None):
     outfile = outfile_name(report, args.outdir, '.xlsx')
     if args.debug:
         sys.stderr.write("    Writing {}\n".format(outfile))
@@ -356,6 +414,7 @@ def create_variant_report_xlsx(report, args):
     fields = None
     highlight_row = ExcelRowData(['']*26, 'gold')
     tabdata = parse_tab_file(report, outfile=outfile)
+    tabdata = add_region_min_depth(tabdata, dpindeltable, dpsnvtable)
     tabdata = add_comment_snippet(tabdata)
     header = [ ExcelRowData([l,]) for l in tabdata.header ]
     header.append(ExcelRowData(tabdata.fields))
@@ -388,367 +447,397 @@ def create_variant_report_xlsx(report, args):
         sys.exit("  ERROR: Unexpected num lines\n")
     return tabdata
 
-def pos_sortkey(chrom, pos):
-    chrom = "%02d" % int(chrom) if chrom.isdigit() else "%-2s" % chrom
-    return "%s.%011d" % (chrom, pos)
-
-def split_vcf(vcffile, vinfo, args):
+def read_variant_status(report):
+    """Status of each variant in report keyed by (chrom, pos) with
+    chrom as in VCF (no 'chr')"""
+    reader = TabReader(report, columns=['Chr', 'Position', 'Status'])
+    if reader.missing:
+        reader.close()
+        sys.exit("{} Bad format.  ".format(report) +\
+                 "{} column not found.".format(reader.missing[0]))
+    variantstatus = {}
+    for chrom, pos, status in reader:
+        variantstatus[(chrom.replace('chr', ''), int(pos))] = intern(status)
+    return variantstatus
+
+def split_vcf(vcffile, report, args):
+    """Write NOT_REPORTED variants to rejected VCF and the other variants
+    in the variant report to accepted VCF, sorted in contig order
+    (see stamp_common.vcfops).
+    VCF records not in the variant report are rejected."""
     label = vcffile.replace('.vcf', '')
     if args.outdir:
         label = os.path.join(args.outdir, os.path.basename(label))
     acceptfile = label + '_accepted.vcf'
     rejectfile = label + '_rejected.vcf'
-    i_status = vinfo.fields.index('Status')
-    i_chrom = vinfo.fields.index('Chr')
-    i_pos = vinfo.fields.index('Position')
-    variantdata = defaultdict(dict)
-    for row in vinfo.data:
-        chrom = row[i_chrom].replace('chr', '')
-        pos = int(row[i_pos])
-        variantdata[chrom][pos] = row[i_status]
-    vcfhead = []
-    vcfaccept = defaultdict(list)
-    vcfreject = defaultdict(list)
-    with open(vcffile, 'r') as fh:
-        for line in fh:
-            if line.startswith('#'):
-                vcfhead.append(line)
+    variantstatus = read_variant_status(report)
+    vcfhead, order, is_sorted = scan_vcf(vcffile)
+    if is_sorted:
+        records = vcf_records(vcffile)
+    else:
+        if args.debug:
+            sys.stderr.write("    VCF not sorted.  Sorting records\n")
+        records = sorted_vcf_records(vcffile, order)
+    numaccept = 0
+    numreject = 0
+    numnotfound = 0
+    lastaccept = None
+    lastreject = None
+    with open(acceptfile, 'w') as afh, open(rejectfile, 'w') as rfh:
+        afh.write(''.join(vcfhead))
+        rfh.write(''.join(vcfhead))
+        for line in records:
+            pos = record_pos(line)
+            status = variantstatus.get(pos)
+            if status is None:
+                numnotfound += 1
+            # count positions, not records, as records at the same 
+            # position are together in sorted order
+            if status is None or status=='NOT_REPORTED':
+                rfh.write(line)
+                if pos != lastreject:
+                    numreject += 1
+                    lastreject = pos
             else:
-                row = line.split("\t", 3)
-                chrom = row[0]
-                pos = int(row[1])
-                sortkey = pos_sortkey(chrom, pos)
-                if variantdata[chrom][pos]=='NOT_REPORTED':
-                    vcfreject[sortkey].append(line)
-                else:
-                    vcfaccept[sortkey].append(line)
-    with open(acceptfile, 'w') as ofh:
-        ofh.write(''.join(vcfhead))
-        ofh.write(''.join([ ''.join(vcfaccept[k]) for k in \
-                  sorted(vcfaccept)]))
-    sys.stderr.write("    Num accepted:{:4d}\n".format(len(vcfaccept)))
-    with open(rejectfile, 'w') as ofh:
-        ofh.write(''.join(vcfhead))
-        ofh.write(''.join([ ''.join(vcfreject[k]) for k in \
-                  sorted(vcfreject)]))
-    sys.stderr.write("    Num rejected:{:4d}\n".format(len(vcfreject)))
+                afh.write(line)
+                if pos != lastaccept:
+                    numaccept += 1
+                    lastaccept = pos
+    sys.stderr.write("    Num accepted:{:4d}\n".format(numaccept))
+    sys.stderr.write("    Num rejected:{:4d}\n".format(numreject))
+    if numnotfound:
+        sys.stderr.write("    Num not in variant report:{:4d}\n".format(
+                         numnotfound))
     return acceptfile, rejectfile
 
-def read_transcript_file(transcriptfile):
+def read_transcript_file(transcriptfile, exonfile=None):
     """Input should be tab-delimited file with two columns: gene and
-    transcript.  Return dict keyed by gene with value transcript."""
+    transcript, and optionally an exon file with the exons of the 
+    transcripts.  Return TranscriptIndex."""
     sys.stderr.write("Reading {}\n".format(transcriptfile))
     if not os.path.isfile(transcriptfile):
         sys.exit("  Fusion transcript file {} not found".format(
                  transcriptfile))
-    transcripts = {}
-    with open(transcriptfile, 'r') as fh:
-        for l in fh:
-            if not l.startswith('#'):
-                data = l.rstrip().split("\t")
-                if len(data)>1:
-                    transcripts[data[0]] = data[1]
-#        transcripts = dict(zip([l.rstrip().split("\t")[:2] for l in fh \
-#                      if "\t" in l.rstrip() and not l.startswith('#')]))
-    return transcripts
-
-def add_transcripts_to_fusion_report(fusionfile, args):
-    fields = []
-    lines = []
-    with open(fusionfile, 'r') as fh:
-        fields = fh.readline().split("\t")
-        lines = [ l for l in fh.readlines() if "\t" in l.rstrip() ]
-    if not lines: 
-        sys.stderr.write("    No fusions\n")
-        return 0
-    else:
-        sys.stderr.write("    {} fusions\n".format(len(lines)))
+    transcripts = read_gene_transcripts(transcriptfile)
+    exons = None
+    if exonfile:
+        sys.stderr.write("Reading {}\n".format(exonfile))
+        if not os.path.isfile(exonfile):
+            sys.exit("  Transcript exon file {} not found".format(exonfile))
+        exons = read_transcript_exons(exonfile, transcripts.values())
+    return TranscriptIndex(transcripts, exons)
+
+def add_transcripts_to_fusion_report(fusionfile, transcripts, args):
+    """Write fusion report with Transcript1 and Transcript2, and Exon1 and
+    Exon2 if transcripts has exons, inserted after Region2.  Rows are
+    written as they are read.  Returns the new file, or 0 if there are
+    no fusions."""
     newfile = fusionfile.replace("filtered.txt",'')+'with_transcripts.txt'
     if args.outdir:
         newfile = os.path.join(args.outdir, os.path.basename(newfile))
-    i_region1 = None
-    i_region2 = None
+    newfields = ['Transcript1', 'Transcript2']
+    if transcripts.has_exons():
+        newfields += ['Exon1', 'Exon2']
+    numfusions = 0
+    ofh = None
     try:
-        i_region1 = fields.index('Region1')
-        i_region2 = fields.index('Region2')
-    except:
-        sys.exit("Bad format file {}".format(fusionfile))
-    i = i_region2 + 1 # insert transcripts after Region2
-    fields[i:0] = ['Transcript1', 'Transcript2']
-    with open(newfile, 'w') as ofh:
-        ofh.write("\t".join(fields))
-        for line in lines:
-            data = line.split("\t")
-            t1 = FUSION_TRANSCRIPTS.get(data[i_region1], '')
-            t2 = FUSION_TRANSCRIPTS.get(data[i_region2], '')
-            data[i:0] = [t1, t2]
-            ofh.write("\t".join(data))
+        with open(fusionfile, 'r') as fh:
+            fields = fh.readline().split("\t")
+            for line in fh:
+                if not "\t" in line.rstrip():
+                    continue
+                if ofh is None: # output only written if there are fusions
+                    try:
+                        i_region1 = fields.index('Region1')
+                        i_region2 = fields.index('Region2')
+                    except ValueError:
+                        sys.exit("Bad format file {}".format(fusionfile))
+                    i_break1 = fields.index('Break1') \
+                               if 'Break1' in fields else None
+                    i_break2 = fields.index('Break2') \
+                               if 'Break2' in fields else None
+                    i = i_region2 + 1 # insert transcripts after Region2
+                    ofh = open(newfile, 'w')
+                    ofh.write("\t".join(fields[:i] + newfields + fields[i:]))
+                data = line.split("\t")
+                region1 = data[i_region1]
+                region2 = data[i_region2]
+                values = [transcripts.transcript(region1), 
+                          transcripts.transcript(region2)]
+                if transcripts.has_exons():
+                    values += [ transcripts.exon(region, data[j].rstrip()) \
+                                if j is not None and j < len(data) else '' \
+                                for region, j in ((region1, i_break1), 
+                                                  (region2, i_break2)) ]
+                data[i:0] = values
+                ofh.write("\t".join(data))
+                numfusions += 1
+    finally:
+        if ofh is not None:
+            ofh.close()
+    if not numfusions: 
+        sys.stderr.write("    No fusions\n")
+        return 0
+    sys.stderr.write("    {} fusions\n".format(numfusions))
     return newfile
 
-def group_files_by_sample(inputfiles):
-    extensions = {
-        '.depth_report_indels.txt': 'dp_indels', 
-        '.depth_report_snvs.txt': 'dp_snvs',
-        '.fusions.filtered.txt': 'fusions',
-        '.variant_report.txt': 'v_report', 
-        '.vcf': 'vcf', }
+# sample file types by file name suffix; None for files not processed
+SAMPLE_FILE_SUFFIXES = SuffixTable({
+    '.depth_report_indels.txt': 'dp_indels', 
+    '.depth_report_snvs.txt': 'dp_snvs',
+    '.fusions.filtered.txt': 'fusions',
+    '.variant_report.txt': 'v_report', 
+    '.vcf': 'vcf', 
+    '.wl_depths.txt': 'wl_depths',
+    '_accepted.vcf': None,
+    '_rejected.vcf': None,
+    '.unfiltered.vcf': None, })
+
+def group_files_by_sample(inputfiles, threads=1):
+    """Sample files in inputfiles, which can be files or folders.  The 
+    folders are listed in a pool of threads if threads > 1."""
     samples = defaultdict(dict)
-    infiles = []
-    for in_arg in inputfiles: # input can be files or folders
-        if os.path.isfile(in_arg):
-            infiles.append(in_arg)
-        elif os.path.isdir(in_arg):
-            infiles.extend([ os.path.join(in_arg, f) for f in \
-                             os.listdir(in_arg) ])
     badfiles = []
-    for infile in infiles:
-        if infile.endswith('_accepted.vcf') or \
-           infile.endswith('_rejected.vcf') or \
-           infile.endswith('.unfiltered.vcf'):
-            badfiles.append(infile)
-            continue
-        notfound = True
-        for ext in extensions:
-            if infile.endswith(ext):
-                sample = os.path.basename(infile).replace(ext,'')
-                samples[sample][extensions[ext]] = infile
-                notfound = False
-                break
-        if notfound:
+    for infile, folders in find_input_files(inputfiles, threads=threads):
+        filetype, sample = SAMPLE_FILE_SUFFIXES.match(infile)
+        if filetype:
+            samples[sample][filetype] = infile
+        else:
             badfiles.append(infile)
     return samples, badfiles
 
-#----gui.py-------------------------------------------------------------------
-
-class StampPostProcess_App(wx.App):
-    def __init__(self, args, **kwargs):
-        self.args = args
-        wx.App.__init__(self, kwargs)
-
-    def OnInit(self):
-        self.frame = StampFrame(self.args)
-        self.frame.Show()
-        self.SetTopWindow(self.frame)
-        return True
-
-class StampRTC(wx.richtext.RichTextCtrl):
-    def __init__(self, parent):
-        wx.richtext.RichTextCtrl.__init__(self, parent, -1, "",
-                        style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
-        self.Bind(wx.EVT_MOUSE_EVENTS, self.DoNothing)
-
-    def DoNothing(self, event):
-        pass
+#----batch.py-----------------------------------------------------------------
+
+# Tasks run for each sample in the order they are reported: (task, sample
+# files needed, tasks that must finish first).  The vcf is only split 
+# after its variant report was formatted without error.
+SAMPLE_TASKS = [
+    ('v_report', ('v_report',), ()),
+    ('vcf', ('vcf',), ('v_report',)),
+    ('dp_indels', ('dp_indels',), ()),
+    ('dp_snvs', ('dp_snvs',), ()),
+    ('lcc', (), ('dp_indels', 'dp_snvs')),
+    ('fusions', ('fusions',), ()),
+]
+TASK_DEPENDS = dict([ (task, depends) for task, f, depends in SAMPLE_TASKS ])
+# Tasks whose results a task uses if the sample has them.  The task waits
+# for them but, unlike the tasks it depends on, still runs if they fail.
+TASK_USES = {
+    'v_report': ('dp_indels', 'dp_snvs'),
+}
+# Tasks run for all the samples that have them in one job, which shares
+# the loaded TranscriptIndex.  They cannot depend on or use other tasks.
+BATCH_TASKS = ('fusions',)
+TASK_WAIT_SECS = 3600 # longest wait for a task in the pool to finish
+TASK_LABELS = {
+    'v_report': 'Formatting variant report',
+    'vcf': 'Splitting vcf',
+    'dp_indels': 'Sorting indel depth report',
+    'dp_snvs': 'Sorting snv depth report',
+    'lcc': 'Generating low coverage comment',
+    'fusions': 'Adding transcripts to fusion file',
+}
 
-    def AddIntroBlurb(self):
-        intro_blurb="This script creates a variety of files depending on "+\
-                    "the combination of STAMP output files received:"
-        intro_items = [     
-            ['Excel variant reports', 
-             'requires sample.variant_report.txt'],
-            ['Accepted and rejected VCF files', 
-             'requires sample.variant_report.txt and sample.vcf'],
-            ['Sorted Excel depth reports', 
-             'requires sample.depth_report_indels.txt and/or ' +\
-             ' sample.depth_report_snvs.txt'],
-            ['Low coverage comment', 
-             'requires sample.depth_report_indels.txt and '+\
-             'sample.depth_report_snvs.txt'],
-            ['Fusion file with transcripts', 'requires fusions.filtered.txt'],
-        ]
-        self.BeginFontSize(10)
-        self.Newline()
-        self.Newline()
-        self.WriteText(intro_blurb)
-        self.Newline()
-        self.BeginSymbolBullet('*', 25, 30)
-        for [label, descr] in intro_items:
-            self.BeginBold()
-            self.WriteText(label)
-            self.EndBold()
-            self.WriteText(' -- '+descr)
-            self.Newline()
-        self.EndSymbolBullet()
-        self.EndFontSize()
-        self.Newline()
-        self.Newline()
-
-class StampFrame(wx.Frame):
-    def __init__(self, args):
-        self.args = args
-        wx.Frame.__init__(self, None, size=(550,500),
-                          title="STAMP Post-Processing v"+VERSION, )
-
-        panel = wx.Panel(self)
-        label = wx.StaticText(panel, -1, "Drop STAMP depth reports, variant "+\
-            " reports, and VCF files here:")
-#        self.rtc = wx.richtext.RichTextCtrl(panel,-1, "",
-#                        style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
-        self.rtc = StampRTC(panel)
-        self.rtc.AddIntroBlurb()
-        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
-        button_quit.SetToolTip(wx.ToolTip("Quit application"))
-        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
-        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
-
-        sizer = wx.BoxSizer(wx.VERTICAL)
-        sizer.Add(label, 0, wx.ALL, 5)
-        sizer.Add(self.rtc, 1, wx.EXPAND|wx.ALL, 5)
-
-        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
-        button_sizer.AddStretchSpacer()
-        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
-        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
-        panel.SetSizer(sizer)
-
-        filedrop = FileDropProcessing(self.rtc, self.args)
-        self.rtc.SetDropTarget(filedrop)
-
-    def OnCloseMe(self, event):
-        self.Close(True)
-
-    def OnCloseWindow(self, event):
-        self.Destroy()
-        
-class FileDropProcessing(wx.FileDropTarget):
-    def __init__(self, window, args):
-        wx.FileDropTarget.__init__(self)
-        self.window = window
-        self.args = args
-        self.num_samples = 0
-        self.oldsamples = {}
-        self.current_pos = 0
-
-    def ScrollWindow(self):
-        pos = self.window.GetScrollRange(wx.VERTICAL)
-        self.window.Scroll(0, pos)
-
-    def WriteFormattedText(self, boldtext='', normaltext='', bullet=False,
-                           newline=True):
-        self.window.MoveEnd()
-        if self.current_pos:
-            self.window.SetCaretPosition(self.current_pos)
-        if bullet:
-            self.window.BeginSymbolBullet('*', 25, 30)
-        if boldtext:
-            self.window.BeginBold()
-            self.window.WriteText(boldtext)
-            self.window.EndBold()
-        if normaltext:
-            self.window.WriteText(normaltext)
-        if newline: 
-            self.window.Newline()
-        if bullet:
-            self.window.EndSymbolBullet()
-        self.ScrollWindow()
-        self.current_pos = self.window.GetCaretPosition()
-
-    def OnDropFiles(self, x, y, filenames):
-        counts = {}
-        samples, badfiles = group_files_by_sample(filenames)
-        if badfiles:
-            self.window.MoveEnd()
-            for badfile in badfiles:
-                self.WriteFormattedText(newline=False,
-                    normaltext="Not a recognized input file: {}\n".\
-                    format(os.path.basename(badfile)))
-                self.ScrollWindow()
-        self.WriteFormattedText(newline=True)
-        for sample, d in sorted(samples.items()):
-            if sample in self.oldsamples:
-                old_d = self.oldsamples[sample]
-                d['sample_num'] = old_d['sample_num']
-                for filetype in ('v_report', 'vcf', 'dp_indels', 'dp_snvs'):
-                    if filetype not in d and filetype in old_d:
-                        d[filetype] = old_d[filetype]
-            else:
-                self.num_samples += 1
-                d['sample_num'] = self.num_samples
-            self.oldsamples[sample] = d
-            sys.stderr.write('Sample {}:  {}\n'.format(d['sample_num'], 
-                             sample))
-            self.WriteFormattedText('Sample {}:  '.format(d['sample_num']),
-                                    sample)
-            try:
-                dpindelinfo = None
-                dpsnvinfo = None
-                vinfo = None
-                if 'v_report' in d:
-                    self.WriteFormattedText("Variant report:  ", 
-                        os.path.basename(d['v_report']), True)
-                    sys.stderr.write("- Formatting variant report\n")
-                    vinfo = create_variant_report_xlsx(d['v_report'], self.args)
-                    if os.path.isfile(vinfo.outfile):
-                        self.WriteFormattedText("","      --Wrote {}".format(
-                            os.path.basename(vinfo.outfile)))
-                    sys.stderr.flush()
-                if 'vcf' in d:
-                    self.WriteFormattedText("VCF file:  ", 
-                        os.path.basename(d['vcf']), True)
-                    if vinfo:
-                        sys.stderr.write("- Splitting vcf\n")
-                        outfiles = split_vcf(d['vcf'], vinfo, self.args)
-                        for outfile in outfiles:
-                            if os.path.isfile(outfile):
-                                self.WriteFormattedText("",
-                                    "      --Wrote {}".format(
-                                    os.path.basename(outfile)))
-                    sys.stderr.flush()
-                if 'dp_indels' in d:
-                    self.WriteFormattedText("Indel depth file:  ", 
-                        os.path.basename(d['dp_indels']), True)
-                    sys.stderr.write("- Sorting indel depth report\n")
-                    dpindelinfo = create_depth_report_xlsx(d['dp_indels'], 
-                                                           self.args)
-                    if os.path.isfile(dpindelinfo.outfile):
-                        self.WriteFormattedText("","      --Wrote {}".format(
-                            os.path.basename(dpindelinfo.outfile)))
-                    sys.stderr.flush()
-                if 'dp_snvs' in d:
-                    self.WriteFormattedText("SNV depth file:  ", 
-                        os.path.basename(d['dp_snvs']), True)
-                    sys.stderr.write("- Sorting snv depth report\n")
-                    dpsnvinfo = create_depth_report_xlsx(d['dp_snvs'], self.args)
-                    if os.path.isfile(dpsnvinfo.outfile):
-                        self.WriteFormattedText("","      --Wrote {}".format(
-                            os.path.basename(dpsnvinfo.outfile)))
-                    sys.stderr.flush()
-                if dpindelinfo and dpsnvinfo:
-                    sys.stderr.write("- Generating low coverage comment\n")
-                    outlabel = outfile_name(dpsnvinfo.tabfile, args.outdir, 
-                                            inext='.depth_report_snvs.txt')
-                    outfile, is_female = generate_low_coverage_comment(
-                                   outlabel, dpindelinfo, dpsnvinfo)
-                    if os.path.isfile(outfile):
-                        gender = '(F)' if is_female else '(M)'
-                        self.WriteFormattedText("",
-                            "      --Wrote {} {}".format(
-                            os.path.basename(outfile), gender))
-                    sys.stderr.flush()
-                if 'fusions' in d:
-                    self.WriteFormattedText("Fusions:  ", 
-                        os.path.basename(d['fusions']), True)
-                    sys.stderr.write("- Adding transcripts to fusion file\n")
-                    newfusionfile = add_transcripts_to_fusion_report(
-                                         d['fusions'], self.args)
-                    if newfusionfile==0:
-                        self.WriteFormattedText("","      --No fusions")
-                    elif newfusionfile and os.path.isfile(newfusionfile):
-                        self.WriteFormattedText("","      --Wrote {}".format(
-                            os.path.basename(newfusionfile)))
-                    sys.stderr.flush()
-            except Exception, e:
-                self.window.WriteText("    ERROR: {} {}\n\n".format(
-                                       type(e).__name__, e))
-                raise
-            self.WriteFormattedText(newline=True)
-
-def run_gui(args):
-    app = StampPostProcess_App(args)
-    app.MainLoop()
+def sample_tasks(d):
+    """Tasks to run for sample files d"""
+    tasks = []
+    for task, filetypes, depends in SAMPLE_TASKS:
+        if all(f in d for f in filetypes) and all(t in tasks for t in depends):
+            tasks.append(task)
+    return tasks
+
+def task_waits_for(task, sampletasks):
+    """Tasks in sampletasks that must finish before task starts"""
+    return [ t for t in TASK_DEPENDS[task] + TASK_USES.get(task, ()) \
+             if t in sampletasks ]
+
+def task_inputs(task, results):
+    """Dict of the values of the tasks in results that task depends on
+    or uses and that finished without error.  None if a task it depends
+    on did not."""
+    if not all(results[t][0]=='ok' for t in TASK_DEPENDS[task]):
+        return None
+    return dict([ (t, results[t][1]) for t in \
+                  TASK_DEPENDS[task] + TASK_USES.get(task, ()) \
+                  if t in results and results[t][0]=='ok' ])
+
+def run_task(task, d, args, transcripts, inputs):
+    """Run task on sample files d.  inputs is a dict of the values 
+    returned by the tasks it depends on.  Returns the file(s) written, 
+    or for the depth reports the DepthTable with the outfile."""
+    if task=='v_report':
+        return create_variant_report_xlsx(d['v_report'], args,
+                                          inputs.get('dp_indels'),
+                                          inputs.get('dp_snvs')).outfile
+    elif task=='vcf':
+        return split_vcf(d['vcf'], d['v_report'], args)
+    elif task in ('dp_indels', 'dp_snvs'):
+        return create_depth_report_xlsx(d[task], args)
+    elif task=='lcc':
+        outlabel = outfile_name(d['dp_snvs'], args.outdir, 
+                                inext='.depth_report_snvs.txt')
+        wldepths = None
+        if 'wl_depths' in d:
+            wldepths = WhitelistDepths(d['wl_depths'])
+        return generate_low_coverage_comment(outlabel, inputs['dp_indels'],
+                                             inputs['dp_snvs'], wldepths)
+    elif task=='fusions':
+        return add_transcripts_to_fusion_report(d['fusions'], transcripts, 
+                                                args)
+
+WORKER_INDEX = {}
+
+def init_task_worker(transcripts):
+    """Load the TranscriptIndex in a process once, not with each job"""
+    WORKER_INDEX['transcripts'] = transcripts
+
+def task_worker(job):
+    """Run a task, in a worker process if jobs > 1.  Stderr is captured 
+    and returned so it can be written out in sample order.  Returns
+    (sample, task, status, value, output) where status is 'ok' with value
+    the result of run_task, 'exit' with value the sys.exit message, or 
+    'error' with value the error."""
+    sample, task, d, args, inputs = job
+    stderr = sys.stderr
+    sys.stderr = StringIO()
+    try:
+        try:
+            value = run_task(task, d, args, WORKER_INDEX['transcripts'],
+                             inputs)
+            status = 'ok'
+        except SystemExit as e:
+            (status, value) = ('exit', e.code)
+        except Exception as e:
+            sys.stderr.write(traceback.format_exc())
+            (status, value) = ('error', "{} {}".format(type(e).__name__, e))
+        output = sys.stderr.getvalue()
+    finally:
+        sys.stderr = stderr
+    return sample, task, status, value, output
+
+def batch_worker(job):
+    """Run a batch task for each of samples, a list of (sample, d).
+    Returns a list of task_worker results, one per sample."""
+    task, samples, args = job
+    return [ task_worker((sample, task, d, args, {})) \
+             for sample, d in samples ]
+
+def pool_worker(job):
+    """Call func(arg) for job (key, func, arg) in a pool worker.  Returns
+    (key, pickled result, None), or (key, None, error) if func raises or
+    its result can't be pickled.  py2.7 apply_async has no error
+    callback, so errors come back through the callback as results."""
+    key, func, arg = job
+    try:
+        return key, cPickle.dumps(func(arg), cPickle.HIGHEST_PROTOCOL), None
+    except Exception as e:
+        return key, None, "{} {}".format(type(e).__name__, e)
+
+def process_samples(samples, args, transcripts, jobs=1, inprocess=True):
+    """Run the tasks for each sample, using a pool of jobs processes if 
+    jobs > 1.  A task starts once the tasks it waits for are done, if 
+    the tasks it depends on finished without error; otherwise it is 
+    'skipped'.  BATCH_TASKS run for all samples in one job.  Yields 
+    (sample, d, results) in sorted sample order, where results is a dict
+    keyed by task with value (status, value, output) from task_worker.
+    task_worker swaps sys.stderr while a task runs, so callers in a
+    thread other than the main thread, ie. the GUI, set inprocess to
+    False to run the tasks in a pool even if jobs is 1."""
+    samples = sorted(samples.items())
+    tasks = dict([ (sample, sample_tasks(d)) for sample, d in samples ])
+    numtasks = sum([ len(t) for t in tasks.values() ])
+    batches = dict([ (task, [ (sample, d) for sample, d in samples \
+                              if task in tasks[sample] ]) \
+                     for task in BATCH_TASKS ])
+    if inprocess and (jobs <= 1 or numtasks <= 1):
+        init_task_worker(transcripts)
+        batched = {}
+        for task in BATCH_TASKS:
+            for result in batch_worker((task, batches[task], args)):
+                batched[(result[0], task)] = result[2:]
+        for sample, d in samples:
+            results = {}
+            pending = list(tasks[sample])
+            while pending:
+                task = [ t for t in pending if all(w in results for w in \
+                         task_waits_for(t, tasks[sample])) ][0]
+                pending.remove(task)
+                inputs = task_inputs(task, results)
+                if task in BATCH_TASKS:
+                    results[task] = batched[(sample, task)]
+                elif inputs is not None:
+                    job = (sample, task, d, args, inputs)
+                    results[task] = task_worker(job)[2:]
+                else:
+                    results[task] = ('skipped', None, '')
+            yield sample, d, results
+        return
+    results = dict([ (sample, {}) for sample, d in samples ])
+    started = set()
+    done = Queue.Queue() # pool_worker results of finished jobs
+    pool = multiprocessing.Pool(max(1, min(jobs, numtasks)), 
+                                init_task_worker, (transcripts,))
+    def start_job(batch, task, func, arg):
+        pool.apply_async(pool_worker, (((tuple(batch), task), func, arg),),
+                         callback=done.put)
+    def start_ready_tasks():
+        """Start tasks whose dependencies are done.  Tasks that are
+        skipped are done at once, so check again until none are."""
+        skipped = True
+        while skipped:
+            skipped = False
+            for sample, d in samples:
+                for task in tasks[sample]:
+                    waits_for = task_waits_for(task, tasks[sample])
+                    if (sample, task) in started or \
+                       not all(t in results[sample] for t in waits_for):
+                        continue
+                    if task in BATCH_TASKS:
+                        batch = [ s for s, sd in batches[task] ]
+                        started.update([ (s, task) for s in batch ])
+                        start_job(batch, task, batch_worker,
+                                  (task, batches[task], args))
+                        continue
+                    started.add((sample, task))
+                    inputs = task_inputs(task, results[sample])
+                    if inputs is not None:
+                        start_job([sample], task, task_worker,
+                                  (sample, task, d, args, inputs))
+                    else:
+                        results[sample][task] = ('skipped', None, '')
+                        skipped = True
+    def finish_job():
+        """Wait for a job to finish and add its task results.  The wait
+        times out so it can be interrupted, and so a task lost with a
+        worker process that was killed does not hang processing."""
+        try:
+            (batch, task), pickled, error = done.get(True, TASK_WAIT_SECS)
+        except Queue.Empty:
+            raise RuntimeError("No task finished in {} secs; ".format(
+                               TASK_WAIT_SECS)+"a worker process may "+\
+                               "have died")
+        if error:
+            taskresults = [ (s, task, 'error', error, '') for s in batch ]
+        else:
+            taskresults = cPickle.loads(pickled)
+            if not task in BATCH_TASKS:
+                taskresults = [taskresults]
+        for (s, t, status, value, output) in taskresults:
+            results[s][t] = (status, value, output)
+    try:
+        start_ready_tasks()
+        for sample, d in samples:
+            while len(results[sample]) < len(tasks[sample]):
+                finish_job()
+                start_ready_tasks()
+            yield sample, d, results[sample]
+    finally:
+        pool.terminate()
+        pool.join()
 
 #-----------------------------------------------------------------------------
 if __name__=='__main__':
+    multiprocessing.freeze_support()
     descr = "This script post-processes STAMP report files."
     descr += " Depth reports will be sorted by Min depth with values less"
     descr += " than 200 highlighted and saved as Excel."
@@ -757,8 +846,10 @@ if __name__=='__main__':
     descr += " If VCF and variant reports are available, the VCF will be"
     descr += " split into accepted and rejected VCF files."
     descr += " A file with low coverage comment is generated if both"
-    descr += " indel and SNV depth reports are input."
-    descr += " Transcripts are added any fusions.filtered.txt files."
+    descr += " indel and SNV depth reports are input, with hotspots with"
+    descr += " low coverage added if a wl_depths file is input."
+    descr += " Transcripts are added any fusions.filtered.txt files,"
+    descr += " and the exons of the breakpoints if an exon file is given."
     parser = ArgumentParser(description=descr)
     parser.add_argument("reports", nargs="*",
                         help="STAMP depth and/or variant report(s)")
@@ -766,60 +857,38 @@ if __name__=='__main__':
                         help="Directory to save output file(s)")
     parser.add_argument("-t", "--transcripts", default=FUSION_TRANSCRIPT_FILE,
                         help="Fusion transcript file")
+    parser.add_argument("-e", "--exons", 
+                        help="Transcript exon file with Transcript, Exon, "+\
+                             "Chr, Start and End columns.  If given, the "+\
+                             "exon or intron of each fusion breakpoint is "+\
+                             "added to the fusion files.")
+    parser.add_argument("-j", "--jobs", type=int, 
+                        default=multiprocessing.cpu_count(),
+                        help="Number of processes used to process samples "+\
+                             "(default: number of CPUs)")
     parser.add_argument("--debug", default=False, action='store_true',
                         help="Write debugging messages")
 
     args = parser.parse_args()
-    FUSION_TRANSCRIPTS = read_transcript_file(args.transcripts)
+    transcripts = read_transcript_file(args.transcripts, args.exons)
     if len(args.reports)==0:
-        run_gui(args)
+        # wx is only needed for the GUI so keep it out of command line runs
+        from stamp_postprocess_gui import run_gui
+        run_gui(args, transcripts)
     else:
-        samples, badfiles = group_files_by_sample(args.reports)
-        for sample, d in sorted(samples.items()):
+        samples, badfiles = group_files_by_sample(args.reports, args.jobs)
+        for sample, d, results in process_samples(samples, args, transcripts,
+                                                  args.jobs):
             sys.stderr.write("\nSample {}\n".format(sample))
-            dpindelinfo = None
-            dpsnvinfo = None
-            vinfo = None
-            sys.stderr.write("- Formatting variant report: ")
-            if 'v_report' in d:
-                sys.stderr.write(" YES\n")
-                vinfo = create_variant_report_xlsx(d['v_report'], args)
-            else:
-                sys.stderr.write(" NO\n")
-            sys.stderr.write("- Splitting vcf: ")
-            if 'vcf' in d and vinfo:
-                sys.stderr.write(" YES\n")
-                split_vcf(d['vcf'], vinfo, args)
-            else:
-                sys.stderr.write(" NO\n")
-            sys.stderr.write("- Sorting indel depth report: ")
-            if 'dp_indels' in d:
-                sys.stderr.write(" YES\n")
-                dpindelinfo = create_depth_report_xlsx(d['dp_indels'], args)
-            else:
-                sys.stderr.write(" NO\n")
-            sys.stderr.write("- Sorting snv depth report: ")
-            if 'dp_snvs' in d:
+            for task, filetypes, depends in SAMPLE_TASKS:
+                sys.stderr.write("- {}: ".format(TASK_LABELS[task]))
+                if not task in results or results[task][0]=='skipped':
+                    sys.stderr.write(" NO\n")
+                    continue
                 sys.stderr.write(" YES\n")
-                dpsnvinfo = create_depth_report_xlsx(d['dp_snvs'], args)
-            else:
-                sys.stderr.write(" NO\n")
-            sys.stderr.write("- Generating low coverage comment: ")
-            if dpindelinfo and dpsnvinfo:
-                sys.stderr.write(" YES\n")
-                outlabel = outfile_name(dpsnvinfo.tabfile, args.outdir, 
-                                        inext='.depth_report_snvs.txt')
-                lcc = generate_low_coverage_comment(outlabel, dpindelinfo, 
-                                                    dpsnvinfo)
-            else:
-                sys.stderr.write(" NO\n")
-            sys.stderr.write("- Adding transcripts to fusion file: ")
-            if 'fusions' in d:
-                sys.stderr.write(" YES\n")
-                numfusions = add_transcripts_to_fusion_report(d['fusions'], args)
-            else:
-                sys.stderr.write(" NO\n")
-
-
-
-
+                status, value, output = results[task]
+                sys.stderr.write(output)
+                if status=='exit':
+                    sys.exit(value)
+                elif status=='error':
+                    sys.exit("  ERROR: {}".format(value))
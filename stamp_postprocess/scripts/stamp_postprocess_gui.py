@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+"""
+wxPython interface for stamp_postprocess.py.  Only imported when
+stamp_postprocess.py is started without any reports.
+"""
+
+import os
+import sys
+import traceback
+import wx
+import wx.richtext
+from threading import Thread
+
+from stamp_postprocess import SAMPLE_TASKS, VERSION, group_files_by_sample, \
+     process_samples
+
+# label for the input file of each task
+TASK_FILE_LABELS = {
+    'v_report': 'Variant report:  ',
+    'vcf': 'VCF file:  ',
+    'dp_indels': 'Indel depth file:  ',
+    'dp_snvs': 'SNV depth file:  ',
+    'fusions': 'Fusions:  ',
+}
+
+#----gui.py-------------------------------------------------------------------
+
+class StampPostProcess_App(wx.App):
+    def __init__(self, args, transcripts, **kwargs):
+        self.args = args
+        self.transcripts = transcripts
+        wx.App.__init__(self, kwargs)
+
+    def OnInit(self):
+        self.frame = StampFrame(self.args, self.transcripts)
+        self.frame.Show()
+        self.SetTopWindow(self.frame)
+        return True
+
+class StampRTC(wx.richtext.RichTextCtrl):
+    def __init__(self, parent):
+        wx.richtext.RichTextCtrl.__init__(self, parent, -1, "",
+                        style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+        self.Bind(wx.EVT_MOUSE_EVENTS, self.DoNothing)
+
+    def DoNothing(self, event):
+        pass
+
+    def AddIntroBlurb(self):
+        intro_blurb="This script creates a variety of files depending on "+\
+                    "the combination of STAMP output files received:"
+        intro_items = [     
+            ['Excel variant reports', 
+             'requires sample.variant_report.txt'],
+            ['Accepted and rejected VCF files', 
+             'requires sample.variant_report.txt and sample.vcf'],
+            ['Sorted Excel depth reports', 
+             'requires sample.depth_report_indels.txt and/or ' +\
+             ' sample.depth_report_snvs.txt'],
+            ['Low coverage comment', 
+             'requires sample.depth_report_indels.txt and '+\
+             'sample.depth_report_snvs.txt'],
+            ['Fusion file with transcripts', 'requires fusions.filtered.txt'],
+        ]
+        self.BeginFontSize(10)
+        self.Newline()
+        self.Newline()
+        self.WriteText(intro_blurb)
+        self.Newline()
+        self.BeginSymbolBullet('*', 25, 30)
+        for [label, descr] in intro_items:
+            self.BeginBold()
+            self.WriteText(label)
+            self.EndBold()
+            self.WriteText(' -- '+descr)
+            self.Newline()
+        self.EndSymbolBullet()
+        self.EndFontSize()
+        self.Newline()
+        self.Newline()
+
+class StampFrame(wx.Frame):
+    def __init__(self, args, transcripts):
+        self.args = args
+        self.transcripts = transcripts
+        wx.Frame.__init__(self, None, size=(550,500),
+                          title="STAMP Post-Processing v"+VERSION, )
+
+        panel = wx.Panel(self)
+        label = wx.StaticText(panel, -1, "Drop STAMP depth reports, variant "+\
+            " reports, and VCF files here:")
+#        self.rtc = wx.richtext.RichTextCtrl(panel,-1, "",
+#                        style=wx.TE_READONLY|wx.TE_MULTILINE|wx.HSCROLL)
+        self.rtc = StampRTC(panel)
+        self.rtc.AddIntroBlurb()
+        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
+        button_quit.SetToolTip(wx.ToolTip("Quit application"))
+        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
+        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(label, 0, wx.ALL, 5)
+        sizer.Add(self.rtc, 1, wx.EXPAND|wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.AddStretchSpacer()
+        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
+        panel.SetSizer(sizer)
+
+        filedrop = FileDropProcessing(self.rtc, self.args,
+                                      self.transcripts)
+        self.rtc.SetDropTarget(filedrop)
+
+    def OnCloseMe(self, event):
+        self.Close(True)
+
+    def OnCloseWindow(self, event):
+        self.Destroy()
+        
+class FileDropProcessing(wx.FileDropTarget):
+    def __init__(self, window, args, transcripts):
+        wx.FileDropTarget.__init__(self)
+        self.window = window
+        self.args = args
+        self.transcripts = transcripts
+        self.num_samples = 0
+        self.oldsamples = {}
+        self.current_pos = 0
+
+    def ScrollWindow(self):
+        pos = self.window.GetScrollRange(wx.VERTICAL)
+        self.window.Scroll(0, pos)
+
+    def WriteFormattedText(self, boldtext='', normaltext='', bullet=False,
+                           newline=True):
+        self.window.MoveEnd()
+        if self.current_pos:
+            self.window.SetCaretPosition(self.current_pos)
+        if bullet:
+            self.window.BeginSymbolBullet('*', 25, 30)
+        if boldtext:
+            self.window.BeginBold()
+            self.window.WriteText(boldtext)
+            self.window.EndBold()
+        if normaltext:
+            self.window.WriteText(normaltext)
+        if newline: 
+            self.window.Newline()
+        if bullet:
+            self.window.EndSymbolBullet()
+        self.ScrollWindow()
+        self.current_pos = self.window.GetCaretPosition()
+
+    def OnDropFiles(self, x, y, filenames):
+        samples, badfiles = group_files_by_sample(filenames)
+        if badfiles:
+            self.window.MoveEnd()
+            for badfile in badfiles:
+                self.WriteFormattedText(newline=False,
+                    normaltext="Not a recognized input file: {}\n".\
+                    format(os.path.basename(badfile)))
+                self.ScrollWindow()
+        self.WriteFormattedText(newline=True)
+        for sample, d in sorted(samples.items()):
+            if sample in self.oldsamples:
+                old_d = self.oldsamples[sample]
+                d['sample_num'] = old_d['sample_num']
+                for filetype in ('v_report', 'vcf', 'dp_indels', 'dp_snvs',
+                                 'wl_depths'):
+                    if filetype not in d and filetype in old_d:
+                        d[filetype] = old_d[filetype]
+            else:
+                self.num_samples += 1
+                d['sample_num'] = self.num_samples
+            self.oldsamples[sample] = d
+        if samples:
+            self.WriteFormattedText(normaltext="Processing {} sample{}".format(
+                len(samples), '' if len(samples)==1 else 's'))
+            # run in the background so the window is not frozen
+            PostProcessThread(dict(samples), self.args, self.transcripts,
+                              self.ShowSampleResults, self.ShowError).start()
+
+    def ShowSampleResults(self, sample, d, results):
+        """Write results of the tasks for sample.  Runs in the GUI thread"""
+        sys.stderr.write('Sample {}:  {}\n'.format(d['sample_num'], sample))
+        self.WriteFormattedText('Sample {}:  '.format(d['sample_num']),
+                                sample)
+        for task, filetypes, depends in SAMPLE_TASKS:
+            if task in TASK_FILE_LABELS and task in d:
+                self.WriteFormattedText(TASK_FILE_LABELS[task],
+                    os.path.basename(d[task]), True)
+            if task=='lcc' and 'wl_depths' in d:
+                self.WriteFormattedText('Hotspot depth file:  ',
+                    os.path.basename(d['wl_depths']), True)
+            if not task in results:
+                continue
+            status, value, output = results[task]
+            sys.stderr.write(output)
+            if status=='ok':
+                self.WriteTaskOutfiles(task, value)
+            elif status in ('exit', 'error'):
+                self.window.WriteText("    ERROR: {}\n\n".format(value))
+        sys.stderr.flush()
+        self.WriteFormattedText(newline=True)
+
+    def ShowError(self, error, output):
+        """Write error that stopped processing.  Runs in the GUI thread"""
+        sys.stderr.write(output)
+        sys.stderr.flush()
+        self.WriteFormattedText("ERROR:  ", error)
+        self.WriteFormattedText(newline=True)
+
+    def WriteTaskOutfiles(self, task, value):
+        gender = ''
+        if task=='vcf':
+            outfiles = value
+        elif task=='lcc':
+            outfile, is_female = value
+            outfiles = [outfile]
+            gender = ' (F)' if is_female else ' (M)'
+        elif task in ('dp_indels', 'dp_snvs'):
+            outfiles = [value.outfile]
+        elif task=='fusions' and value==0:
+            self.WriteFormattedText("","      --No fusions")
+            outfiles = []
+        else:
+            outfiles = [value]
+        for outfile in outfiles:
+            if outfile and os.path.isfile(outfile):
+                self.WriteFormattedText("", "      --Wrote {}{}".format(
+                    os.path.basename(outfile), gender))
+
+class PostProcessThread(Thread):
+    """Runs process_samples and passes the results for each sample to
+    callback in the GUI thread, or an error that stops it to errback.
+    The tasks run in worker processes so they never swap sys.stderr 
+    while the GUI thread writes to it."""
+    def __init__(self, samples, args, transcripts, callback, errback):
+        Thread.__init__(self)
+        self.setDaemon(True)
+        self.samples = samples
+        self.args = args
+        self.transcripts = transcripts
+        self.callback = callback
+        self.errback = errback
+
+    def run(self):
+        try:
+            for sample, d, results in process_samples(self.samples, 
+                    self.args, self.transcripts, self.args.jobs, 
+                    inprocess=False):
+                wx.CallAfter(self.callback, sample, d, results)
+        except Exception as e:
+            wx.CallAfter(self.errback, "{} {}".format(type(e).__name__, e),
+                         traceback.format_exc())
+
+def run_gui(args, transcripts):
+    app = StampPostProcess_App(args, transcripts)
+    app.MainLoop()
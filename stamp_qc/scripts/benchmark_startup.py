@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""
+Benchmark for the startup of stamp_qcV2.py.
+
+Makes the STAMP V2 dbs in a temp folder by running stamp_qcV2.py on the
+stamp_v2 testfiles folders, then times what stamp_qcV2.py does for each
+db before it reads any report: check_db, then load_truthset for the
+TruthSet and db summary.
+
+  no cache -- the startup cache is removed first, so the truths are
+              read from the db and the cache is saved
+  cache    -- the startup cache saved by the previous startup is used
+
+    python benchmark_startup.py [-r REPEATS]
+
+Prints the time of each repeat and the best one.
+"""
+
+import glob
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from stamp_qcV2 import REFS, check_db, check_existing_dbs, \
+     getScriptPath, load_truthset
+
+TEST_FOLDERS = os.path.join(getScriptPath(), os.pardir, "testfiles",
+                            "stamp_v2_*")
+CTRL_VERSION = 'V2'
+
+def make_dbs(datadir):
+    """Save the reports in TEST_FOLDERS to new dbs in datadir"""
+    script = os.path.join(getScriptPath(), 'stamp_qcV2.py')
+    cmd = [sys.executable, script, '--datadir', datadir] + \
+          sorted(glob.glob(TEST_FOLDERS))
+    with open(os.devnull, 'w') as fh:
+        if subprocess.call(cmd, stdout=fh):
+            sys.exit("ERROR: could not make the dbs")
+
+def startup(datadir, ctrl_version, clear_cache):
+    """Time to check the dbs in datadir and load their truths"""
+    REFS.clear()
+    controls = check_existing_dbs(datadir, ctrl_version)
+    if clear_cache:
+        for ctrl in controls:
+            if os.path.exists(REFS[ctrl]['STARTUPCACHE']):
+                os.remove(REFS[ctrl]['STARTUPCACHE'])
+    start = time.time()
+    for ctrl in controls:
+        pool = check_db(ctrl)
+        load_truthset(ctrl, pool, ctrl_version, REFS[ctrl]['STARTUPCACHE'])
+        pool.close()
+    return time.time()-start
+
+def benchmark(repeats):
+    """List of (no cache, cache) startup times of repeats"""
+    tmpdir = tempfile.mkdtemp(prefix='benchmark_startup')
+    stdout = sys.stdout
+    try:
+        make_dbs(tmpdir)
+        sys.stdout = open(os.devnull, 'w')
+        times = []
+        for n in range(repeats):
+            times.append((startup(tmpdir, CTRL_VERSION, True),
+                          startup(tmpdir, CTRL_VERSION, False)))
+        return times
+    finally:
+        if sys.stdout is not stdout:
+            sys.stdout.close()
+        sys.stdout = stdout
+        shutil.rmtree(tmpdir)
+
+if __name__=='__main__':
+    parser = ArgumentParser(description="Time the stamp_qcV2.py startup "+\
+                            "with and without the startup cache.")
+    parser.add_argument("-r", "--repeats", type=int, default=5,
+                        help="Times to start up (default: 5)")
+    args = parser.parse_args()
+    times = benchmark(args.repeats)
+    for label, secs in (('no cache', [ t[0] for t in times ]),
+                        ('cache', [ t[1] for t in times ])):
+        print "{:8s} {}  best {:.3f}s".format(label,
+              ' '.join([ "{:.3f}s".format(t) for t in secs ]), min(secs))
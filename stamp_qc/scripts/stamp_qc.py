@@ -6,22 +6,30 @@ Check STAMP control for expected variants.
 
 import os
 import sys
-import datetime
 import openpyxl
 import operator
 import re
 import sqlite3
-import time
-import wx
-import wx.lib.agw.flatnotebook as fnb
 import xlsxwriter
 from collections import defaultdict
 from argparse import ArgumentParser
 
+# the shared stamp_common package is at the top of the stamp_scripts tree;
+# found from the script path since py2exe builds have no __file__
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])),
+                                os.pardir, os.pardir))
+from stamp_common.dbops import current_time, results_as_dict
+from stamp_common.fileops import parse_tab_file as common_parse_tab_file
+from stamp_common.spreadsheet import add_formats_to_workbook, \
+     convert_to_excel_col
+
 VERSION="1.3"
 BUILD="170112"
 
 # REVISION HISTORY
+# 261019 - Use the shared stamp_common package for report parsing and
+#          spreadsheet formats
+# 261019 - Move GUI to stamp_qc_gui.py so wx is only loaded for it
 # 170112 - Fix runnum lstrip to work for STAMP300
 # 160916 - Only highlight missing expected variants
 # 160713
@@ -209,44 +217,12 @@ def field2reportfield(f):
     return newf
 
 def parse_tab_file(tabfile, keyfunc=None, fieldfunc=None):
-    """Parse a tab-delimited file with column headers.  Returns a dict with
-       key values:
-       'fields': a list of fields in the order they appear in the column header
-       'data': a list of dicts containing the values of each row in the order
-               they appear in the file.  The dicts are keyed by field name with 
-               values the row values; also, an additional key 'line' is added
-               with value the original line from the file.  If the optional arg
-               keyfunc is supplied, then and additional key 'dkey' is added
-               with value the result from the keyfunc function on that row.
-       'datadict': (optional) a dict keyed by the result of keyfunc operated on 
-               the row dict with value the row dict.  This value only appears
-               if keyfunc is present.
-
-       Keyword arguments:
-       keyfunc -- function to create a unique key for each row of data.  The
-               supplied function should take a dict as its only argument and
-               return a unique key for each data row.
-       fieldfunc -- function to reformat field names from header."""
-    data = []
-    datadict = {}
-    with open(tabfile, 'r') as fh:
-        fields = [ fieldfunc(f) if fieldfunc else f for f in \
-                   fh.readline().rstrip('\t\n\r').split("\t") ]
-        for line in fh.readlines():
-            if not line.rstrip('\n\r'): 
-                continue
-            vals = line.rstrip('\n\r').split("\t")
-            d = dict(zip(fields, line.rstrip('\n\r').split("\t")))
-            d['line'] = line
-            data.append(d)
-            if keyfunc:
-                dkey = keyfunc(d)
-                d['dkey'] = dkey
-                datadict[dkey] = d
-    tabfileinfo = {'fields':fields, 'data':data}
-    if keyfunc:
-        tabfileinfo['datadict'] = datadict
-    return tabfileinfo
+    """Parse a tab-delimited file with column headers using the shared
+       reader.  V1 files have no comment lines and values are kept as is;
+       each row also has key 'line' with the original line from the file."""
+    return common_parse_tab_file(tabfile, keyfunc=keyfunc,
+                                 fieldfunc=fieldfunc, keepline=True,
+                                 commentstart=None, strip=False)
 
 def parse_truths(truthfile, create_dkey):
     sys.stderr.write("  Reading truths: {}\n".format(truthfile))
@@ -289,17 +265,6 @@ def print_checked_file(vinfo, truthset, outfile):
 
 #----dbops.py-----------------------------------------------------------------
 
-def current_time():
-    return datetime.datetime.now()
-
-def results_as_dict(cursor):
-    columns = [ d[0] for d in cursor.description ]
-    data = []
-    for ans in cursor.fetchall():
-        d = dict(zip(columns, ans))
-        data.append(d)
-    return data
-
 def connect_db(dbfile):
     sys.stderr.write("  Connecting to db {}\n".format(dbfile))
     dbh = sqlite3.connect(dbfile)
@@ -819,48 +784,26 @@ def fusion_sheet_data(ctrl, dbh, samples, tfields):
         data['fields'].remove('is_expected')
     return data
 
-def convert_to_excel_col(colnum):
-    mod = colnum % 26
-    let = chr(mod+65)
-    if colnum >= 26:
-        rep = colnum/26
-        let1 = chr(rep+64)
-        let = let1 + let
-    return let
-
-def add_formats_to_workbook(workbook):
-    wbformat = {}
-    wbformat['bold'] = workbook.add_format({'bold': True})
-    wbformat['perc'] = workbook.add_format({'num_format': '#.##%'})
-    wbformat['red'] = workbook.add_format({'bg_color': '#C58886', 
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltred'] = workbook.add_format({'bg_color': '#E9D4D3', 
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['orange'] = workbook.add_format({'bg_color': '#FCD5B4',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltgreen'] = workbook.add_format({'bg_color': '#EBF1DE',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltblue'] = workbook.add_format({'bg_color': '#D7E1EB',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['blue'] = workbook.add_format({'bg_color': '#88A4C5',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['gray'] = workbook.add_format({'bg_color': '#F0F0F0',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['dkgray'] = workbook.add_format({'bg_color': '#D9D9D9',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltbluepatt'] = workbook.add_format({'fg_color': '#DCE6F0', 
-                                       'pattern': 8,
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltgreen_perc'] = workbook.add_format({'num_format': '#.##%',
-                                       'bg_color': '#EBF1DE',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['gray_perc'] = workbook.add_format({'num_format': '#.##%',
-                                       'bg_color': '#F0F0F0',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['dkgray_perc'] = workbook.add_format({'num_format': '#.##%',
-                                       'bg_color': '#D9D9D9',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    return wbformat
+WB_FORMATS = {
+    'bold': {'bold': True},
+    'perc': {'num_format': '#.##%'},
+    'red': {'bg_color': '#C58886', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltred': {'bg_color': '#E9D4D3', 'border': 1, 'border_color':'#CDCDCD'},
+    'orange': {'bg_color': '#FCD5B4', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltgreen': {'bg_color': '#EBF1DE', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltblue': {'bg_color': '#D7E1EB', 'border': 1, 'border_color':'#CDCDCD'},
+    'blue': {'bg_color': '#88A4C5', 'border': 1, 'border_color':'#CDCDCD'},
+    'gray': {'bg_color': '#F0F0F0', 'border': 1, 'border_color':'#CDCDCD'},
+    'dkgray': {'bg_color': '#D9D9D9', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltbluepatt': {'fg_color': '#DCE6F0', 'pattern': 8,
+                   'border': 1, 'border_color':'#CDCDCD'},
+    'ltgreen_perc': {'num_format': '#.##%', 'bg_color': '#EBF1DE',
+                     'border': 1, 'border_color':'#CDCDCD'},
+    'gray_perc': {'num_format': '#.##%', 'bg_color': '#F0F0F0',
+                  'border': 1, 'border_color':'#CDCDCD'},
+    'dkgray_perc': {'num_format': '#.##%', 'bg_color': '#D9D9D9',
+                    'border': 1, 'border_color':'#CDCDCD'},
+}
 
 def add_avg_stddev_columns(worksheet, rownum, colavg, colstd, mutdat,
                            runrange, expecttype):
@@ -1054,7 +997,7 @@ def generate_excel_spreadsheet(ctrl, dbh, tfields, outfile):
     sys.stderr.write("\nCreating {} Excel file:\n{}\n".format(
                      ctrl, outfile))
     workbook = xlsxwriter.Workbook(outfile)
-    wbformat = add_formats_to_workbook(workbook)
+    wbformat = add_formats_to_workbook(workbook, WB_FORMATS)
     nums = add_mutation_sheet_excel(workbook, wbformat, samples, mutdata,
                                     fieldfunc=field2reportfield) 
     if fusiondata:
@@ -1065,363 +1008,6 @@ def generate_excel_spreadsheet(ctrl, dbh, tfields, outfile):
     wb.save(outfile)
     return nums
 
-#----gui.py-------------------------------------------------------------------
-
-class StampQC_App(wx.App):
-    def __init__(self, dbhs, tinfos, controls, msg=None, **kwargs):
-        self.dbh = dbhs
-        self.tinfo = tinfos
-        self.controls = controls
-        self.msg = msg
-        wx.App.__init__(self, kwargs)
-
-    def OnInit(self):
-        self.frame = StampFrame(self.dbh, self.tinfo, self.controls, 
-                                msg=self.msg)
-        self.frame.Show()
-        self.SetTopWindow(self.frame)
-        return True
-
-class StampFrame(wx.Frame):
-    def __init__(self, dbh, tinfo, controls, msg=None):
-        wx.Frame.__init__(self, None, title="STAMP QC v{}".format(VERSION), 
-                          size=(550,525))
-        self.dbh = dbh
-        self.tinfo = tinfo
-        self.controls = controls
-        ctrl_version = get_ctrl_version()
-        self.ctrl_version = ' (STAMP {})'.format(ctrl_version) if \
-                            ctrl_version else ''
-
-        panel = wx.Panel(self)
-        label = wx.StaticText(panel, -1, 
-            "Drop TruQ3 or HD753 variant or fusion reports here:")
-        self.text = wx.TextCtrl(panel,-1, "",style=wx.TE_READONLY|
-                                wx.TE_MULTILINE|wx.HSCROLL)
-        button_print = wx.Button(panel, -1, "Print reports")
-        print_tooltip = "Creates new variant reports with variants "+\
-            "labelled expected, not expected or not found. New reports "+\
-            "are named <Sample>.variant_report.checked.txt and saved "+\
-            "in same folder as original report."
-        button_print.SetToolTip(wx.ToolTip(print_tooltip))
-        self.Bind(wx.EVT_BUTTON, self.PrintReports, button_print)
-        button_save = wx.Button(panel, -1, "Update spreadsheets and DB")
-        save_tooltip = "Update spreadsheet and database with data entered.\n"
-        button_save.SetToolTip(wx.ToolTip(save_tooltip))
-        self.Bind(wx.EVT_BUTTON, self.UpdateSpreadsheetAndDB, button_save)
-        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
-        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
-        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
-        self.notebook = StampNotebook(panel, tinfo, controls, msg=msg)
-
-        sizer = wx.BoxSizer(wx.VERTICAL)
-        sizer.Add(label, 0, wx.ALL, 5)
-        sizer.Add(self.text, 1, wx.EXPAND|wx.ALL, 5)
-        sizer.Add(self.notebook, 0, wx.EXPAND|wx.ALL, 5)
-
-        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
-        button_sizer.Add(button_print, 0, wx.ALIGN_CENTER_VERTICAL)
-        button_sizer.Add(button_save, 0, wx.ALIGN_CENTER_VERTICAL)
-        button_sizer.AddStretchSpacer()
-        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
-        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
-        panel.SetSizer(sizer)
-
-        dt = VariantReportDrop(self.text, self.notebook, tinfo)
-        self.text.SetDropTarget(dt)
-
-    def PrintReports(self, event):
-        self.text.AppendText("\nPrinting reports:\n")
-        if not self.notebook.results:
-            self.text.AppendText("  No reports to process.\n\n")
-            return
-        for i, info in enumerate(self.notebook.results):
-            if not info: continue
-            entries = self.notebook.entries[i]
-            sample = entries['sample'].GetValue()
-            outfile = {}
-            if 'file' in info:
-                outfile['mutation'] = info['file'].replace('.txt','') +\
-                                      ".checked.txt"
-            if 'fusion_file' in info:
-                outfile['fusion'] = info['fusion_file'].replace('.txt','') +\
-                                    ".checked.txt"
-            for vartype in outfile:
-                if not sample==info['sample']:
-                    outfile[vartype] = outfile[vartype].replace(
-                                           info['sample'], sample)
-                self.text.AppendText("  "+outfile[vartype]+"\n")
-            print_checked_file(info['vinfo'], self.tinfo[info['control']], 
-                               outfile)
-        self.text.AppendText("\n")
-
-    def UpdateSpreadsheetAndDB(self, event):
-        self.text.AppendText("\nUpdating data:\n")
-        if not self.notebook.results:
-            self.text.AppendText("  No data to save to db.\n")
-        else:
-            for i, info in enumerate(self.notebook.results):
-                if not info: continue
-                entries = self.notebook.entries[i]
-                sample = info['vinfo'].sample = entries['sample'].GetValue()
-                run = info['vinfo'].run = entries['run'].GetValue()
-                if not run or not sample:
-                    msg = "    {}: Not saved.".format(i)
-                    if not run and not sample:
-                        msg += "  Need run and sample\n"
-                    elif not run:
-                        msg += "  Need run name\n"
-                    else:
-                        msg += "  Need sample name\n"
-                    self.text.AppendText(msg)
-                    continue
-                statusnum = entries['status'].GetSelection()
-                status = entries['status'].GetString(statusnum)
-                saved = info['vinfo'].save2db(status, force=True)
-                if saved:
-                    self.text.AppendText(
-                        "        Saved {} data to db.\n".format(sample))
-                else:
-                    self.text.AppendText(
-                        "        {} not saved to db.\n".format(sample))
-            summ = []
-            for ctrl in self.controls:
-#                summ.append(ctrl+self.ctrl_version+'\n')
-                summ.extend(self.tinfo[ctrl].db_summary())
-                summ.append('\n')
-            self.notebook.tabOne.ChangeMessage(''.join(summ))
-        try:
-            for ctrl in self.controls:
-                self.text.AppendText("  Updating {} spreadsheet.\n".format(
-                                     ctrl))
-                res = generate_excel_spreadsheet(ctrl, self.dbh[ctrl], 
-                  self.tinfo[ctrl].fields, REFS[ctrl]['SPREADSHEET'])
-                self.text.AppendText(
-                    "      {} spreadsheet now contains ".format(ctrl)+\
-                    "{} runs and {} unique variants\n".format(res['num_runs'],
-                    res['num_variants']))
-#                if res['failedsamples']:
-#                    self.text.AppendText(
-#                         "      Failed samples not included: {}\n".format(
-#                         ", ".join(sorted(res['failedsamples']))))
-        except Exception, e:
-            self.text.AppendText("    ERROR: {}{}\n\n".format(
-                                       type(e).__name__, e))
-            raise
-        self.text.AppendText("\n")
-
-    def OnCloseMe(self, event):
-        self.Close(True)
-
-    def OnCloseWindow(self, event):
-        self.Destroy()
-        
-class VariantReportDrop(wx.FileDropTarget):
-    def __init__(self, window, notebook, tinfo):
-        wx.FileDropTarget.__init__(self)
-        self.window = window
-        self.notebook = notebook
-        self.tinfo = tinfo
-        self.num_samples = 0
-
-    def OnDropFiles(self, x, y, filenames):
-        oldfiles = self.notebook.ReportFiles()
-        oldsamples2files, oldbadfiles = group_files_by_sample(oldfiles)
-        samples2files, badfiles = group_files_by_sample(filenames)
-        if badfiles:
-            for badfile in badfiles:
-               self.window.AppendText("ERROR: "+badfile+'\n')
-               self.window.AppendText("    Bad input.  This does not look" +\
-                   " like a TruQ3 or HD753 variant or fusion report.\n")
-        # check if sample data needs updating with new files or
-        # skip if sample is only previously dropped files
-        for sample, d in sorted(samples2files.items()):
-            if sample in oldsamples2files:
-                updatesample = False
-                old_d = oldsamples2files[sample]
-                for reporttype in ('v_report', 'f_report'):
-                    if reporttype in d:
-                        if reporttype in old_d and \
-                           old_d[reporttype]==d[reporttype]:
-                            continue
-                        else:
-                            updatesample=True
-                    elif reporttype in old_d:
-                        d[reporttype] = old_d[reporttype]
-                        updatesample = True
-                if updatesample:
-                    self.notebook.DeletePageSample(sample)
-                else: # no need to update
-                    continue
-            run = d['run']
-            ctrl = d['control']
-            self.num_samples += 1
-            if not ctrl in self.tinfo:
-                sys.exit("No truth data for {} in db\n".format(ctrl))
-            try:
-                vinfo = VariantSet(sample, run, ctrl, self.tinfo[ctrl])
-                info = {'num': self.num_samples, 'vinfo': vinfo,
-                        'control': ctrl, 'run': run, 'sample': sample }
-                if 'v_report' in d:
-                    info['file'] = d['v_report']
-                    vinfo.add_variants(d['v_report'], 'mutation')
-                    self.window.AppendText("Mutation file {}:    {}\n".format(
-                        self.num_samples, info['file']))
-                if 'f_report' in d:
-                    info['fusion_file'] = d['f_report']
-                    vinfo.add_variants(d['f_report'], 'fusion')
-                    self.window.AppendText("Fusion file {}:    {}\n".format(
-                        self.num_samples, info['fusion_file']))
-                summary = vinfo.compare_variants()
-                info.update({'summary': summary, 
-                             'status': summary['Status'],})
-                title = "{}: {}".format(self.num_samples, sample)
-                self.notebook.AddResultsTab(info, title=title)
-#            except KeyError, e:
-#                self.window.AppendText("    ERROR:  Bad file format.  " +\
-#                    "This does not look like a variant or fusion report.\n")
-            except Exception, e:
-                self.window.AppendText("    ERROR: {} {}\n\n".format(
-                                       type(e).__name__, e))
-                raise
-
-class StampNotebook(fnb.FlatNotebook):
-    def __init__(self, parent, tinfo, controls, msg=None):
-        fnb.FlatNotebook.__init__(self, parent, id=wx.ID_ANY, size=(500, 270),
-            agwStyle=fnb.FNB_VC8|fnb.FNB_X_ON_TAB|fnb.FNB_NO_X_BUTTON|
-            fnb.FNB_NAV_BUTTONS_WHEN_NEEDED)
-
-        self.tabOne = TabPanel_Text(self, msg=msg)
-        self.AddPage(self.tabOne, "DB content")
-        self.results = ['',]
-        self.entries = ['',]
-        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_CLOSING, self.OnTabClosing)
-        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_DROPPED, self.OnTabDrop)
-        self.tinfo = tinfo
-        self.controls = controls
-
-    def AddResultsTab(self, info, title=None):
-        if not title:
-            num = info['num'] if 'num' in info else ''
-            title = "Sample {} ({})".format(num, info['control'])
-        newTab = TabPanel_Results(self, info)
-        self.AddPage(newTab, title)
-        numpages = self.GetPageCount()
-        self.SetSelection(numpages-1)
-        self.results.append(info)
-
-    def OnTabClosing(self, event):
-        selected = self.GetSelection()
-        res = self.results.pop(selected)
-        ent = self.entries.pop(selected)
-        txt = self.GetPageText(selected)
-        sys.stderr.flush()
-
-    def OnTabDrop(self, event):
-        selected = self.GetSelection()
-        oldselected = event.GetOldSelection()
-        res = self.results.pop(oldselected)
-        ent = self.entries.pop(oldselected)
-        self.results.insert(selected, res)
-        self.entries.insert(selected, ent)
-
-    def ReportFiles(self):
-        """Return list of variant and fusion report files in notebook"""
-        reports = []
-        for info in self.results:
-            if not info: continue
-            if 'file' in info:
-                reports.append(info['file'])
-            if 'fusion_file' in info:
-                reports.append(info['fusion_file'])
-        return reports
-
-    def DeletePageSample(self, sample):
-        """Delete pages where sample is given sample"""
-        numpages = 0
-        for i, info in enumerate(self.results):
-            if not info: continue
-            if 'sample' in info and info['sample']==sample:
-                self.SetSelection(i)
-                self.DeletePage(i)
-                self.SendSizeEvent()
-                numpages += 1
-        return numpages
-
-class TabPanel_Text(wx.Panel):
-    def __init__(self, parent, msg="\n\n\n\n"):
-        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
-        self.textWidget = wx.StaticText(self, -1, '\n'+msg, pos=(15,10))
-#        font = wx.Font(8, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL,
-#                       wx.FONTWEIGHT_NORMAL)
-#        self.textWidget.SetFont(font)
-
-    def ChangeMessage(self, msg):
-        self.textWidget.Destroy()
-        self.textWidget = wx.StaticText(self, -1, '\n'+msg)
-
-class TabPanel_Results(wx.Panel):
-    def __init__(self, parent, info):
-        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
-
-        runLabel = wx.StaticText(self, -1, "Run:")
-        runEntry = wx.TextCtrl(self, -1, info['run'])
-        sampleLabel = wx.StaticText(self, -1, "Sample:")
-        sampleEntry = wx.TextCtrl(self, -1, info['sample'])
-        statusLabel = wx.StaticText(self, -1, "Status:")
-        statusEntry = wx.Choice(self, -1, choices=['PASS', 'FAIL'])
-        statusEntry.SetSelection(0 if info['status']=='PASS' else 1)
-        parent.entries.append({'run': runEntry, 'sample': sampleEntry,
-                               'status': statusEntry})
-        tag = parent.tinfo[info['control']].ctrl_version_tag
-        infostr1 = "Control:  {}{}\n".format(info['control'], tag) 
-        infostr2 = ''
-        num_missing = 0
-        for vartype in info['vinfo'].truthset.variant_types:
-            if not vartype in info['summary']:
-                continue
-            summary = info['summary'][vartype]
-            msg = 'All expected {}s found.'.format(vartype)
-            if len(summary['notseen'])>0:
-                num_missing += len(summary['notseen'])
-                infostr2 += "Expected {} not found:{:5d}\n".format(vartype,
-                      len(summary['notseen']))
-            else:
-                infostr2 += "All expected {}s found\n".format(vartype)
-            infostr2 += '\n\n'
-            infostr1 += "Total {}s:{:9d}\n".format(vartype, summary['Total'])\
-            +"    Expected {}:{:8d}\n".format(vartype, summary['Expected'])+\
-            "    Unexpected {}:{:4d}\n".format(vartype, summary['Unexpected'])
-#        info2summ = "Missing {} expected variants\n".format(num_missing) \
-#               if num_missing else 'All expected variants found.\n'
-        infoText1 = wx.StaticText(self, -1, infostr1)
-        infoText2 = wx.StaticText(self, -1, '\n\n'+infostr2)
-
-        panelSizer = wx.BoxSizer(wx.VERTICAL)
-        infoSizer = wx.BoxSizer(wx.HORIZONTAL)
-        infoSizer.Add(infoText1, 1, wx.ALL, 8)
-        infoSizer.Add(infoText2, 1, wx.EXPAND|wx.ALL, 8)
-        entrySizer = wx.FlexGridSizer(cols=2, hgap=5, vgap=5)
-        entrySizer.AddGrowableCol(1)
-        entrySizer.Add(runLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(runEntry, 0, wx.EXPAND)
-        entrySizer.Add(sampleLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(sampleEntry, 0, wx.EXPAND)
-        entrySizer.Add(statusLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(statusEntry, 0)
-        panelSizer.Add(entrySizer, 0, wx.EXPAND|wx.ALL, 10)
-        panelSizer.Add(infoSizer, 0, wx.ALIGN_LEFT)
-        self.SetSizer(panelSizer)
-
-def run_gui(dbhs, tinfos, msgs, controls):
-    if not controls:
-        sys.stderr.write("\nERROR: no control data found\n")
-        time.sleep(5) 
-        sys.exit()
-    msg = '\n'.join(msgs)
-    app = StampQC_App(dbhs, tinfos, controls, msg=msg)
-    app.MainLoop()
-
 #-----------------------------------------------------------------------------
 
 if __name__=='__main__':
@@ -1466,7 +1052,11 @@ if __name__=='__main__':
         msgs.append(''.join(summary))
     sys.stderr.write('\n'.join(msgs))
     if len(args.reports)==0:
-        run_gui(dbh, tinfo, msgs, controls)
+        # wx is only needed for the GUI so keep it out of command line runs
+        from stamp_qc_gui import run_gui
+        spreadsheets = dict([ (ctrl, REFS[ctrl]['SPREADSHEET']) 
+                              for ctrl in controls ])
+        run_gui(dbh, tinfo, msgs, controls, spreadsheets)
     else:
         if not controls:
             sys.exit("\nERROR: no control data found\n")
@@ -6,22 +6,56 @@ Check STAMP control for expected variants.
 
 import os
 import sys
-import datetime
-import openpyxl
+import cPickle
+import math
+import multiprocessing
 import operator
 import re
-import sqlite3
 import time
-import wx
-import wx.lib.agw.flatnotebook as fnb
 import xlsxwriter
 from collections import defaultdict
 from argparse import ArgumentParser
+from cStringIO import StringIO
+
+# the shared stamp_common package is at the top of the stamp_scripts tree;
+# found from the script path since py2exe builds have no __file__
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])),
+                                os.pardir, os.pardir))
+from stamp_common.dbops import DB_JOURNAL_MODE, ConnectionPool, add_schema, \
+     current_time, get_schema_version, get_tables, has_tables, migrate_db, \
+     results_as_dict, write_transaction
+from stamp_common.discovery import SuffixTable, find_input_files
+from stamp_common.fusionops import FUSION_BREAK_TOLERANCE, FusionIndex
+from stamp_common.fileops import file_lock, parse_tab_file, replace_file, \
+     temp_outfile
+from stamp_common.spreadsheet import add_formats_to_workbook, \
+     convert_to_excel_col
 
 VERSION="1.5"
 BUILD="170516"
 
 # REVISION HISTORY
+# 261019 - List input folders with the shared discovery module and find
+#          the report type of each file with one suffix table
+# 261019 - Match fusions by gene pair with breakpoints within
+#          FUSION_BREAK_TOLERANCE bp so near-identical calls count as one
+# 261019 - Add --pon to build a panel of normals CNV baseline from the control
+#          tile files and check the gene mean-z of each sample against it;
+#          the panel file is locked while it is updated, and the samples
+#          input are added at once
+# 261019 - Add --tiles to summarize CNV tile z-score baselines and drift of
+#          the control runs
+# 261019 - Only read the report columns saved to the db unless checked
+#          reports are printed
+# 261019 - Use the shared stamp_common package for report parsing, db
+#          connections and spreadsheet formats
+# 261019 - Move GUI to stamp_qcV2_gui.py so wx is only loaded for it
+# 261019 - Cache truth sets and db summary between startups
+# 261019 - Add numbered schema migrations; apply at startup
+# 261019 - Use busy timeout, BEGIN IMMEDIATE and a connection pool for the
+#          dbs; save each sample in its own short write transaction.  WAL
+#          journal is opt-in (--journal-mode) for dbs on a local disk
+# 261019 - Parse and compare reports in a process pool in CLI mode
 # 170516 - Change CNV value to mean-z instead of copies
 # 170418 - Add CNVs to HD753 control qc
 # 170112 - Fix runnum lstrip to work for STAMP300
@@ -75,6 +109,10 @@ REFFILE_LIST = {
     'SCHEMAFILE': "stampQC_schema.sql",
     'SPREADSHEET': "stampQC_CONTROL.xlsx",
     'SQLITEDB': "stampQC_CONTROL.db",
+    'STARTUPCACHE': "stampQC_CONTROL.cache",
+    'TILESPREADSHEET': "stampQC_CONTROL_tiles.xlsx",
+    'TILECACHE': "stampQC_CONTROL.tiles.cache",
+    'PANELOFNORMALS': "stampQC_CONTROL_pon.npz",
 }
 VARTYPES = ['mutation', 'fusion', 'cnv']
 FORMAT_VARTYPE = {
@@ -90,7 +128,19 @@ FORMAT_VARTYPE = {
   }
 }
 REFS = {}
+STARTUP_CACHE_VERSION = 3 # change when TruthSet attributes change
 CNV_CUTOFF_STR = '# mean-z-cutoffs: [12.0, 5.0, -6.0, -12.0]'
+TILE_DRIFT_CUTOFF = 1.0 # gene mean-z drift from tile baselines to highlight
+TILE_DEVIATION_CUTOFF = 3.0 # tile z-score deviation in MADs to highlight
+PON_PERCENTILES = [0.1, 1, 99, 99.9] # of panel gene mean-z, to check cutoffs
+# Report columns needed besides the truth (db) columns when reports are only
+# compared and saved: sample values saved to the db and the columns 
+# massage_data converts.  Column names are as returned by field2dbfield.
+SAMPLE_COLUMNS = {
+    'mutation': ['VAF%', 'status', 'CDS_Change', 'AA_Change', 'expectedVAF'],
+    'fusion': [],
+    'cnv': ['status', 'mean_z', 'mean-z', 'mcopies'],
+}
 
 def check_references(docsdir, datadir, ctrl_version):
     """Populate global REFS variable with reference files found
@@ -139,7 +189,8 @@ def check_existing_dbs(datadir, ctrl_version):
         if os.path.isfile(dbfile): 
             REFS[ctrl] = {'SQLITEDB':dbfile,}
             found.append(clabel)
-            for ftype in ('SPREADSHEET',):
+            for ftype in ('SPREADSHEET', 'STARTUPCACHE', 'TILESPREADSHEET',
+                          'TILECACHE', 'PANELOFNORMALS'):
                 fpath = os.path.join(datadir,
                     REFFILE_LIST[ftype].replace('CONTROL',clabel))
                 REFS[ctrl][ftype] = fpath
@@ -153,49 +204,69 @@ def check_existing_dbs(datadir, ctrl_version):
 
 #----fileops.py---------------------------------------------------------------
 
-def group_files_by_sample(inputfiles):
+def list_input_files(inputfiles, threads=1):
+    """Files in inputfiles, which can be files or folders"""
+    return [ infile for infile, folders in \
+             find_input_files(inputfiles, threads=threads) ]
+
+def file_control(infile):
+    """Control of sample file, or None if not a control"""
+    fname = os.path.basename(infile).lower()
+    if re.search('t[ru]*q.?3', fname):
+        return 'TruQ3'
+    elif re.search('hd.*753', fname):
+        return 'HD753'
+    return None
+
+def sample_run(sample):
+    """Run name from sample name"""
+    runnum = sample.lstrip('TRUQtruqHDhd753').lstrip('_').lstrip('STAMP')
+    runnum = runnum.split('_')[0]
+    # sort validation runs first from regular runs
+    if runnum.startswith("V"):
+      runnum = " "+runnum
+    return "STAMP{}".format(runnum) if runnum else ''
+
+REPORT_SUFFIXES = SuffixTable({
+    '.cnvs': 'c_report',
+    '.fusions.filtered.txt': 'f_report',
+    '.variant_report.txt': 'v_report', })
+
+def group_files_by_sample(inputfiles, threads=1):
     """HD753 uses both a variant report and fusion report for each sample"""
-    extensions = {
-        '.cnvs': 'c_report',
-        '.fusions.filtered.txt': 'f_report',
-        '.variant_report.txt': 'v_report', }
     samples = defaultdict(dict)
-    infiles = []
-    for in_arg in inputfiles: # input can be files or folders
-        if os.path.isfile(in_arg):
-            infiles.append(in_arg)
-        elif os.path.isdir(in_arg):
-            infiles.extend([ os.path.join(in_arg, f) for f in \
-                             os.listdir(in_arg) ])
+    infiles = list_input_files(inputfiles, threads)
     badfiles = []
     for infile in infiles:
         fname = os.path.basename(infile).lower()
-        control = None
         if '.tiles.cnv' in fname or '.offtarget.' in fname:
-            # ignore off target and tile cnv files
+            # ignore off target and tile cnv files; see group_tile_files
             badfiles.append(infile)
             continue
-        if re.search('t[ru]*q.?3', fname):
-            control = 'TruQ3'
-        elif re.search('hd.*753', fname):
-            control = 'HD753'
-        else:
+        control = file_control(infile)
+        if not control:
             badfiles.append(infile)
             continue
-        for ext in extensions:
-            if infile.endswith(ext):
-                sample = os.path.basename(infile).replace(ext,'')
-                runnum = sample.lstrip('TRUQtruqHDhd753').lstrip('_').lstrip('STAMP')
-                runnum = runnum.split('_')[0]
-                # sort validation runs first from regular runs
-                if runnum.startswith("V"):
-                  runnum = " "+runnum
-                run = "STAMP{}".format(runnum) if runnum else ''
-                samples[sample][extensions[ext]] = infile
-                samples[sample]['run'] = run
-                samples[sample]['control'] = control
+        filetype, sample = REPORT_SUFFIXES.match(infile)
+        if filetype:
+            samples[sample][filetype] = infile
+            samples[sample]['run'] = sample_run(sample)
+            samples[sample]['control'] = control
     return samples, badfiles
 
+def group_tile_files(inputfiles, threads=1):
+    """CNV tile files (not off target) of the control samples.  Returns 
+    dict keyed by control of lists of (sample, run, tile file)"""
+    tilefiles = defaultdict(list)
+    for infile in list_input_files(inputfiles, threads):
+        fname = os.path.basename(infile).lower()
+        control = file_control(infile)
+        if control and fname.endswith('.tiles.cnvs') and \
+           not '.offtarget.' in fname:
+            sample = os.path.basename(infile)[:-len('.tiles.cnvs')]
+            tilefiles[control].append((sample, sample_run(sample), infile))
+    return tilefiles
+
 def massage_data(data, vartype):
     """Unify differing formats and convert data types to appropriate types"""
     if vartype=='mutation':
@@ -237,56 +308,6 @@ def field2reportfield(f):
         newf = newf.title() 
     return newf
 
-def parse_tab_file(tabfile, keyfunc=None, fieldfunc=None, requiredfield=None):
-    """Parse a tab-delimited file with column headers.  Returns a dict with
-       key values:
-       'fields': a list of fields in the order they appear in the column header
-       'data': a list of dicts containing the values of each row in the order
-               they appear in the file.  The dicts are keyed by field name with 
-               values the row values; also, an additional key 'line' is added
-               with value the original line from the file.  If the optional arg
-               keyfunc is supplied, then and additional key 'dkey' is added
-               with value the result from the keyfunc function on that row.
-       'datadict': (optional) a dict keyed by the result of keyfunc operated on 
-               the row dict with value the row dict.  This value only appears
-               if keyfunc is present.
-
-       Keyword arguments:
-       keyfunc -- function to create a unique key for each row of data.  The
-               supplied function should take a dict as its only argument and
-               return a unique key for each data row.
-       fieldfunc -- function to reformat field names from header.
-       requiredfield -- skip rows where this field is empty.  """
-    data = []
-    datadict = {}
-    header = []
-    with open(tabfile, 'r') as fh:
-        for line in fh:
-            if line.startswith('#'):
-                header.append(line.rstrip())
-                continue
-            else:
-                fields = [ fieldfunc(f.strip()) if fieldfunc else f.strip() \
-                   for f in line.rstrip('\t\n\r').split("\t") ]
-                break
-        for line in fh:
-            if not line.rstrip('\n\r'): 
-                continue
-            vals = [ v.strip() for v in line.split("\t") ]
-            d = dict(zip(fields, vals))
-            if requiredfield and d.get(requiredfield, '')=='':
-                continue
-            d['line'] = line
-            data.append(d)
-            if keyfunc:
-                dkey = keyfunc(d)
-                d['dkey'] = dkey
-                datadict[dkey] = d
-    tabfileinfo = {'fields':fields, 'data':data, 'header':header}
-    if keyfunc:
-        tabfileinfo['datadict'] = datadict
-    return tabfileinfo
-
 def parse_truths(truthfile, create_dkey):
     sys.stdout.write("  Reading truths: {}\n".format(truthfile))
     truthinfo = parse_tab_file(truthfile, keyfunc=create_dkey)
@@ -331,27 +352,38 @@ def print_checked_file(vinfo, truthset, outfile):
 
 #----dbops.py-----------------------------------------------------------------
 
-def current_time():
-    return datetime.datetime.now()
+#  Schema migrations for stamp_common.dbops.migrate_db.  The schema file 
+#  is version 0.  Migrations must be safe to rerun.
 
-def results_as_dict(cursor):
-    columns = [ d[0] for d in cursor.description ]
-    data = []
-    for ans in cursor.fetchall():
-        d = dict(zip(columns, ans))
-        data.append(d)
-    return data
-
-def connect_db(dbfile):
-    sys.stdout.write("  Connecting to db {}\n".format(dbfile))
-    dbh = sqlite3.connect(dbfile)
-    return dbh
-
-def add_schema(dbh, schemafile):
-    sys.stdout.write("  Reading schema {}\n".format(schemafile))
-    with open(schemafile, 'r') as fh:
-        schema = ' '.join(fh.readlines())
-        dbh.executescript(schema)
+def add_lookup_indexes(cursor):
+    """Indexes for joining variants to samples and for selecting expected
+    variants and failed samples"""
+    tables = get_tables(cursor)
+    for vartype in VARTYPES:
+        if vartype in tables:
+            cursor.execute("CREATE INDEX IF NOT EXISTS {0}_expected_index "
+                           "ON {0} (is_expected)".format(vartype))
+        if 'sample_'+vartype in tables:
+            cursor.execute("CREATE INDEX IF NOT EXISTS sample_{0}_id_index "
+                           "ON sample_{0} ({0}_id)".format(vartype))
+    cursor.execute("CREATE INDEX IF NOT EXISTS sample_status_index"+\
+                   " ON sample (sample_status)")
+
+def no_schema_change(cursor):
+    """Version 2 added the variant_detection table, which nothing read.
+    Numbers are never reused, so it stays as a no-op; 3 drops the table
+    from dbs already at version 2."""
+    pass
+
+def drop_variant_detection(cursor):
+    cursor.execute("DROP TABLE IF EXISTS variant_detection")
+
+# (version, description, schema change, backfill run after schema change)
+MIGRATIONS = [
+    (1, "Add lookup indexes", add_lookup_indexes, None),
+    (2, "Add variant_detection table", no_schema_change, None),
+    (3, "Drop variant_detection", drop_variant_detection, None),
+]
 
 def save_variants(cursor, dbtable, data, fields, is_expected=0):
     flist = ['id',]+ fields[:]
@@ -550,15 +582,31 @@ def get_all_sample_mutations(cursor):
     results = results_as_dict(cursor)
     return results
 
-def save_sample_fusion(cursor, sample_id, d, fields, debug=False):
+def find_fusion(cursor, d, tolerance=FUSION_BREAK_TOLERANCE, debug=False):
+    """Fusion in db with the same breakpoints as d, or else the closest
+    one of the same gene pair with breakpoints within tolerance bp"""
     fusion = get_fusion(cursor, d['region1'], d['region2'], d['break1'], 
-                     d['break2'], debug=debug)
+                        d['break2'], debug=debug)
+    if fusion or not tolerance:
+        return fusion
+    fusions = get_fusions(cursor, d['region1'], d['region2'], debug=debug)
+    index = FusionIndex()
+    for i, f in enumerate(fusions):
+        index.add(f['region1'], f['region2'], f['break1'], f['break2'], i)
+    i = index.find(d['region1'], d['region2'], d['break1'], d['break2'],
+                   tolerance)
+    return fusions[i] if i is not None else None
+
+def save_sample_fusion(cursor, sample_id, d, fields, 
+                       tolerance=FUSION_BREAK_TOLERANCE, debug=False):
+    fusion = find_fusion(cursor, d, tolerance, debug=debug)
     if debug: print "\nd{}\nfusion {}".format(d, fusion)
     if not fusion: # fusion not in db, so save
         save_variants(cursor, 'fusion', [d,], fields)
         fusion = get_fusion(cursor, d['region1'], d['region2'], d['break1'], 
                      d['break2'], debug=debug)
-    ins_sql = 'INSERT INTO sample_fusion '+\
+    # calls of the sample within tolerance of each other are saved once
+    ins_sql = 'INSERT OR IGNORE INTO sample_fusion '+\
               '(sample_id, fusion_id, last_modified) VALUES (?,?,?)'
 #    sys.stderr.write(ins_sql+"\n")
 #    sys.stderr.write("{} {}\n".format(sample_id, fusion['id']))
@@ -640,13 +688,12 @@ def cnv_key(d):
 
 
 class TruthSet:
-    def __init__(self, name, dbh, ctrl_version):
+    def __init__(self, name, pool, ctrl_version):
         self.name = name
-        self.dbh = dbh
+        self.pool = pool
         self.ctrl_version = ctrl_version
         self.ctrl_version_tag = ' (STAMP {})'.format(ctrl_version) if \
                                 ctrl_version else ''
-        self.cursor = dbh.cursor()
         self.variant_types = []
         self.dkey = {
             'mutation': mut_key,
@@ -656,17 +703,35 @@ class TruthSet:
         self.data = {}
         self.datadict = {}
         self.fields = {}
-        for vartype in VARTYPES:
-            (data, ddict, fields) = self.truths_from_db(self.cursor, vartype)
-            self.data[vartype] = data
-            self.datadict[vartype] = ddict
-            self.fields[vartype] = fields
-            if data:
-                self.variant_types.append(vartype)
+        with pool.connection() as dbh:
+            for vartype in VARTYPES:
+                (data, ddict, fields) = self.truths_from_db(dbh.cursor(), 
+                                                            vartype)
+                self.data[vartype] = data
+                self.datadict[vartype] = ddict
+                self.fields[vartype] = fields
+                if data:
+                    self.variant_types.append(vartype)
+        self.fusionindex = FusionIndex()
+        for d in self.data['fusion']:
+            self.fusionindex.add(d['region1'], d['region2'], d['break1'],
+                                 d['break2'], d['dkey'])
+
+    def __getstate__(self):
+        """Drop db pool so truths can be sent to worker processes"""
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
 
     def has_vartype(self, vartype):
         return True if vartype in self.variant_types else False
 
+    def match_fusion(self, d, tolerance=FUSION_BREAK_TOLERANCE):
+        """dkey of the expected fusion with the gene pair of fusion d and
+        breakpoints within tolerance bp, or None"""
+        return self.fusionindex.find(d['region1'], d['region2'], 
+                                     d['break1'], d['break2'], tolerance)
+
     def truths_from_db(self, cursor, dbtable):
         cmd = "SELECT * FROM {} WHERE is_expected=?".format(dbtable)
         cursor.execute(cmd, [1,])
@@ -686,8 +751,11 @@ class TruthSet:
         return data, datadict, columns
 
     def db_summary(self):
+        with self.pool.connection() as dbh:
+            return self.db_counts(dbh.cursor())
+
+    def db_counts(self, cursor):
         msgs = [self.name+self.ctrl_version_tag+'\n',]
-        cursor = self.cursor
         cursor.execute('SELECT COUNT(*)' +\
             ', (SELECT COUNT(*) FROM sample WHERE sample_status=?)'*2 +\
             ' FROM sample', ['PASS', 'FAIL'])
@@ -729,22 +797,37 @@ class VariantSet:
         self.run = run
         self.ctrl = ctrl
         self.truthset = truthset
-        self.dbh = truthset.dbh
-        self.cursor = truthset.cursor
         self.data = {}
         self.datadict = {}
         self.fields = {}
         self.vartypes = []
 
+    def __getstate__(self):
+        """Drop truthset when sent between processes.
+        Use set_truthset to reattach it."""
+        state = self.__dict__.copy()
+        state['truthset'] = None
+        return state
+
+    def set_truthset(self, truthset):
+        self.truthset = truthset
+
     def has_vartype(self, vartype):
         return True if vartype in self.data and self.data[vartype] else False
 
-    def add_variants(self, vfile, vartype):
+    def add_variants(self, vfile, vartype, dbcolumns_only=False):
+        """Read report.  If dbcolumns_only, only the columns needed to
+        compare the variants and save them to the db are kept, so the 
+        rows cannot be printed with print_checked_file."""
         sys.stdout.write("  Reading {} report: {}\n".format(vartype, vfile))
         create_dkey = self.truthset.dkey[vartype]
         requiredfield = 'status' if vartype=='cnv' else None
+        columns = None
+        if dbcolumns_only:
+            columns = self.truthset.fields[vartype] + SAMPLE_COLUMNS[vartype]
         vinfo = parse_tab_file(vfile, keyfunc=create_dkey, 
-                fieldfunc=field2dbfield, requiredfield=requiredfield)
+                fieldfunc=field2dbfield, requiredfield=requiredfield,
+                columns=columns)
         massage_data(vinfo['data'], vartype)
         if vartype=='cnv':
             # CNV cutoffs are hardcoded.  Check that they are still valid.
@@ -775,6 +858,10 @@ class VariantSet:
             for d in self.data[vartype]:
                 d['Expected?'] = 'Not expected'
                 dkey = create_dkey(d)
+                if vartype=='fusion' and dkey not in truth:
+                    # breakpoints of the same fusion can differ by a few bp
+                    dkey = self.truthset.match_fusion(d) or dkey
+                    d['dkey'] = dkey
                 summary['Total'] += 1
                 if dkey in truth:
                     summary['Expected'] += 1
@@ -800,7 +887,9 @@ class VariantSet:
             sys.stdout.write("  All expected variants found\n")
         return self.summary
 
-    def save2db(self, status, force=False):
+    def save2db(self, status, force=False, dbh=None):
+        """Save sample and its variants to db in one write transaction.
+        If dbh is given, the caller's transaction on dbh is used."""
         sampname = self.sample
         runname = self.run
         if not runname or not sampname:
@@ -813,7 +902,11 @@ class VariantSet:
                 sys.stderr.write("  Need sample and run name\n")
             sys.stderr.flush()
             return 0
-        cursor = self.cursor
+        if dbh is None:
+            with self.truthset.pool.connection() as dbh:
+                with write_transaction(dbh):
+                    return self.save2db(status, force, dbh)
+        cursor = dbh.cursor()
         sample = get_sample(cursor, runname, sampname)
         if force or not sample:
             if sample and force:
@@ -840,7 +933,6 @@ class VariantSet:
                     for d in vdata:
                         save_sample_mutation(cursor, sample['id'], d, fields)
             update_sample_counts(cursor, sample['id'])
-            self.dbh.commit()
         vafs = get_sample_mutations(cursor, sample['id'])
         sys.stdout.write('    Have {} mutations for sample {}:{} in db.\n'.\
                          format(len(vafs), runname, sampname))
@@ -848,55 +940,217 @@ class VariantSet:
         return 1
 
 
-def check_db(ctrl):
+def check_db(ctrl, journal_mode=None):
+    """Look for existing db or create new db.  Returns ConnectionPool 
+    for db"""
     sys.stdout.write("\n{}: checking db\n".format(ctrl))
     dbfile = REFS[ctrl]['SQLITEDB']
-    is_new_db = not os.path.exists(dbfile)
-    dbh = connect_db(dbfile)
+    pool = ConnectionPool(dbfile, journal_mode=journal_mode)
+    dbh = pool.get()
     cursor = dbh.cursor()
     msgs = []
-    if is_new_db:
-        add_schema(dbh, REFS[ctrl]['SCHEMAFILE'])
-        msgs.append("  Saving truths\n")
-        tinfo = parse_truths(REFS[ctrl]['TRUTHFILE'], mut_key)
-        sys.stdout.write("    {} mutations\n".format(len(tinfo['data'])))
-        save_variants(cursor, 'mutation', tinfo['data'], tinfo['fields'])
-        dbh.commit()
-        cursor.execute('SELECT COUNT(*) FROM mutation')
-        msgs.append("    {} rows inserted into {}\n".format(
-                    cursor.fetchone()[0], 'mutation'))
-        if 'FUSIONFILE' in REFS[ctrl]:
-            finfo = parse_truths(REFS[ctrl]['FUSIONFILE'], fusion_key)
-            sys.stdout.write("    {} fusions\n".format(len(finfo['data'])))
-            save_variants(cursor, 'fusion', finfo['data'], finfo['fields'])
-            dbh.commit()
-            cursor.execute('SELECT COUNT(*) FROM fusion')
-            msgs.append("    {} rows inserted into {}\n".format(
-                    cursor.fetchone()[0], 'fusion'))
-            tinfo['fusion_data'] = finfo['data']
-            tinfo['fusion_fields'] = finfo['fields']
-            tinfo['fusion_datadict'] = finfo['datadict']
-        if 'CNVFILE' in REFS[ctrl]:
-            cinfo = parse_truths(REFS[ctrl]['CNVFILE'], cnv_key)
-            sys.stdout.write("    {} CNVs\n".format(len(cinfo['data'])))
-            save_variants(cursor, 'cnv', cinfo['data'], cinfo['fields'])
-            dbh.commit()
-            cursor.execute('SELECT COUNT(*) FROM cnv')
+    # Check for tables once holding the write lock, in case another
+    # user is creating the db
+    with write_transaction(dbh):
+        is_new_db = not has_tables(cursor)
+        if is_new_db:
+            add_schema(dbh, REFS[ctrl]['SCHEMAFILE'])
+            msgs.append("  Saving truths\n")
+            tinfo = parse_truths(REFS[ctrl]['TRUTHFILE'], mut_key)
+            sys.stdout.write("    {} mutations\n".format(len(tinfo['data'])))
+            save_variants(cursor, 'mutation', tinfo['data'], tinfo['fields'])
+            cursor.execute('SELECT COUNT(*) FROM mutation')
             msgs.append("    {} rows inserted into {}\n".format(
-                    cursor.fetchone()[0], 'cnv'))
-            tinfo['cnv_data'] = cinfo['data']
-            tinfo['cnv_fields'] = cinfo['fields']
-            tinfo['cnv_datadict'] = cinfo['datadict']
+                        cursor.fetchone()[0], 'mutation'))
+            if 'FUSIONFILE' in REFS[ctrl]:
+                finfo = parse_truths(REFS[ctrl]['FUSIONFILE'], fusion_key)
+                sys.stdout.write("    {} fusions\n".format(len(finfo['data'])))
+                save_variants(cursor, 'fusion', finfo['data'], finfo['fields'])
+                cursor.execute('SELECT COUNT(*) FROM fusion')
+                msgs.append("    {} rows inserted into {}\n".format(
+                        cursor.fetchone()[0], 'fusion'))
+                tinfo['fusion_data'] = finfo['data']
+                tinfo['fusion_fields'] = finfo['fields']
+                tinfo['fusion_datadict'] = finfo['datadict']
+            if 'CNVFILE' in REFS[ctrl]:
+                cinfo = parse_truths(REFS[ctrl]['CNVFILE'], cnv_key)
+                sys.stdout.write("    {} CNVs\n".format(len(cinfo['data'])))
+                save_variants(cursor, 'cnv', cinfo['data'], cinfo['fields'])
+                cursor.execute('SELECT COUNT(*) FROM cnv')
+                msgs.append("    {} rows inserted into {}\n".format(
+                        cursor.fetchone()[0], 'cnv'))
+                tinfo['cnv_data'] = cinfo['data']
+                tinfo['cnv_fields'] = cinfo['fields']
+                tinfo['cnv_datadict'] = cinfo['datadict']
 #    else:
 #        tinfo = truths_from_db(cursor)
 #        msgs = db_summary(cursor)
-        sys.stdout.write(''.join(msgs))
-        sys.stdout.flush()
-    return dbh
-
+            sys.stdout.write(''.join(msgs))
+            sys.stdout.flush()
+    migrate_db(dbh, MIGRATIONS)
+    pool.put(dbh)
+    return pool
+
+def db_cache_key(dbfile, schema_version):
+    """Key for startup cache.  Changes when the db, or its WAL file, is 
+    written.  An empty WAL file is ignored since one is created by every
+    connection."""
+    key = [STARTUP_CACHE_VERSION, schema_version]
+    for fname in (dbfile, dbfile+'-wal'):
+        if os.path.exists(fname):
+            st = os.stat(fname)
+            if st.st_size:
+                key.extend([fname, st.st_mtime, st.st_size])
+    return tuple(key)
+
+def read_startup_cache(cachefile, key):
+    """Return cached data if cachefile was saved with key, else None"""
+    if not cachefile or not os.path.exists(cachefile):
+        return None
+    try:
+        with open(cachefile, 'rb') as fh:
+            cache = cPickle.load(fh)
+    except Exception, e:
+        sys.stderr.write("  Ignoring startup cache {}: {}{}\n".format(
+                         cachefile, type(e).__name__, e))
+        return None
+    if cache.get('key')!=key:
+        return None
+    return cache
+
+def save_startup_cache(cachefile, key, truthset, summary):
+    if not cachefile:
+        return
+    cache = { 'key': key, 'truthset': truthset, 'summary': summary }
+    tmpfile = cachefile+'.tmp{}'.format(os.getpid())
+    try:
+        with open(tmpfile, 'wb') as fh:
+            cPickle.dump(cache, fh, cPickle.HIGHEST_PROTOCOL)
+        replace_file(tmpfile, cachefile)
+    except (IOError, OSError), e:
+        sys.stderr.write("  Could not save startup cache {}: {}\n".format(
+                         cachefile, e))
+
+def load_truthset(ctrl, pool, ctrl_version, cachefile=None):
+    """Return TruthSet and db summary for ctrl.  Uses the startup cache
+    if the db has not changed since the cache was saved."""
+    with pool.connection() as dbh:
+        key = db_cache_key(pool.dbfile, get_schema_version(dbh.cursor()))
+    cache = read_startup_cache(cachefile, key)
+    if cache:
+        truthset = cache['truthset']
+        truthset.pool = pool
+        return truthset, cache['summary']
+    truthset = TruthSet(ctrl, pool, ctrl_version)
+    summary = truthset.db_summary()
+    save_startup_cache(cachefile, key, truthset, summary)
+    return truthset, summary
+
+
+#----batch.py-----------------------------------------------------------------
+
+def add_sample_reports(vinfo, d, dbcolumns_only=False):
+    """Add variant, fusion and CNV reports found for sample to VariantSet.
+    Returns dict keyed by vartype with name of checked report to print."""
+    outfile = {}
+    if 'v_report' in d:
+        outfile['mutation'] = d['v_report'].replace('.txt','')+\
+                              ".checked.txt"
+        vinfo.add_variants(d['v_report'], 'mutation', dbcolumns_only)
+    if 'f_report' in d:
+        outfile['fusion'] = d['f_report'].replace('.txt','')+\
+                              ".checked.txt"
+        vinfo.add_variants(d['f_report'], 'fusion', dbcolumns_only)
+    if 'c_report' in d:
+        outfile['cnv'] = d['c_report'].replace('.txt','')+\
+                              ".checked.txt"
+        vinfo.add_variants(d['c_report'], 'cnv', dbcolumns_only)
+    return outfile
+
+def compare_sample(sample, d, truthset, status, dbcolumns_only=False):
+    vinfo = VariantSet(sample, d['run'], d['control'], truthset)
+    outfile = add_sample_reports(vinfo, d, dbcolumns_only)
+    vinfo.compare_variants(status)
+    return vinfo, outfile
+
+WORKER_TRUTHSETS = {}
+
+def init_compare_worker(tinfo):
+    WORKER_TRUTHSETS.update(tinfo)
+
+def compare_sample_worker(job):
+    """Run compare_sample in a worker process.  Stdout is captured and
+    returned so it can be written out in sample order."""
+    sample, d, status, dbcolumns_only = job
+    stdout = sys.stdout
+    sys.stdout = StringIO()
+    try:
+        vinfo, outfile = compare_sample(sample, d, 
+                         WORKER_TRUTHSETS[d['control']], status, 
+                         dbcolumns_only)
+        output = sys.stdout.getvalue()
+    finally:
+        sys.stdout = stdout
+    return vinfo, outfile, output
+
+def compare_samples(samples2files, tinfo, status, jobs=1, 
+                    dbcolumns_only=False):
+    """Parse and compare reports for each sample, using a pool of jobs
+    processes if jobs > 1.  Yields (sample, d, VariantSet, outfile) 
+    in sorted sample order; output matches running each sample serially.
+    If dbcolumns_only, only the report columns saved to the db are read."""
+    samples = sorted(samples2files.items())
+    for sample, d in samples:
+        if not d['control'] in tinfo:
+            sys.exit("No truth data for {} in db\n".format(d['control']))
+    if jobs > 1 and len(samples) > 1:
+        pool = multiprocessing.Pool(min(jobs, len(samples)), 
+                   init_compare_worker, (tinfo,))
+        try:
+            jobargs = [ (sample, d, status, dbcolumns_only) 
+                        for sample, d in samples ]
+            results = pool.imap(compare_sample_worker, jobargs)
+            for i, (vinfo, outfile, output) in enumerate(results):
+                sample, d = samples[i]
+                sys.stdout.write("\nSample: {}\tRun: {}\tControl: {}\n".format(
+                                 sample, d['run'], d['control']))
+                sys.stdout.write(output)
+                vinfo.set_truthset(tinfo[d['control']])
+                yield sample, d, vinfo, outfile
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for sample, d in samples:
+            sys.stdout.write("\nSample: {}\tRun: {}\tControl: {}\n".format(
+                             sample, d['run'], d['control']))
+            vinfo, outfile = compare_sample(sample, d, tinfo[d['control']],
+                                            status, dbcolumns_only)
+            yield sample, d, vinfo, outfile
 
 #----spreadsheet.py-----------------------------------------------------------
 
+WB_FORMATS = {
+    'bold': {'bold': True},
+    'perc': {'num_format': '#.##%'},
+    'red': {'bg_color': '#C58886', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltred': {'bg_color': '#E9D4D3', 'border': 1, 'border_color':'#CDCDCD'},
+    'orange': {'bg_color': '#FCD5B4', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltgreen': {'bg_color': '#EBF1DE', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltblue': {'bg_color': '#D7E1EB', 'border': 1, 'border_color':'#CDCDCD'},
+    'blue': {'bg_color': '#88A4C5', 'border': 1, 'border_color':'#CDCDCD'},
+    'gray': {'bg_color': '#F0F0F0', 'border': 1, 'border_color':'#CDCDCD'},
+    'dkgray': {'bg_color': '#D9D9D9', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltbluepatt': {'fg_color': '#DCE6F0', 'pattern': 8,
+                   'border': 1, 'border_color':'#CDCDCD'},
+    'ltgreen_perc': {'num_format': '#.##%', 'bg_color': '#EBF1DE',
+                     'border': 1, 'border_color':'#CDCDCD'},
+    'gray_perc': {'num_format': '#.##%', 'bg_color': '#F0F0F0',
+                  'border': 1, 'border_color':'#CDCDCD'},
+    'dkgray_perc': {'num_format': '#.##%', 'bg_color': '#D9D9D9',
+                    'border': 1, 'border_color':'#CDCDCD'},
+}
+
 def mutation_sheet_data(ctrl, dbh, samples, tfields):
     allmuts = get_all_sample_mutations(dbh.cursor())
     data = { 'title': ctrl+' mutations', 
@@ -928,6 +1182,23 @@ def mutation_sheet_data(ctrl, dbh, samples, tfields):
         data['fields'].remove('is_expected')
     return data
 
+def collapse_fusions(fusions, tolerance=FUSION_BREAK_TOLERANCE):
+    """Dict keyed by fusion id of the id of the fusion its row is 
+    collapsed into.  Fusions of the same gene pair with breakpoints 
+    within tolerance bp share the row of the expected fusion, or else
+    the first one in the db."""
+    index = FusionIndex()
+    rowids = {}
+    for d in sorted(fusions, key=lambda d: (not d['is_expected'], d['id'])):
+        rowid = index.find(d['region1'], d['region2'], d['break1'],
+                           d['break2'], tolerance)
+        if rowid is None:
+            rowid = d['id']
+            index.add(d['region1'], d['region2'], d['break1'], d['break2'],
+                      rowid)
+        rowids[d['id']] = rowid
+    return rowids
+
 def fusion_sheet_data(ctrl, dbh, samples, tfields):
     allfusions = get_all_sample_fusions(dbh.cursor())
     if not allfusions:
@@ -936,19 +1207,25 @@ def fusion_sheet_data(ctrl, dbh, samples, tfields):
              'hiderows': [0, ],
              'expected':defaultdict(dict), 
              'horizon':defaultdict(dict), 
-             'not_expected':defaultdict(dict) }
+             'not_expected':defaultdict(dict),
+             'fusions': {} }
+    fusions = dict([ (f['id'], f) for f in get_fusions(dbh.cursor()) ])
+    rowids = collapse_fusions(fusions.values())
     for d in allfusions:
         if not d['sample_status']=='FAIL':
-            if d['HorizonVAF'] and d['is_expected']:
+            # near-identical calls are shown in the row of one fusion
+            f = fusions[rowids[d['fusion_id']]]
+            if f['HorizonVAF'] and f['is_expected']:
                 vdict = data['horizon']
-                dkey = int(d['fusion_id']) # sort by order in db
-            elif d['is_expected']:
+                dkey = int(f['id']) # sort by order in db
+            elif f['is_expected']:
                 vdict = data['expected']
-                dkey = int(d['fusion_id']) # sort by order in db
+                dkey = int(f['id']) # sort by order in db
             else:
                 vdict = data['not_expected']
-                dkey = int(d['fusion_id']) # sort by order in db
+                dkey = int(f['id']) # sort by order in db
             vdict[dkey][d['sample_name']] = d
+            data['fusions'][dkey] = f
     numexpected = len(data['expected']) + len(data['horizon'])
     data['header'] = [ "# This spreadsheet is automatically generated." +\
            " Any edits will be lost in future versions.",
@@ -993,49 +1270,6 @@ def cnv_sheet_data(ctrl, dbh, samples, tfields):
         data['fields'].remove(exclude)
     return data
 
-def convert_to_excel_col(colnum):
-    mod = colnum % 26
-    let = chr(mod+65)
-    if colnum >= 26:
-        rep = colnum/26
-        let1 = chr(rep+64)
-        let = let1 + let
-    return let
-
-def add_formats_to_workbook(workbook):
-    wbformat = {}
-    wbformat['bold'] = workbook.add_format({'bold': True})
-    wbformat['perc'] = workbook.add_format({'num_format': '#.##%'})
-    wbformat['red'] = workbook.add_format({'bg_color': '#C58886', 
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltred'] = workbook.add_format({'bg_color': '#E9D4D3', 
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['orange'] = workbook.add_format({'bg_color': '#FCD5B4',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltgreen'] = workbook.add_format({'bg_color': '#EBF1DE',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltblue'] = workbook.add_format({'bg_color': '#D7E1EB',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['blue'] = workbook.add_format({'bg_color': '#88A4C5',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['gray'] = workbook.add_format({'bg_color': '#F0F0F0',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['dkgray'] = workbook.add_format({'bg_color': '#D9D9D9',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltbluepatt'] = workbook.add_format({'fg_color': '#DCE6F0', 
-                                       'pattern': 8,
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltgreen_perc'] = workbook.add_format({'num_format': '#.##%',
-                                       'bg_color': '#EBF1DE',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['gray_perc'] = workbook.add_format({'num_format': '#.##%',
-                                       'bg_color': '#F0F0F0',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['dkgray_perc'] = workbook.add_format({'num_format': '#.##%',
-                                       'bg_color': '#D9D9D9',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    return wbformat
-
 def add_avg_stddev_columns(worksheet, rownum, colavg, colstd, mutdat,
                            runrange, expecttype):
     if expecttype!='not_expected':
@@ -1180,9 +1414,9 @@ def add_fusion_sheet_excel(workbook, wbformat, samples, data,
         vdat = [ data[expecttype][sortkey][sample] if sample \
                  in data[expecttype][sortkey] else None \
                  for sample in samples['good'] ] 
-        vdat2 = [ d for d in vdat if d ] # dicts with data only
+        fusion = data['fusions'][sortkey]
         for colnum, f in enumerate(data['fields']):
-            v = vdat2[0][f] if f in vdat2[0] else ''
+            v = fusion[f] if f in fusion else ''
             if colnum == i_horizonVAF: # format as number/percent
                 if v: 
                     worksheet.write(rownum, colnum, v/100, percformat)
@@ -1289,7 +1523,11 @@ def add_cnv_sheet_excel(workbook, wbformat, samples, data, fieldfunc=None):
     return {'num_runs':numruns, 'num_samples':numsamples, 
             'num_variants':numvariants}
 
-def generate_excel_spreadsheet(ctrl, dbh, tfields, outfile):
+def generate_excel_spreadsheet(ctrl, pool, tfields, outfile):
+    with pool.connection() as dbh:
+        return write_excel_spreadsheet(ctrl, dbh, tfields, outfile)
+
+def write_excel_spreadsheet(ctrl, dbh, tfields, outfile):
     compile_sheet_data = { 'mutation': mutation_sheet_data,
                            'fusion': fusion_sheet_data, 
                            'cnv': cnv_sheet_data, }
@@ -1297,8 +1535,9 @@ def generate_excel_spreadsheet(ctrl, dbh, tfields, outfile):
                         'fusion': add_fusion_sheet_excel, 
                         'cnv': add_cnv_sheet_excel, }
     sys.stdout.write("\nCreating {} Excel file:\n{}\n".format(ctrl, outfile))
-    workbook = xlsxwriter.Workbook(outfile)
-    wbformat = add_formats_to_workbook(workbook)
+    tmpfile = temp_outfile(outfile)
+    workbook = xlsxwriter.Workbook(tmpfile)
+    wbformat = add_formats_to_workbook(workbook, WB_FORMATS)
     nums = {}
     for vartype in VARTYPES:
         all_samples = get_samples(dbh.cursor(), vartype=vartype)
@@ -1321,385 +1560,190 @@ def generate_excel_spreadsheet(ctrl, dbh, tfields, outfile):
 #        nums = add_cnv_sheet_excel(workbook, wbformat, samples['cnv'], 
 #               data['cnv'], fieldfunc=field2reportfield) 
     workbook.close()
-    wb = openpyxl.load_workbook(outfile)
-    wb.save(outfile)
+    # openpyxl imports numpy if it is installed, so only import it here
+    import openpyxl
+    wb = openpyxl.load_workbook(tmpfile)
+    wb.save(tmpfile)
+    replace_file(tmpfile, outfile)
     sys.stdout.flush()
     return nums
 
-#----gui.py-------------------------------------------------------------------
-
-class StampQC_App(wx.App):
-    def __init__(self, dbhs, tinfos, controls, msg=None, **kwargs):
-        self.dbh = dbhs
-        self.tinfo = tinfos
-        self.controls = controls
-        self.msg = msg
-        wx.App.__init__(self, kwargs)
-
-    def OnInit(self):
-        self.frame = StampFrame(self.dbh, self.tinfo, self.controls, 
-                                msg=self.msg)
-        self.frame.Show()
-        self.SetTopWindow(self.frame)
-        return True
-
-class StampFrame(wx.Frame):
-    def __init__(self, dbh, tinfo, controls, msg=None):
-        wx.Frame.__init__(self, None, title="STAMP QC v{}".format(VERSION), 
-                          size=(550,525))
-        self.dbh = dbh
-        self.tinfo = tinfo
-        self.controls = controls
-        ctrl_version = get_ctrl_version()
-        self.ctrl_version = ' (STAMP {})'.format(ctrl_version) if \
-                            ctrl_version else ''
-
-        panel = wx.Panel(self)
-        label = wx.StaticText(panel, -1, 
-            "Drop TruQ3 or HD753 variant, fusion, or CNV reports here:")
-        self.text = wx.TextCtrl(panel,-1, "",style=wx.TE_READONLY|
-                                wx.TE_MULTILINE|wx.HSCROLL)
-        button_print = wx.Button(panel, -1, "Print reports")
-        print_tooltip = "Creates new variant reports with variants "+\
-            "labelled expected, not expected or not found. New reports "+\
-            "are named <Sample>.variant_report.checked.txt and saved "+\
-            "in same folder as original report."
-        button_print.SetToolTip(wx.ToolTip(print_tooltip))
-        self.Bind(wx.EVT_BUTTON, self.PrintReports, button_print)
-        button_save = wx.Button(panel, -1, "Update spreadsheets and DB")
-        save_tooltip = "Update spreadsheet and database with data entered.\n"
-        button_save.SetToolTip(wx.ToolTip(save_tooltip))
-        self.Bind(wx.EVT_BUTTON, self.UpdateSpreadsheetAndDB, button_save)
-        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
-        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
-        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
-        self.notebook = StampNotebook(panel, tinfo, controls, msg=msg)
-
-        sizer = wx.BoxSizer(wx.VERTICAL)
-        sizer.Add(label, 0, wx.ALL, 5)
-        sizer.Add(self.text, 1, wx.EXPAND|wx.ALL, 5)
-        sizer.Add(self.notebook, 0, wx.EXPAND|wx.ALL, 5)
-
-        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
-        button_sizer.Add(button_print, 0, wx.ALIGN_CENTER_VERTICAL)
-        button_sizer.Add(button_save, 0, wx.ALIGN_CENTER_VERTICAL)
-        button_sizer.AddStretchSpacer()
-        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
-        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
-        panel.SetSizer(sizer)
-
-        dt = VariantReportDrop(self.text, self.notebook, tinfo)
-        self.text.SetDropTarget(dt)
-
-    def PrintReports(self, event):
-        self.text.AppendText("\nPrinting reports:\n")
-        if not self.notebook.results:
-            self.text.AppendText("  No reports to process.\n\n")
-            return
-        for i, info in enumerate(self.notebook.results):
-            if not info: continue
-            entries = self.notebook.entries[i]
-            sample = entries['sample'].GetValue()
-            outfile = {}
-            if 'file' in info:
-                outfile['mutation'] = info['file'].replace('.txt','') +\
-                                      ".checked.txt"
-            if 'fusion_file' in info:
-                outfile['fusion'] = info['fusion_file'].replace('.txt','') +\
-                                    ".checked.txt"
-            if 'cnv_file' in info:
-                outfile['cnv'] = info['cnv_file'].replace('.txt','') +\
-                                    ".checked.txt"
-            for vartype in outfile:
-                if not sample==info['sample']:
-                    outfile[vartype] = outfile[vartype].replace(
-                                           info['sample'], sample)
-                self.text.AppendText("  "+outfile[vartype]+"\n")
-            print_checked_file(info['vinfo'], self.tinfo[info['control']], 
-                               outfile)
-        self.text.AppendText("\n")
-
-    def UpdateSpreadsheetAndDB(self, event):
-        self.text.AppendText("\nUpdating data:\n")
-        if not self.notebook.results:
-            self.text.AppendText("  No data to save to db.\n")
-        else:
-            for i, info in enumerate(self.notebook.results):
-                if not info: continue
-                entries = self.notebook.entries[i]
-                sample = info['vinfo'].sample = entries['sample'].GetValue()
-                run = info['vinfo'].run = entries['run'].GetValue()
-                if not run or not sample:
-                    msg = "    {}: Not saved.".format(i)
-                    if not run and not sample:
-                        msg += "  Need run and sample\n"
-                    elif not run:
-                        msg += "  Need run name\n"
-                    else:
-                        msg += "  Need sample name\n"
-                    self.text.AppendText(msg)
-                    continue
-                statusnum = entries['status'].GetSelection()
-                status = entries['status'].GetString(statusnum)
-                saved = info['vinfo'].save2db(status, force=True)
-                if saved:
-                    self.text.AppendText(
-                        "        Saved {} data to db.\n".format(sample))
+def write_tile_value(worksheet, row, col, value, wbformat, cutoff=None):
+    """Write number rounded to 3 places, blank if NaN.  Highlight if 
+    abs(value) >= cutoff."""
+    if math.isnan(value):
+        worksheet.write_blank(row, col, None)
+        return
+    fmt = None
+    if cutoff and abs(value) >= cutoff:
+        fmt = wbformat['ltred'] if value > 0 else wbformat['ltblue']
+    worksheet.write_number(row, col, round(value, 3), fmt)
+
+def write_tile_spreadsheet(ctrl, tilefiles, outfile, cachefile=None):
+    """Excel file of CNV tile z-score baselines and drift over tilefiles,
+    a list of (sample, run, tile file).  
+    Genes sheet: drift of gene mean-z from the mean of its tile baselines
+    for each sample, and the tile with the largest median contribution.
+    Tiles sheet: median and MAD z-score of each tile, and the deviation
+    of each sample from the median in MADs.
+    Drivers sheet: the tile contributing most to each gene drift that is 
+    >= TILE_DRIFT_CUTOFF."""
+    # numpy is only needed for the tile files so keep it out of other runs
+    import numpy
+    from stamp_common.cnvtiles import TileMatrix
+    sys.stdout.write("\nCreating {} CNV tile Excel file:\n{}\n".format(ctrl,
+                     outfile))
+    tilefiles = sorted(tilefiles, reverse=True, key=lambda t: \
+                       "%-10s %s" % (t[1], t[0]))
+    tiles = TileMatrix([ (sample, tfile) for sample, run, tfile in tilefiles ],
+                       cachefile)
+    runs = [ run for sample, run, tfile in tilefiles ]
+    median, mad = tiles.baseline()
+    deviation = tiles.deviation()
+    contribution = tiles.tile_contributions()
+    drift = tiles.gene_drift()
+    meanz = tiles.gene_means()
+    with numpy.errstate(invalid='ignore'):
+        absmedian = numpy.nanmedian(numpy.abs(contribution), axis=1)
+    generows = [ numpy.flatnonzero(tiles.gene_code==i) \
+                 for i in range(len(tiles.genes)) ]
+    tmpfile = temp_outfile(outfile)
+    workbook = xlsxwriter.Workbook(tmpfile)
+    wbformat = add_formats_to_workbook(workbook, WB_FORMATS)
+    numfixed = 3
+    worksheet = workbook.add_worksheet('Genes')
+    worksheet.write_row(0, 0, ['', '', 'Run']+runs, wbformat['bold'])
+    worksheet.write_row(1, 0, ['Gene', 'Tiles', 'Top drift tile']+tiles.runs,
+                        wbformat['bold'])
+    for i, gene in enumerate(tiles.genes):
+        rows = generows[i]
+        toptile = rows[numpy.nanargmax(absmedian[rows])] \
+                  if not numpy.all(numpy.isnan(absmedian[rows])) else None
+        worksheet.write_row(i+2, 0, [gene, len(rows), 
+            tiles.tiles[toptile] if toptile is not None else ''])
+        for j in range(len(tiles.runs)):
+            write_tile_value(worksheet, i+2, j+numfixed, drift[i,j], wbformat,
+                             TILE_DRIFT_CUTOFF)
+    worksheet.freeze_panes(2, numfixed)
+    numfixed = 5
+    worksheet = workbook.add_worksheet('Tiles')
+    worksheet.write_row(0, 0, ['']*(numfixed-1)+['Run']+runs, wbformat['bold'])
+    worksheet.write_row(1, 0, ['Tile', 'Chr', 'Gene', 'Median z', 'MAD z']+\
+                        tiles.runs, wbformat['bold'])
+    for i, tile in enumerate(tiles.tiles):
+        worksheet.write_row(i+2, 0, [tile, tiles.chroms[i], 
+                            tiles.genes[tiles.gene_code[i]]])
+        write_tile_value(worksheet, i+2, 3, median[i], wbformat)
+        write_tile_value(worksheet, i+2, 4, mad[i], wbformat)
+        for j in range(len(tiles.runs)):
+            write_tile_value(worksheet, i+2, j+numfixed, deviation[i,j], 
+                             wbformat, TILE_DEVIATION_CUTOFF)
+    worksheet.freeze_panes(2, numfixed)
+    worksheet = workbook.add_worksheet('Drivers')
+    worksheet.write_row(0, 0, ['Sample', 'Run', 'Gene', 'Mean z', 'Drift', 
+                        'Tile', 'Tile contribution'], wbformat['bold'])
+    rownum = 1
+    with numpy.errstate(invalid='ignore'):
+        flagged = numpy.abs(drift) >= TILE_DRIFT_CUTOFF
+    for j, sample in enumerate(tiles.runs):
+        for i in numpy.flatnonzero(flagged[:,j]):
+            rows = generows[i]
+            top = rows[numpy.nanargmax(numpy.abs(contribution[rows,j]))]
+            worksheet.write_row(rownum, 0, [sample, runs[j], tiles.genes[i]])
+            write_tile_value(worksheet, rownum, 3, meanz[i,j], wbformat)
+            write_tile_value(worksheet, rownum, 4, drift[i,j], wbformat,
+                             TILE_DRIFT_CUTOFF)
+            worksheet.write(rownum, 5, tiles.tiles[top])
+            write_tile_value(worksheet, rownum, 6, contribution[top,j], 
+                             wbformat)
+            rownum += 1
+    worksheet.freeze_panes(1, 0)
+    workbook.close()
+    replace_file(tmpfile, outfile)
+    sys.stdout.write("  {} tiles, {} samples, {} gene drifts >= {}\n".format(
+                     len(tiles.tiles), len(tiles.runs), rownum-1, 
+                     TILE_DRIFT_CUTOFF))
+    sys.stdout.flush()
+
+def cnv_cutoffs():
+    """Gene mean-z cutoffs in CNV_CUTOFF_STR: [amp, gain, loss, deletion]"""
+    return [ float(v) for v in \
+             CNV_CUTOFF_STR.split('[')[1].rstrip(']').split(',') ]
+
+def pon_check_message(pon, tiles, scaled, cutoffs):
+    """Genes of a sample with mean-z beyond the gain and loss cutoffs 
+    against PanelOfNormals pon"""
+    import numpy
+    genes, meanz = pon.gene_mean_z(tiles, scaled)
+    msg = []
+    with numpy.errstate(invalid='ignore'):
+        for label, flagged in (
+                ('>= {}'.format(cutoffs[1]), meanz >= cutoffs[1]),
+                ('<= {}'.format(cutoffs[2]), meanz <= cutoffs[2])):
+            msg.append("mean-z {}: {}".format(label, ', '.join(
+                [ "{} ({:.2f})".format(genes[i], meanz[i]) \
+                  for i in numpy.flatnonzero(flagged) ]) or 'none'))
+    return '; '.join(msg)
+
+def update_panel_of_normals(ctrl, tilefiles, ponfile, status='PASS'):
+    """Check the gene mean-z of each of tilefiles, a list of (sample, run,
+    tile file), against the panel of normals in ponfile without the
+    samples of tilefiles, then add the samples to the panel at once
+    unless status is FAIL.  Samples already in the panel are replaced,
+    or removed if status is FAIL.  Prints the genes with
+    mean-z beyond the gain and loss cutoffs, and percentiles of the gene 
+    mean-z of the panel samples to validate the cutoffs."""
+    # numpy is only needed for the tile files so keep it out of other runs
+    import numpy
+    from stamp_common.cnvtiles import PON_MIN_RUNS, TILE_COLUMNS, \
+         PanelOfNormals, read_tile_file
+    sys.stdout.write("\nUpdating {} panel of normals:\n{}\n".format(ctrl,
+                     ponfile))
+    cutoffs = cnv_cutoffs()
+    col = TILE_COLUMNS.index('scaled_depth')
+    tilefiles = sorted(tilefiles, key=lambda t: "%-10s %s" % (t[1], t[0]))
+    tiledata = [ (sample, read_tile_file(tfile)) \
+                 for sample, run, tfile in tilefiles ]
+    # lock the panel so runs added by other users at the same time are kept
+    try:
+        with file_lock(ponfile):
+            pon = PanelOfNormals(ponfile)
+            pon.remove_runs([ sample for sample, data in tiledata ])
+            for sample, (tiles, chroms, values) in tiledata:
+                if len(pon.runs) < PON_MIN_RUNS:
+                    sys.stdout.write("  {}: not checked, panel has {} ".\
+                        format(sample, len(pon.runs)) +\
+                        "samples (need {})\n".format(PON_MIN_RUNS))
                 else:
-                    self.text.AppendText(
-                        "        {} not saved to db.\n".format(sample))
-            summ = []
-            for ctrl in self.controls:
-#                summ.append(ctrl+self.ctrl_version+'\n')
-                summ.extend(self.tinfo[ctrl].db_summary())
-                summ.append('\n')
-            self.notebook.tabOne.ChangeMessage(''.join(summ))
-        try:
-            for ctrl in self.controls:
-                self.text.AppendText("  Updating {} spreadsheet.\n".format(
-                                     ctrl))
-                res = generate_excel_spreadsheet(ctrl, self.dbh[ctrl], 
-                  self.tinfo[ctrl].fields, REFS[ctrl]['SPREADSHEET'])
-                counts = []
-                for vartype, nums in sorted(res.items()):
-                    counts.append("{} {}s".format(nums['num_variants'], vartype))
-                numruns = res['mutation']['num_runs'] if res.get('mutation') else 0
-                msg = "      {} ({} runs)".format(ctrl, numruns)
-                if counts:
-                    msg += ': '+', '.join(counts)
-                self.text.AppendText(msg+'\n')
-#                if res['failedsamples']:
-#                    self.text.AppendText(
-#                         "      Failed samples not included: {}\n".format(
-#                         ", ".join(sorted(res['failedsamples']))))
-        except Exception, e:
-            self.text.AppendText("    ERROR: {}{}\n\n".format(
-                                       type(e).__name__, e))
-            raise
-        self.text.AppendText("\n")
-
-    def OnCloseMe(self, event):
-        self.Close(True)
-
-    def OnCloseWindow(self, event):
-        self.Destroy()
-        
-class VariantReportDrop(wx.FileDropTarget):
-    def __init__(self, window, notebook, tinfo):
-        wx.FileDropTarget.__init__(self)
-        self.window = window
-        self.notebook = notebook
-        self.tinfo = tinfo
-        self.num_samples = 0
-
-    def OnDropFiles(self, x, y, filenames):
-        oldfiles = self.notebook.ReportFiles()
-        oldsamples2files, oldbadfiles = group_files_by_sample(oldfiles)
-        samples2files, badfiles = group_files_by_sample(filenames)
-        if badfiles:
-            for badfile in badfiles:
-               self.window.AppendText("ERROR: "+badfile+'\n')
-               self.window.AppendText("    Bad input.  This does not look" +\
-                   " like a TruQ3 or HD753 variant or fusion report.\n")
-        # check if sample data needs updating with new files or
-        # skip if sample is only previously dropped files
-        for sample, d in sorted(samples2files.items()):
-            if sample in oldsamples2files:
-                updatesample = False
-                old_d = oldsamples2files[sample]
-                for reporttype in ('v_report', 'f_report', 'c_report'):
-                    if reporttype in d:
-                        if reporttype in old_d and \
-                           old_d[reporttype]==d[reporttype]:
-                            continue
-                        else:
-                            updatesample=True
-                    elif reporttype in old_d:
-                        d[reporttype] = old_d[reporttype]
-                        updatesample = True
-                if updatesample:
-                    self.notebook.DeletePageSample(sample)
-                else: # no need to update
-                    continue
-            run = d['run']
-            ctrl = d['control']
-            self.num_samples += 1
-            if not ctrl in self.tinfo:
-                sys.exit("No truth data for {} in db\n".format(ctrl))
-            try:
-                vinfo = VariantSet(sample, run, ctrl, self.tinfo[ctrl])
-                info = {'num': self.num_samples, 'vinfo': vinfo,
-                        'control': ctrl, 'run': run, 'sample': sample }
-                if 'v_report' in d:
-                    info['file'] = d['v_report']
-                    vinfo.add_variants(d['v_report'], 'mutation')
-                    self.window.AppendText("Mutation file {}:    {}\n".format(
-                        self.num_samples, info['file']))
-                if 'f_report' in d:
-                    info['fusion_file'] = d['f_report']
-                    vinfo.add_variants(d['f_report'], 'fusion')
-                    self.window.AppendText("Fusion file {}:    {}\n".format(
-                        self.num_samples, info['fusion_file']))
-                if 'c_report' in d:
-                    info['cnv_file'] = d['c_report']
-                    vinfo.add_variants(d['c_report'], 'cnv')
-                    self.window.AppendText("CNV file {}:    {}\n".format(
-                        self.num_samples, info['cnv_file']))
-                summary = vinfo.compare_variants()
-                info.update({'summary': summary, 
-                             'status': summary['Status'],})
-                title = "{}: {}".format(self.num_samples, sample)
-                self.notebook.AddResultsTab(info, title=title)
-#            except KeyError, e:
-#                self.window.AppendText("    ERROR:  Bad file format.  " +\
-#                    "This does not look like a variant or fusion report.\n")
-            except Exception, e:
-                self.window.AppendText("    ERROR: {} {}\n\n".format(
-                                       type(e).__name__, e))
-                raise
-
-class StampNotebook(fnb.FlatNotebook):
-    def __init__(self, parent, tinfo, controls, msg=None):
-        fnb.FlatNotebook.__init__(self, parent, id=wx.ID_ANY, size=(500, 300),
-            agwStyle=fnb.FNB_VC8|fnb.FNB_X_ON_TAB|fnb.FNB_NO_X_BUTTON|
-            fnb.FNB_NAV_BUTTONS_WHEN_NEEDED)
-
-        self.tabOne = TabPanel_Text(self, msg=msg)
-        self.AddPage(self.tabOne, "DB content")
-        self.results = ['',]
-        self.entries = ['',]
-        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_CLOSING, self.OnTabClosing)
-        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_DROPPED, self.OnTabDrop)
-        self.tinfo = tinfo
-        self.controls = controls
-
-    def AddResultsTab(self, info, title=None):
-        if not title:
-            num = info['num'] if 'num' in info else ''
-            title = "Sample {} ({})".format(num, info['control'])
-        newTab = TabPanel_Results(self, info)
-        self.AddPage(newTab, title)
-        numpages = self.GetPageCount()
-        self.SetSelection(numpages-1)
-        self.results.append(info)
-
-    def OnTabClosing(self, event):
-        selected = self.GetSelection()
-        res = self.results.pop(selected)
-        ent = self.entries.pop(selected)
-        txt = self.GetPageText(selected)
-
-    def OnTabDrop(self, event):
-        selected = self.GetSelection()
-        oldselected = event.GetOldSelection()
-        res = self.results.pop(oldselected)
-        ent = self.entries.pop(oldselected)
-        self.results.insert(selected, res)
-        self.entries.insert(selected, ent)
-
-    def ReportFiles(self):
-        """Return list of variant and fusion report files in notebook"""
-        reports = []
-        for info in self.results:
-            if not info: continue
-            if 'file' in info:
-                reports.append(info['file'])
-            if 'fusion_file' in info:
-                reports.append(info['fusion_file'])
-            if 'cnv_file' in info:
-                reports.append(info['cnv_file'])
-        return reports
-
-    def DeletePageSample(self, sample):
-        """Delete pages where sample is given sample"""
-        numpages = 0
-        for i, info in enumerate(self.results):
-            if not info: continue
-            if 'sample' in info and info['sample']==sample:
-                self.SetSelection(i)
-                self.DeletePage(i)
-                self.SendSizeEvent()
-                numpages += 1
-        return numpages
-
-class TabPanel_Text(wx.Panel):
-    def __init__(self, parent, msg="\n\n\n\n"):
-        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
-        self.textWidget = wx.StaticText(self, -1, '\n'+msg, pos=(15,10))
-#        font = wx.Font(8, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL,
-#                       wx.FONTWEIGHT_NORMAL)
-#        self.textWidget.SetFont(font)
-
-    def ChangeMessage(self, msg):
-        self.textWidget.Destroy()
-        self.textWidget = wx.StaticText(self, -1, '\n'+msg)
-
-class TabPanel_Results(wx.Panel):
-    def __init__(self, parent, info):
-        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
-
-        runLabel = wx.StaticText(self, -1, "Run:")
-        runEntry = wx.TextCtrl(self, -1, info['run'])
-        sampleLabel = wx.StaticText(self, -1, "Sample:")
-        sampleEntry = wx.TextCtrl(self, -1, info['sample'])
-        statusLabel = wx.StaticText(self, -1, "Status:")
-        statusEntry = wx.Choice(self, -1, choices=['PASS', 'FAIL'])
-        statusEntry.SetSelection(0 if info['status']=='PASS' else 1)
-        parent.entries.append({'run': runEntry, 'sample': sampleEntry,
-                               'status': statusEntry})
-        tag = parent.tinfo[info['control']].ctrl_version_tag
-        infostr1 = "Control:  {}{}\n".format(info['control'], tag) 
-        infostr2 = ''
-        num_missing = 0
-        for vartype in info['vinfo'].truthset.variant_types:
-            if not vartype in info['summary']:
-                continue
-            summary = info['summary'][vartype]
-            msg = 'All expected {}s found.'.format(vartype)
-            if len(summary['notseen'])>0:
-                num_missing += len(summary['notseen'])
-                infostr2 += "Expected {} not found:{:5d}\n".format(vartype,
-                      len(summary['notseen']))
-            else:
-                infostr2 += "All expected {}s found\n".format(vartype)
-            infostr2 += '\n\n'
-            varname = FORMAT_VARTYPE['format'][vartype]
-            infostr1 += "Total {}s:{:9d}\n".format(varname, summary['Total'])\
-            +"    Expected {}s:{:8d}\n".format(varname, summary['Expected'])+\
-            "    Other {}s:{:4d}\n".format(varname, summary['Other'])
-#        info2summ = "Missing {} expected variants\n".format(num_missing) \
-#               if num_missing else 'All expected variants found.\n'
-        infoText1 = wx.StaticText(self, -1, infostr1)
-        infoText2 = wx.StaticText(self, -1, '\n\n'+infostr2)
-
-        panelSizer = wx.BoxSizer(wx.VERTICAL)
-        infoSizer = wx.BoxSizer(wx.HORIZONTAL)
-        infoSizer.Add(infoText1, 1, wx.ALL, 8)
-        infoSizer.Add(infoText2, 1, wx.EXPAND|wx.ALL, 8)
-        entrySizer = wx.FlexGridSizer(cols=2, hgap=5, vgap=5)
-        entrySizer.AddGrowableCol(1)
-        entrySizer.Add(runLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(runEntry, 0, wx.EXPAND)
-        entrySizer.Add(sampleLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(sampleEntry, 0, wx.EXPAND)
-        entrySizer.Add(statusLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(statusEntry, 0)
-        panelSizer.Add(entrySizer, 0, wx.EXPAND|wx.ALL, 10)
-        panelSizer.Add(infoSizer, 0, wx.ALIGN_LEFT)
-        self.SetSizer(panelSizer)
-
-def run_gui(dbhs, tinfos, msgs, controls):
-    if not controls:
-        sys.stderr.write("\nERROR: no control data found\n")
-        time.sleep(5) 
-        sys.exit()
-    msg = '\n'.join(msgs)
-    app = StampQC_App(dbhs, tinfos, controls, msg=msg)
-    app.MainLoop()
+                    sys.stdout.write("  {}: {}\n".format(sample, 
+                        pon_check_message(pon, tiles, values[:,col], 
+                                          cutoffs)))
+            if status!='FAIL':
+                pon.add_runs([ (sample, tiles, values[:,col]) for \
+                               sample, (tiles, chroms, values) in tiledata ])
+            pon.save(ponfile)
+    except IOError, e:
+        sys.exit("\nERROR: {}\n".format(e))
+    genes, meanz = pon.run_gene_mean_z()
+    sys.stdout.write("  {} tiles, {} samples in panel\n".format(
+                     len(pon.tiles), len(pon.runs)))
+    if numpy.any(~numpy.isnan(meanz)):
+        pct = numpy.nanpercentile(meanz, PON_PERCENTILES)
+        sys.stdout.write("  Panel gene mean-z percentiles: {}\n".format(
+                         ', '.join([ "{}%: {:.2f}".format(p, v) for p, v \
+                                     in zip(PON_PERCENTILES, pct) ])))
+        with numpy.errstate(invalid='ignore'):
+            sys.stdout.write("  Panel gene mean-z beyond cutoffs: " +\
+                "{} >= {}, {} <= {} of {}\n".format(
+                numpy.sum(meanz >= cutoffs[1]), cutoffs[1],
+                numpy.sum(meanz <= cutoffs[2]), cutoffs[2],
+                numpy.sum(~numpy.isnan(meanz))))
+    sys.stdout.flush()
 
 #-----------------------------------------------------------------------------
 
 if __name__=='__main__':
+    multiprocessing.freeze_support()
     descr = "Checks STAMP TruQ3 and HD753 variant and fusion report(s) "
     descr += " for expected variants."
     descr += " Creates new annotated variant report(s) in the same"
@@ -1715,6 +1759,15 @@ if __name__=='__main__':
                         help="Print checked variant reports.")
     parser.add_argument("-x", "--excel", default=False, action='store_true',
                         help="Print Excel spreadsheet summarizing all data.")
+    parser.add_argument("--tiles", default=False, action='store_true',
+                        help="Print Excel spreadsheet of CNV tile z-score "+\
+                             "baselines and drift for the .tiles.cnvs "+\
+                             "files input.")
+    parser.add_argument("--pon", default=False, action='store_true',
+                        help="Add the .tiles.cnvs files input to the "+\
+                             "panel of normals CNV baseline and check "+\
+                             "their gene mean-z against it.  Samples "+\
+                             "are left out if status is FAIL.")
     parser.add_argument("-d", "--debug", default=False, action='store_true',
                         help="Print extra messages")
     parser.add_argument("--datadir", default=DEFAULT_DATA_DIR,
@@ -1725,9 +1778,19 @@ if __name__=='__main__':
     parser.add_argument("--safe", default=True, action='store_false',
                         dest="force",
                         help="Do not overwrite existing data in db.")
-
+    parser.add_argument("-j", "--jobs", type=int, 
+                        default=multiprocessing.cpu_count(),
+                        help="Number of processes used to parse reports "+\
+                             "(default: number of CPUs)")
+    parser.add_argument("--journal-mode", default=DB_JOURNAL_MODE,
+                        help="SQLite journal mode for the dbs.  WAL is "+\
+                             "only safe for dbs on a local disk, not on a "+\
+                             "network drive shared between computers "+\
+                             "(default: {})".format(DB_JOURNAL_MODE))
+
+    starttime = time.time()
     args = parser.parse_args()
-    dbh = {}
+    pool = {}
     tinfo = {}
     msgs = []
     # Use STAMP V2 data if V2 in name of script
@@ -1736,48 +1799,53 @@ if __name__=='__main__':
     check_references(args.docsdir, args.datadir, ctrl_version)
     controls = check_existing_dbs(args.datadir, ctrl_version)
     for ctrl in controls:
-        dbh[ctrl] = check_db(ctrl)
-        tinfo[ctrl] = TruthSet(ctrl, dbh[ctrl], ctrl_version)
-        summary = tinfo[ctrl].db_summary()
+        pool[ctrl] = check_db(ctrl, args.journal_mode)
+        tinfo[ctrl], summary = load_truthset(ctrl, pool[ctrl], ctrl_version,
+                                             REFS[ctrl].get('STARTUPCACHE'))
         msgs.append(''.join(summary))
     sys.stdout.write('\n'.join(msgs))
+    if args.debug:
+        sys.stdout.write("Startup took {:.3f} secs\n".format(
+                         time.time()-starttime))
     if len(args.reports)==0:
-        run_gui(dbh, tinfo, msgs, controls)
+        # wx is only needed for the GUI so keep it out of command line runs
+        from stamp_qcV2_gui import run_gui
+        spreadsheets = dict([ (ctrl, REFS[ctrl]['SPREADSHEET']) 
+                              for ctrl in controls ])
+        run_gui(pool, tinfo, msgs, controls, spreadsheets)
     else:
         if not controls:
             sys.exit("\nERROR: no control data found\n")
-        samples = {}
-        samples2files, badfiles = group_files_by_sample(args.reports)
-        outfile = {}
-        for sample, d in sorted(samples2files.items()):
-            run = d['run']
+        samples2files, badfiles = group_files_by_sample(args.reports, 
+                                                        args.jobs)
+        # checked reports print every column, otherwise only read the
+        # columns saved to the db
+        for sample, d, vinfo, outfile in compare_samples(samples2files, 
+                tinfo, args.status, args.jobs, not args.text):
             ctrl = d['control']
-            sys.stdout.write("\nSample: {}\tRun: {}\tControl: {}\n".format(
-                             sample, run, ctrl))
-            vinfo = VariantSet(sample, run, ctrl, tinfo[ctrl])
-            if 'v_report' in d:
-                outfile['mutation'] = d['v_report'].replace('.txt','')+\
-                                      ".checked.txt"
-                vinfo.add_variants(d['v_report'], 'mutation')
-            if 'f_report' in d:
-                outfile['fusion'] = d['f_report'].replace('.txt','')+\
-                                      ".checked.txt"
-                vinfo.add_variants(d['f_report'], 'fusion')
-            if 'c_report' in d:
-                outfile['cnv'] = d['c_report'].replace('.txt','')+\
-                                      ".checked.txt"
-                vinfo.add_variants(d['c_report'], 'cnv')
-            summary = vinfo.compare_variants(args.status)
-            vinfo.save2db(summary['Status'], args.force)
+            vinfo.save2db(vinfo.summary['Status'], args.force)
             if args.text:
                 if args.outdir:
                     for vartype in outfile:
                         outfile[vartype] = os.path.join(args.outdir, 
                                            os.path.basename(outfile[vartype]))
                 print_checked_file(vinfo, tinfo[ctrl], outfile)
+        if args.tiles or args.pon:
+            tilefiles = group_tile_files(args.reports, args.jobs)
+            for ctrl in controls:
+                if not tilefiles.get(ctrl):
+                    continue
+                if args.pon:
+                    update_panel_of_normals(ctrl, tilefiles[ctrl],
+                                            REFS[ctrl]['PANELOFNORMALS'],
+                                            args.status)
+                if args.tiles:
+                    write_tile_spreadsheet(ctrl, tilefiles[ctrl],
+                                           REFS[ctrl]['TILESPREADSHEET'],
+                                           REFS[ctrl]['TILECACHE'])
         for ctrl in controls:
-            generate_excel_spreadsheet(ctrl, dbh[ctrl], tinfo[ctrl].fields, 
+            generate_excel_spreadsheet(ctrl, pool[ctrl], tinfo[ctrl].fields, 
                                        REFS[ctrl]['SPREADSHEET'])
-            dbh[ctrl].close()
+            pool[ctrl].close()
 
 
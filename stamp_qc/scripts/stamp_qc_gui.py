@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+
+"""
+wxPython interface for stamp_qc.py.  Only imported when stamp_qc.py
+is started without any reports.
+"""
+
+import sys
+import time
+import wx
+import wx.lib.agw.flatnotebook as fnb
+
+from stamp_qc import VERSION, VariantSet, generate_excel_spreadsheet, \
+     get_ctrl_version, group_files_by_sample, print_checked_file
+
+#----gui.py-------------------------------------------------------------------
+
+class StampQC_App(wx.App):
+    def __init__(self, dbhs, tinfos, controls, spreadsheets, msg=None,
+                 **kwargs):
+        self.dbh = dbhs
+        self.tinfo = tinfos
+        self.controls = controls
+        self.spreadsheets = spreadsheets
+        self.msg = msg
+        wx.App.__init__(self, kwargs)
+
+    def OnInit(self):
+        self.frame = StampFrame(self.dbh, self.tinfo, self.controls, 
+                                self.spreadsheets, msg=self.msg)
+        self.frame.Show()
+        self.SetTopWindow(self.frame)
+        return True
+
+class StampFrame(wx.Frame):
+    def __init__(self, dbh, tinfo, controls, spreadsheets, msg=None):
+        wx.Frame.__init__(self, None, title="STAMP QC v{}".format(VERSION), 
+                          size=(550,525))
+        self.dbh = dbh
+        self.tinfo = tinfo
+        self.controls = controls
+        self.spreadsheets = spreadsheets
+        ctrl_version = get_ctrl_version()
+        self.ctrl_version = ' (STAMP {})'.format(ctrl_version) if \
+                            ctrl_version else ''
+
+        panel = wx.Panel(self)
+        label = wx.StaticText(panel, -1, 
+            "Drop TruQ3 or HD753 variant or fusion reports here:")
+        self.text = wx.TextCtrl(panel,-1, "",style=wx.TE_READONLY|
+                                wx.TE_MULTILINE|wx.HSCROLL)
+        button_print = wx.Button(panel, -1, "Print reports")
+        print_tooltip = "Creates new variant reports with variants "+\
+            "labelled expected, not expected or not found. New reports "+\
+            "are named <Sample>.variant_report.checked.txt and saved "+\
+            "in same folder as original report."
+        button_print.SetToolTip(wx.ToolTip(print_tooltip))
+        self.Bind(wx.EVT_BUTTON, self.PrintReports, button_print)
+        button_save = wx.Button(panel, -1, "Update spreadsheets and DB")
+        save_tooltip = "Update spreadsheet and database with data entered.\n"
+        button_save.SetToolTip(wx.ToolTip(save_tooltip))
+        self.Bind(wx.EVT_BUTTON, self.UpdateSpreadsheetAndDB, button_save)
+        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
+        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
+        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
+        self.notebook = StampNotebook(panel, tinfo, controls, msg=msg)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(label, 0, wx.ALL, 5)
+        sizer.Add(self.text, 1, wx.EXPAND|wx.ALL, 5)
+        sizer.Add(self.notebook, 0, wx.EXPAND|wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(button_print, 0, wx.ALIGN_CENTER_VERTICAL)
+        button_sizer.Add(button_save, 0, wx.ALIGN_CENTER_VERTICAL)
+        button_sizer.AddStretchSpacer()
+        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
+        panel.SetSizer(sizer)
+
+        dt = VariantReportDrop(self.text, self.notebook, tinfo)
+        self.text.SetDropTarget(dt)
+
+    def PrintReports(self, event):
+        self.text.AppendText("\nPrinting reports:\n")
+        if not self.notebook.results:
+            self.text.AppendText("  No reports to process.\n\n")
+            return
+        for i, info in enumerate(self.notebook.results):
+            if not info: continue
+            entries = self.notebook.entries[i]
+            sample = entries['sample'].GetValue()
+            outfile = {}
+            if 'file' in info:
+                outfile['mutation'] = info['file'].replace('.txt','') +\
+                                      ".checked.txt"
+            if 'fusion_file' in info:
+                outfile['fusion'] = info['fusion_file'].replace('.txt','') +\
+                                    ".checked.txt"
+            for vartype in outfile:
+                if not sample==info['sample']:
+                    outfile[vartype] = outfile[vartype].replace(
+                                           info['sample'], sample)
+                self.text.AppendText("  "+outfile[vartype]+"\n")
+            print_checked_file(info['vinfo'], self.tinfo[info['control']], 
+                               outfile)
+        self.text.AppendText("\n")
+
+    def UpdateSpreadsheetAndDB(self, event):
+        self.text.AppendText("\nUpdating data:\n")
+        if not self.notebook.results:
+            self.text.AppendText("  No data to save to db.\n")
+        else:
+            for i, info in enumerate(self.notebook.results):
+                if not info: continue
+                entries = self.notebook.entries[i]
+                sample = info['vinfo'].sample = entries['sample'].GetValue()
+                run = info['vinfo'].run = entries['run'].GetValue()
+                if not run or not sample:
+                    msg = "    {}: Not saved.".format(i)
+                    if not run and not sample:
+                        msg += "  Need run and sample\n"
+                    elif not run:
+                        msg += "  Need run name\n"
+                    else:
+                        msg += "  Need sample name\n"
+                    self.text.AppendText(msg)
+                    continue
+                statusnum = entries['status'].GetSelection()
+                status = entries['status'].GetString(statusnum)
+                saved = info['vinfo'].save2db(status, force=True)
+                if saved:
+                    self.text.AppendText(
+                        "        Saved {} data to db.\n".format(sample))
+                else:
+                    self.text.AppendText(
+                        "        {} not saved to db.\n".format(sample))
+            summ = []
+            for ctrl in self.controls:
+#                summ.append(ctrl+self.ctrl_version+'\n')
+                summ.extend(self.tinfo[ctrl].db_summary())
+                summ.append('\n')
+            self.notebook.tabOne.ChangeMessage(''.join(summ))
+        try:
+            for ctrl in self.controls:
+                self.text.AppendText("  Updating {} spreadsheet.\n".format(
+                                     ctrl))
+                res = generate_excel_spreadsheet(ctrl, self.dbh[ctrl], 
+                  self.tinfo[ctrl].fields, self.spreadsheets[ctrl])
+                self.text.AppendText(
+                    "      {} spreadsheet now contains ".format(ctrl)+\
+                    "{} runs and {} unique variants\n".format(res['num_runs'],
+                    res['num_variants']))
+#                if res['failedsamples']:
+#                    self.text.AppendText(
+#                         "      Failed samples not included: {}\n".format(
+#                         ", ".join(sorted(res['failedsamples']))))
+        except Exception, e:
+            self.text.AppendText("    ERROR: {}{}\n\n".format(
+                                       type(e).__name__, e))
+            raise
+        self.text.AppendText("\n")
+
+    def OnCloseMe(self, event):
+        self.Close(True)
+
+    def OnCloseWindow(self, event):
+        self.Destroy()
+        
+class VariantReportDrop(wx.FileDropTarget):
+    def __init__(self, window, notebook, tinfo):
+        wx.FileDropTarget.__init__(self)
+        self.window = window
+        self.notebook = notebook
+        self.tinfo = tinfo
+        self.num_samples = 0
+
+    def OnDropFiles(self, x, y, filenames):
+        oldfiles = self.notebook.ReportFiles()
+        oldsamples2files, oldbadfiles = group_files_by_sample(oldfiles)
+        samples2files, badfiles = group_files_by_sample(filenames)
+        if badfiles:
+            for badfile in badfiles:
+               self.window.AppendText("ERROR: "+badfile+'\n')
+               self.window.AppendText("    Bad input.  This does not look" +\
+                   " like a TruQ3 or HD753 variant or fusion report.\n")
+        # check if sample data needs updating with new files or
+        # skip if sample is only previously dropped files
+        for sample, d in sorted(samples2files.items()):
+            if sample in oldsamples2files:
+                updatesample = False
+                old_d = oldsamples2files[sample]
+                for reporttype in ('v_report', 'f_report'):
+                    if reporttype in d:
+                        if reporttype in old_d and \
+                           old_d[reporttype]==d[reporttype]:
+                            continue
+                        else:
+                            updatesample=True
+                    elif reporttype in old_d:
+                        d[reporttype] = old_d[reporttype]
+                        updatesample = True
+                if updatesample:
+                    self.notebook.DeletePageSample(sample)
+                else: # no need to update
+                    continue
+            run = d['run']
+            ctrl = d['control']
+            self.num_samples += 1
+            if not ctrl in self.tinfo:
+                sys.exit("No truth data for {} in db\n".format(ctrl))
+            try:
+                vinfo = VariantSet(sample, run, ctrl, self.tinfo[ctrl])
+                info = {'num': self.num_samples, 'vinfo': vinfo,
+                        'control': ctrl, 'run': run, 'sample': sample }
+                if 'v_report' in d:
+                    info['file'] = d['v_report']
+                    vinfo.add_variants(d['v_report'], 'mutation')
+                    self.window.AppendText("Mutation file {}:    {}\n".format(
+                        self.num_samples, info['file']))
+                if 'f_report' in d:
+                    info['fusion_file'] = d['f_report']
+                    vinfo.add_variants(d['f_report'], 'fusion')
+                    self.window.AppendText("Fusion file {}:    {}\n".format(
+                        self.num_samples, info['fusion_file']))
+                summary = vinfo.compare_variants()
+                info.update({'summary': summary, 
+                             'status': summary['Status'],})
+                title = "{}: {}".format(self.num_samples, sample)
+                self.notebook.AddResultsTab(info, title=title)
+#            except KeyError, e:
+#                self.window.AppendText("    ERROR:  Bad file format.  " +\
+#                    "This does not look like a variant or fusion report.\n")
+            except Exception, e:
+                self.window.AppendText("    ERROR: {} {}\n\n".format(
+                                       type(e).__name__, e))
+                raise
+
+class StampNotebook(fnb.FlatNotebook):
+    def __init__(self, parent, tinfo, controls, msg=None):
+        fnb.FlatNotebook.__init__(self, parent, id=wx.ID_ANY, size=(500, 270),
+            agwStyle=fnb.FNB_VC8|fnb.FNB_X_ON_TAB|fnb.FNB_NO_X_BUTTON|
+            fnb.FNB_NAV_BUTTONS_WHEN_NEEDED)
+
+        self.tabOne = TabPanel_Text(self, msg=msg)
+        self.AddPage(self.tabOne, "DB content")
+        self.results = ['',]
+        self.entries = ['',]
+        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_CLOSING, self.OnTabClosing)
+        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_DROPPED, self.OnTabDrop)
+        self.tinfo = tinfo
+        self.controls = controls
+
+    def AddResultsTab(self, info, title=None):
+        if not title:
+            num = info['num'] if 'num' in info else ''
+            title = "Sample {} ({})".format(num, info['control'])
+        newTab = TabPanel_Results(self, info)
+        self.AddPage(newTab, title)
+        numpages = self.GetPageCount()
+        self.SetSelection(numpages-1)
+        self.results.append(info)
+
+    def OnTabClosing(self, event):
+        selected = self.GetSelection()
+        res = self.results.pop(selected)
+        ent = self.entries.pop(selected)
+        txt = self.GetPageText(selected)
+        sys.stderr.flush()
+
+    def OnTabDrop(self, event):
+        selected = self.GetSelection()
+        oldselected = event.GetOldSelection()
+        res = self.results.pop(oldselected)
+        ent = self.entries.pop(oldselected)
+        self.results.insert(selected, res)
+        self.entries.insert(selected, ent)
+
+    def ReportFiles(self):
+        """Return list of variant and fusion report files in notebook"""
+        reports = []
+        for info in self.results:
+            if not info: continue
+            if 'file' in info:
+                reports.append(info['file'])
+            if 'fusion_file' in info:
+                reports.append(info['fusion_file'])
+        return reports
+
+    def DeletePageSample(self, sample):
+        """Delete pages where sample is given sample"""
+        numpages = 0
+        for i, info in enumerate(self.results):
+            if not info: continue
+            if 'sample' in info and info['sample']==sample:
+                self.SetSelection(i)
+                self.DeletePage(i)
+                self.SendSizeEvent()
+                numpages += 1
+        return numpages
+
+class TabPanel_Text(wx.Panel):
+    def __init__(self, parent, msg="\n\n\n\n"):
+        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
+        self.textWidget = wx.StaticText(self, -1, '\n'+msg, pos=(15,10))
+#        font = wx.Font(8, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL,
+#                       wx.FONTWEIGHT_NORMAL)
+#        self.textWidget.SetFont(font)
+
+    def ChangeMessage(self, msg):
+        self.textWidget.Destroy()
+        self.textWidget = wx.StaticText(self, -1, '\n'+msg)
+
+class TabPanel_Results(wx.Panel):
+    def __init__(self, parent, info):
+        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
+
+        runLabel = wx.StaticText(self, -1, "Run:")
+        runEntry = wx.TextCtrl(self, -1, info['run'])
+        sampleLabel = wx.StaticText(self, -1, "Sample:")
+        sampleEntry = wx.TextCtrl(self, -1, info['sample'])
+        statusLabel = wx.StaticText(self, -1, "Status:")
+        statusEntry = wx.Choice(self, -1, choices=['PASS', 'FAIL'])
+        statusEntry.SetSelection(0 if info['status']=='PASS' else 1)
+        parent.entries.append({'run': runEntry, 'sample': sampleEntry,
+                               'status': statusEntry})
+        tag = parent.tinfo[info['control']].ctrl_version_tag
+        infostr1 = "Control:  {}{}\n".format(info['control'], tag) 
+        infostr2 = ''
+        num_missing = 0
+        for vartype in info['vinfo'].truthset.variant_types:
+            if not vartype in info['summary']:
+                continue
+            summary = info['summary'][vartype]
+            msg = 'All expected {}s found.'.format(vartype)
+            if len(summary['notseen'])>0:
+                num_missing += len(summary['notseen'])
+                infostr2 += "Expected {} not found:{:5d}\n".format(vartype,
+                      len(summary['notseen']))
+            else:
+                infostr2 += "All expected {}s found\n".format(vartype)
+            infostr2 += '\n\n'
+            infostr1 += "Total {}s:{:9d}\n".format(vartype, summary['Total'])\
+            +"    Expected {}:{:8d}\n".format(vartype, summary['Expected'])+\
+            "    Unexpected {}:{:4d}\n".format(vartype, summary['Unexpected'])
+#        info2summ = "Missing {} expected variants\n".format(num_missing) \
+#               if num_missing else 'All expected variants found.\n'
+        infoText1 = wx.StaticText(self, -1, infostr1)
+        infoText2 = wx.StaticText(self, -1, '\n\n'+infostr2)
+
+        panelSizer = wx.BoxSizer(wx.VERTICAL)
+        infoSizer = wx.BoxSizer(wx.HORIZONTAL)
+        infoSizer.Add(infoText1, 1, wx.ALL, 8)
+        infoSizer.Add(infoText2, 1, wx.EXPAND|wx.ALL, 8)
+        entrySizer = wx.FlexGridSizer(cols=2, hgap=5, vgap=5)
+        entrySizer.AddGrowableCol(1)
+        entrySizer.Add(runLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        entrySizer.Add(runEntry, 0, wx.EXPAND)
+        entrySizer.Add(sampleLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        entrySizer.Add(sampleEntry, 0, wx.EXPAND)
+        entrySizer.Add(statusLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        entrySizer.Add(statusEntry, 0)
+        panelSizer.Add(entrySizer, 0, wx.EXPAND|wx.ALL, 10)
+        panelSizer.Add(infoSizer, 0, wx.ALIGN_LEFT)
+        self.SetSizer(panelSizer)
+
+def run_gui(dbhs, tinfos, msgs, controls, spreadsheets):
+    if not controls:
+        sys.stderr.write("\nERROR: no control data found\n")
+        time.sleep(5) 
+        sys.exit()
+    msg = '\n'.join(msgs)
+    app = StampQC_App(dbhs, tinfos, controls, spreadsheets, msg=msg)
+    app.MainLoop()
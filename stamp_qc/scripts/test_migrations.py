@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+"""
+Test of the stamp_qcV2.py db migrations and of migrate_db in
+stamp_common.dbops.
+
+Makes a STAMP V2 HD753 db in a temp folder by running stamp_qcV2.py on
+the stamp_v2_HD753 testfiles folder, then checks copies of it:
+
+  new db        -- at the latest version, no variant_detection table
+  version 1, 2  -- a db last opened when version 2 added the
+                   variant_detection table is migrated to the latest
+                   version and the table is dropped
+  backfill      -- a test migration whose backfill runs in batches of
+                   BATCH variants, one write transaction each, fills
+                   every row.  If it fails partway the batches done are
+                   kept but the version is not recorded, so the next
+                   startup reruns the migration and finishes it.
+  rerun         -- migrating a migrated db again does nothing
+
+    python test_migrations.py [-b BATCH]
+
+Prints PASS and exits 0 if all checks pass.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from argparse import ArgumentParser
+
+from stamp_qcV2 import MIGRATIONS, getScriptPath
+from stamp_common.dbops import connect_db, get_schema_version, get_tables, \
+     migrate_db, write_transaction
+
+TEST_FOLDER = os.path.join(getScriptPath(), os.pardir, "testfiles",
+                           "stamp_v2_HD753")
+DBNAME = "stampQC_HD753_stampV2.db"
+LATEST = MIGRATIONS[-1][0]
+
+class BackfillError(Exception):
+    pass
+
+def make_db(datadir):
+    script = os.path.join(getScriptPath(), 'stamp_qcV2.py')
+    cmd = [sys.executable, script, '--datadir', datadir, '-j', '1',
+           TEST_FOLDER]
+    with open(os.devnull, 'w') as fh:
+        if subprocess.call(cmd, stdout=fh):
+            sys.exit("ERROR: could not make the db")
+    return os.path.join(datadir, DBNAME)
+
+def copy_db(dbfile, name, version):
+    """Copy of dbfile as last opened when version was the latest
+    migration.  Version 2 added the variant_detection table."""
+    newfile = os.path.join(os.path.dirname(dbfile), name+'.db')
+    shutil.copy(dbfile, newfile)
+    dbh = connect_db(newfile, logfh=open(os.devnull, 'w'))
+    with write_transaction(dbh) as cursor:
+        cursor.execute("DELETE FROM schema_version WHERE version>?",
+                       [version])
+        if version==2:
+            cursor.execute("CREATE TABLE variant_detection (vartype TEXT, "+\
+                           "variant_id INTEGER, num_samples INTEGER, "+\
+                           "num_failed INTEGER, last_modified TIMESTAMP, "+\
+                           "PRIMARY KEY(vartype, variant_id))")
+    return dbh
+
+def add_mutation_count(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS mutation_count ("+\
+                   "mutation_id INTEGER PRIMARY KEY, num_samples INTEGER)")
+
+def count_mutations(cursor, where, args):
+    cursor.execute("REPLACE INTO mutation_count (mutation_id, num_samples) "+\
+                   "SELECT m.id, COUNT(sm.sample_id) FROM mutation m "+\
+                   "LEFT JOIN sample_mutation sm ON sm.mutation_id=m.id "+\
+                   "WHERE {} GROUP BY m.id".format(where), args)
+
+def batched_backfill(batch, fail_at=None):
+    """Backfill of mutation_count in batches of batch mutation ids, one
+    write transaction each.  Fails before batch number fail_at."""
+    def backfill(dbh):
+        cursor = dbh.cursor()
+        cursor.execute("SELECT MAX(id) FROM mutation")
+        maxid = cursor.fetchone()[0] or 0
+        for num, start in enumerate(range(0, maxid+1, batch)):
+            if num==fail_at:
+                raise BackfillError("batch {}".format(num))
+            with write_transaction(dbh) as cursor:
+                count_mutations(cursor, "m.id>=? AND m.id<?",
+                                [start, start+batch])
+    return backfill
+
+def select_all(dbh, cmd):
+    cursor = dbh.cursor()
+    cursor.execute(cmd)
+    return sorted(cursor.fetchall())
+
+def test_migrations(dbfile, batch, check):
+    devnull = open(os.devnull, 'w')
+    dbh = connect_db(dbfile, logfh=devnull)
+    check("new db at version {}".format(LATEST),
+          get_schema_version(dbh.cursor())==LATEST)
+    check("new db has no variant_detection table",
+          'variant_detection' not in get_tables(dbh.cursor()))
+    for version in (1, 2):
+        old = copy_db(dbfile, 'version{}'.format(version), version)
+        new = migrate_db(old, MIGRATIONS, devnull)
+        check("version {} db migrated to {}".format(version, LATEST),
+              new==LATEST)
+        check("version {} db has no variant_detection table".format(version),
+              'variant_detection' not in get_tables(old.cursor()))
+        old.close()
+
+    # expected counts, in one statement
+    with write_transaction(dbh) as cursor:
+        add_mutation_count(cursor)
+        count_mutations(cursor, "1", [])
+    expected = select_all(dbh, "SELECT * FROM mutation_count")
+    with write_transaction(dbh) as cursor:
+        cursor.execute("DROP TABLE mutation_count")
+    numbatches = (max([ m for m, n in expected ]) + batch) // batch
+    check("backfill has more than one batch", numbatches > 1)
+
+    num = LATEST+1
+    failing = MIGRATIONS + [(num, "Add mutation_count", add_mutation_count,
+                             batched_backfill(batch, numbatches//2))]
+    try:
+        migrate_db(dbh, failing, devnull)
+        check("failing backfill raises", False)
+    except BackfillError:
+        pass
+    done = select_all(dbh, "SELECT * FROM mutation_count")
+    check("failed backfill keeps the batches done",
+          0 < len(done) < len(expected) and \
+          done==[ c for c in expected if c[0] < (numbatches//2)*batch ])
+    check("failed backfill leaves version {}".format(LATEST),
+          get_schema_version(dbh.cursor())==LATEST)
+
+    migrations = MIGRATIONS + [(num, "Add mutation_count",
+                                add_mutation_count, batched_backfill(batch))]
+    check("rerun migrates to version {}".format(num),
+          migrate_db(dbh, migrations, devnull)==num)
+    check("backfill counts match",
+          select_all(dbh, "SELECT * FROM mutation_count")==expected)
+
+    # a migrated db is left alone
+    failing = MIGRATIONS + [(num, "Add mutation_count", add_mutation_count,
+                             batched_backfill(batch, 0))]
+    check("migrating again does nothing",
+          migrate_db(dbh, failing, devnull)==num)
+    dbh.close()
+
+if __name__=='__main__':
+    parser = ArgumentParser(description="Test the stamp_qcV2.py db "+\
+                            "migrations and batched migration backfills.")
+    parser.add_argument("-b", "--batch", type=int, default=20,
+                        help="Mutation ids per backfill batch (default: 20)")
+    args = parser.parse_args()
+    failed = []
+    def check(label, ok):
+        sys.stderr.write("{}: {}\n".format('ok' if ok else 'FAILED', label))
+        if not ok:
+            failed.append(label)
+    tmpdir = tempfile.mkdtemp(prefix='test_migrations')
+    try:
+        test_migrations(make_db(tmpdir), args.batch, check)
+    finally:
+        shutil.rmtree(tmpdir)
+    if failed:
+        print "FAIL"
+        sys.exit(1)
+    print "PASS"
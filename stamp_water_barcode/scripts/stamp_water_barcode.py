@@ -6,21 +6,34 @@ Record barcode counts for water control in STAMP runs.
 
 import os
 import sys
-import datetime
 import openpyxl
 import operator
 import re
-import sqlite3
 import time
-import wx
-import wx.lib.agw.flatnotebook as fnb
 import xlsxwriter
 from collections import defaultdict
 from argparse import ArgumentParser
 
+# the shared stamp_common package is at the top of the stamp_scripts tree;
+# found from the script path since py2exe builds have no __file__
+sys.path.insert(1, os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])),
+                                os.pardir, os.pardir))
+from stamp_common.dbops import DB_JOURNAL_MODE, ConnectionPool, add_schema, \
+     current_time, has_tables, migrate_db, results_as_dict, write_transaction
+from stamp_common.fileops import replace_file, temp_outfile
+from stamp_common.spreadsheet import add_formats_to_workbook, \
+     convert_to_excel_col
+
 VERSION="1.1"
 BUILD="160913"
 
+# 261019 - Use the shared stamp_common package for db connections and
+#          spreadsheet formats
+# 261019 - Move GUI to stamp_water_barcode_gui.py so wx is only loaded for it
+# 261019 - Add numbered schema migrations; apply at startup
+# 261019 - Use busy timeout, BEGIN IMMEDIATE and a connection pool for the
+#          db; save each run in its own short write transaction.  WAL
+#          journal is opt-in (--journal-mode) for a db on a local disk
 # 160913 - 
 #  parse STAMP folder name from STAMP runs folder
 #  catch and report errors to gui when creating spreadsheet
@@ -109,29 +122,20 @@ def analyze_barcode_data(bcdata):
 
 #----dbops.py-----------------------------------------------------------------
 
-def connect_db(dbfile):
-    sys.stderr.write("  Connecting to db {}\n".format(dbfile))
-    dbh = sqlite3.connect(dbfile)
-    return dbh
-
-def add_schema(dbh, schemafile):
-    sys.stderr.write("  Reading schema {}\n".format(schemafile))
-    with open(schemafile, 'r') as fh:
-        schema = ' '.join(fh.readlines())
-        dbh.executescript(schema)
-
-def current_time():
-    return datetime.datetime.now()
-
-def results_as_dict(cursor):
-    """Convert each row from db to dict keyed by column name.
-    Returns a list of dicts"""
-    columns = [ d[0] for d in cursor.description ]
-    data = []
-    for ans in cursor.fetchall():
-        d = dict(zip(columns, ans))
-        data.append(d)
-    return data
+#  Schema migrations for stamp_common.dbops.migrate_db.  The schema file 
+#  is version 0.  Migrations must be safe to rerun.
+
+def add_lookup_indexes(cursor):
+    """Indexes for selecting runs by status and counts by barcode"""
+    cursor.execute("CREATE INDEX IF NOT EXISTS run_status_index "
+                   "ON run (run_status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS barcode_counts_barcode_index "
+                   "ON barcode_counts (barcode_id)")
+
+# (version, description, schema change, backfill run after schema change)
+MIGRATIONS = [
+    (1, "Add lookup indexes", add_lookup_indexes, None),
+]
 
 def get_run(cursor, run):
     runs = get_runs(cursor, run)
@@ -222,84 +226,79 @@ def save_barcode_count(cursor, run_name, barcode, count):
     vals.append(current_time())
     cursor.execute(ins_sql, vals)
 
-def check_db(datadir, docsdir):
-    """Look for existing DB or create new DB.  Return handle to DB"""
+def check_db(datadir, docsdir, journal_mode=None):
+    """Look for existing DB or create new DB.  Return ConnectionPool 
+    for DB"""
     dbfile = os.path.join(datadir, REFS['SQLITEDB'])
     schemafile = os.path.join(docsdir, REFS['SCHEMAFILE'])
-    is_new_db = not os.path.exists(dbfile)
-    dbh = connect_db(dbfile)
+    pool = ConnectionPool(dbfile, journal_mode=journal_mode, 
+                          logfh=sys.stderr)
+    dbh = pool.get()
     cursor = dbh.cursor()
     msgs = []
     msgs.append('Water barcode: {}'.format(', '.join(BARCODES.keys())))
+    # Check for tables once holding the write lock, in case another
+    # user is creating the db
+    with write_transaction(dbh):
+        is_new_db = not has_tables(cursor)
+        if is_new_db:
+            sys.stderr.write("Creating new db: {}\n".format(dbfile))
+            add_schema(dbh, schemafile, sys.stderr)
+    migrate_db(dbh, MIGRATIONS, sys.stderr)
     if is_new_db:
-        sys.stderr.write("Creating new db: {}\n".format(dbfile))
-        add_schema(dbh, schemafile)
         msgs.append("    0 runs saved")
     else:
         runs = get_runs(cursor, status='PASS')
         numruns = len(runs)
         msgs.append("    {} runs saved".format(numruns))
     sys.stderr.flush()
-    return (dbh, msgs)
-
-def get_rundata_from_db(dbh, status='PASS'):
-    cursor = dbh.cursor()
-    runs = get_runs(cursor, status=status)
-    rundata = {}
-    for d in runs:
-        d['bc_counts'] = get_barcode_counts_for_run_id(cursor, d['id'])
-        rundata[d['run_name']] = d
+    pool.put(dbh)
+    return (pool, msgs)
+
+def get_rundata_from_db(pool, status='PASS'):
+    with pool.connection() as dbh:
+        cursor = dbh.cursor()
+        runs = get_runs(cursor, status=status)
+        rundata = {}
+        for d in runs:
+            d['bc_counts'] = get_barcode_counts_for_run_id(cursor, d['id'])
+            rundata[d['run_name']] = d
     return rundata
 
-def save_rundata_db(dbh, rundata, status='PASS'):
-    cursor = dbh.cursor()
+def save_rundata_db(pool, rundata, status='PASS'):
+    """Save runs to db, each in its own write transaction"""
     runs = sorted(rundata.keys(), key=stamp_run_sortkey)
     numruns_saved = 0
-    for run_name in runs:
-        totreads = rundata[run_name]['total_reads']
-        save_run(cursor, run_name, status=status, total_reads=totreads)
-        numruns_saved += 1
-        for barcode, d in sorted(rundata[run_name]['bc_counts'].items()):
-            save_barcode_count(cursor, run_name, barcode, d['count'])
-    dbh.commit()
+    with pool.connection() as dbh:
+        for run_name in runs:
+            totreads = rundata[run_name]['total_reads']
+            with write_transaction(dbh) as cursor:
+                save_run(cursor, run_name, status=status, 
+                         total_reads=totreads)
+                bc_counts = rundata[run_name]['bc_counts']
+                for barcode, d in sorted(bc_counts.items()):
+                    save_barcode_count(cursor, run_name, barcode, d['count'])
+            numruns_saved += 1
+    return numruns_saved
 
 #----spreadsheet.py-----------------------------------------------------------
 
-def convert_to_excel_col(colnum):
-    mod = colnum % 26
-    let = chr(mod+65)
-    if colnum >= 26:
-        rep = colnum/26
-        let1 = chr(rep+64)
-        let = let1 + let
-    return let
-
-def add_formats_to_workbook(workbook):
-    wbformat = {}
-    wbformat['bold'] = workbook.add_format({'bold': True})
-    wbformat['perc'] = workbook.add_format({'num_format': '#.####%'})
-    wbformat['red'] = workbook.add_format({'bg_color': '#C58886', 
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltred'] = workbook.add_format({'bg_color': '#E9D4D3', 
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['orange'] = workbook.add_format({'bg_color': '#FCD5B4',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltblue'] = workbook.add_format({'bg_color': '#D7E1EB',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['blue'] = workbook.add_format({'bg_color': '#88A4C5',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltbluepatt'] = workbook.add_format({'fg_color': '#DCE6F0', 
-                                       'pattern': 8,
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltgreen_bold'] = workbook.add_format({'bg_color': '#EBF1DE',
-                                       'bold': True,
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltgreen'] = workbook.add_format({'bg_color': '#EBF1DE',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    wbformat['ltgreen_perc'] = workbook.add_format({'num_format': '#.####%',
-                                       'bg_color': '#EBF1DE',
-                                       'border': 1, 'border_color':'#CDCDCD'})
-    return wbformat
+WB_FORMATS = {
+    'bold': {'bold': True},
+    'perc': {'num_format': '#.####%'},
+    'red': {'bg_color': '#C58886', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltred': {'bg_color': '#E9D4D3', 'border': 1, 'border_color':'#CDCDCD'},
+    'orange': {'bg_color': '#FCD5B4', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltblue': {'bg_color': '#D7E1EB', 'border': 1, 'border_color':'#CDCDCD'},
+    'blue': {'bg_color': '#88A4C5', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltbluepatt': {'fg_color': '#DCE6F0', 'pattern': 8,
+                   'border': 1, 'border_color':'#CDCDCD'},
+    'ltgreen_bold': {'bg_color': '#EBF1DE', 'bold': True,
+                     'border': 1, 'border_color':'#CDCDCD'},
+    'ltgreen': {'bg_color': '#EBF1DE', 'border': 1, 'border_color':'#CDCDCD'},
+    'ltgreen_perc': {'num_format': '#.####%', 'bg_color': '#EBF1DE',
+                     'border': 1, 'border_color':'#CDCDCD'},
+}
 
 def add_barcode_sheet_excel(workbook, wbformat, rundata):
     goodruns = [r for r in rundata.keys() if rundata[r]['run_status']=='PASS']
@@ -367,263 +366,16 @@ def add_barcode_sheet_excel(workbook, wbformat, rundata):
 
 def create_excel_spreadsheet(rundata, outfile):
     sys.stderr.write("\nCreating barcode Excel file:\n{}\n".format(outfile))
-    workbook = xlsxwriter.Workbook(outfile)
-    wbformat = add_formats_to_workbook(workbook)
+    tmpfile = temp_outfile(outfile)
+    workbook = xlsxwriter.Workbook(tmpfile)
+    wbformat = add_formats_to_workbook(workbook, WB_FORMATS)
     nums = add_barcode_sheet_excel(workbook, wbformat, rundata)
     workbook.close()
-    wb = openpyxl.load_workbook(outfile)
-    wb.save(outfile)
+    wb = openpyxl.load_workbook(tmpfile)
+    wb.save(tmpfile)
+    replace_file(tmpfile, outfile)
     return nums
 
-#----gui.py-------------------------------------------------------------------
-
-class StampWaterBarcode_App(wx.App):
-    def __init__(self, dbh, msg=None, spreadsheet=None, **kwargs):
-        self.dbh = dbh
-        self.msg = msg
-        self.spreadsheet = spreadsheet
-        wx.App.__init__(self, kwargs)
-
-    def OnInit(self):
-        self.frame = StampFrame(self.dbh, msg=self.msg,
-                                spreadsheet=self.spreadsheet)
-        self.frame.Show()
-        self.SetTopWindow(self.frame)
-        return True
-
-class StampFrame(wx.Frame):
-    def __init__(self, dbh, msg=None, spreadsheet=None):
-        wx.Frame.__init__(self, None, title="STAMP Water Barcode v{}".format(
-                          VERSION), size=(550,425))
-        self.dbh = dbh
-        self.spreadsheet = spreadsheet
-        panel = wx.Panel(self)
-        label = wx.StaticText(panel, -1, 
-            "Drop barcode_counts.txt file(s) here:")
-        self.text = wx.TextCtrl(panel,-1, "",style=wx.TE_READONLY|
-                                wx.TE_MULTILINE|wx.HSCROLL)
-        button_save = wx.Button(panel, -1, "Update spreadsheet and DB")
-        save_tooltip = "Update spreadsheet and database with data entered.\n"
-        button_save.SetToolTip(wx.ToolTip(save_tooltip))
-        self.Bind(wx.EVT_BUTTON, self.UpdateSpreadsheetAndDB, button_save)
-        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
-        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
-        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
-        self.notebook = StampNotebook(panel, msg=msg)
-
-        sizer = wx.BoxSizer(wx.VERTICAL)
-        sizer.Add(label, 0, wx.ALL, 5)
-        sizer.Add(self.text, 1, wx.EXPAND|wx.ALL, 5)
-        sizer.Add(self.notebook, 0, wx.EXPAND|wx.ALL, 5)
-
-        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
-        button_sizer.Add(button_save, 0, wx.ALIGN_CENTER_VERTICAL)
-        button_sizer.AddStretchSpacer()
-        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
-        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
-        panel.SetSizer(sizer)
-
-        dt = FileDrop(self.text, self.notebook)
-        self.text.SetDropTarget(dt)
-
-    def UpdateSpreadsheetAndDB(self, event):
-        self.text.AppendText("\nUpdating data:\n")
-        if not self.notebook.results:
-            self.text.AppendText("  No data to save to db.\n")
-        else:
-            for i, info in enumerate(self.notebook.results):
-                if not info: continue
-                entries = self.notebook.entries[i]
-                run = entries['run'].GetValue()
-                filenum = info['num']
-                if not run:
-                    msg = "    {}: Not saved.".format(filenum)
-                    msg += "  Need run name\n"
-                    self.text.AppendText(msg)
-                    continue
-                statusnum = entries['run_status'].GetSelection()
-                status = entries['run_status'].GetString(statusnum)
-                save_rundata_db(self.dbh, {run: info}, status=status)
-                if get_run(self.dbh.cursor(), run):
-                    self.text.AppendText(
-                        "    {}: Saved {} data to db.\n".format(filenum, run))
-                else:
-                    self.text.AppendText(
-                        "    {}: {} not saved to db.\n".format(filenum, run))
-            allrundata = get_rundata_from_db(dbh)
-            numruns = len(allrundata)
-            msg = "    {} runs saved".format(numruns)
-            self.notebook.tabOne.ChangeMessage(msg)
-            if numruns:
-                try:
-                    self.text.AppendText("  Updating spreadsheet.\n")
-                    create_excel_spreadsheet(allrundata, self.spreadsheet)
-                    self.text.AppendText(
-                        "      Spreadsheet now contains {} runs\n".format(numruns))
-                except Exception, e:
-                    self.text.AppendText("    ERROR: {}{}\n\n".format(
-                                         type(e).__name__, e))
-        self.text.AppendText("\n")
-
-    def OnCloseMe(self, event):
-        self.Close(True)
-
-    def OnCloseWindow(self, event):
-        self.Destroy()
-        
-class FileDrop(wx.FileDropTarget):
-    def __init__(self, window, notebook):
-        wx.FileDropTarget.__init__(self)
-        self.window = window
-        self.notebook = notebook
-        self.num_runs = 0
-
-    def OnDropFiles(self, x, y, filenames):
-        oldfiles = self.notebook.ReportFiles(include_num=True)
-        oldruns2files = dict([ [get_file_run(f[0],f[1]), f[0]] for f in oldfiles ])
-        runs2files = dict([ [get_file_run(f, self.num_runs+1+i), f] \
-                            for (i,f) in enumerate(filenames) ])
-        for run in sorted(runs2files.keys(), key=stamp_run_sortkey):
-            if run in oldruns2files and oldruns2files[run] == runs2files[run]:
-                continue # no need to update
-            else:
-                self.notebook.DeletePageRun(run)
-            # add new entry
-            try:
-                bcdata = parse_barcode_file(runs2files[run])
-                total, results = analyze_barcode_data(bcdata)
-                self.num_runs += 1
-                run_name = get_file_run(runs2files[run], self.num_runs)
-                title = "{}: {}".format(self.num_runs, run_name)
-                info = {'num': self.num_runs, 'file': runs2files[run],
-                    'run': run_name, 'run_status': args.status,
-                    'total_reads': total, 'bc_counts': results, }
-                # add msg to drop window showing file was processed
-                self.window.AppendText("Barcode counts file {}:    {}\n".format(
-                                   self.num_runs, info['file']))
-                self.notebook.AddResultsTab(info, title=title)
-            except ValueError:
-                self.window.AppendText(
-                    "ERROR Could not parse file: {}\n".format(runs2files[run]))
-
-
-class StampNotebook(fnb.FlatNotebook):
-    def __init__(self, parent, msg=None):
-        fnb.FlatNotebook.__init__(self, parent, id=wx.ID_ANY, size=(500, 170),
-            agwStyle=fnb.FNB_VC8|fnb.FNB_X_ON_TAB|fnb.FNB_NO_X_BUTTON|
-            fnb.FNB_NAV_BUTTONS_WHEN_NEEDED)
-
-        self.tabOne = TabPanel_Text(self, msg=msg)
-        self.AddPage(self.tabOne, "DB content")
-        self.results = ['',]
-        self.entries = ['',]
-        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_CLOSING, self.OnTabClosing)
-        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_DROPPED, self.OnTabDrop)
-
-    def AddResultsTab(self, info, title=None):
-        if not title:
-            num = info['num'] if 'num' in info else ''
-            title = "Run {}".format(num)
-        newTab = TabPanel_Results(self, info)
-        self.AddPage(newTab, title)
-        numpages = self.GetPageCount()
-        self.SetSelection(numpages-1)
-        self.results.append(info)
-
-    def OnTabClosing(self, event):
-        selected = self.GetSelection()
-        res = self.results.pop(selected)
-        ent = self.entries.pop(selected)
-        txt = self.GetPageText(selected)
-        sys.stderr.flush()
-
-    def OnTabDrop(self, event):
-        selected = self.GetSelection()
-        oldselected = event.GetOldSelection()
-        res = self.results.pop(oldselected)
-        ent = self.entries.pop(oldselected)
-        self.results.insert(selected, res)
-        self.entries.insert(selected, ent)
-
-    def ReportFiles(self, include_num=False):
-        """Return list of files in notebook"""
-        reports = []
-        for info in self.results:
-            if not info: continue
-            if 'file' in info:
-                if include_num:
-                    entry = (info['file'], info['num'])
-                else:
-                    entry = info['file']
-                reports.append(entry)
-        return reports
-
-    def DeletePageRun(self, run):
-        """Delete pages where run is given run"""
-        numpages = 0
-        for i, info in enumerate(self.results):
-            if not info: continue
-            if 'run' in info and info['run']==run:
-                self.SetSelection(i)
-                self.DeletePage(i)
-                self.SendSizeEvent()
-                numpages += 1
-        return numpages
-
-class TabPanel_Text(wx.Panel):
-    def __init__(self, parent, msg="\n\n\n\n"):
-        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
-        self.textWidget = wx.StaticText(self, -1, '\n'+msg, pos=(15,10))
-#        font = wx.Font(8, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL,
-#                       wx.FONTWEIGHT_NORMAL)
-#        self.textWidget.SetFont(font)
-
-    def ChangeMessage(self, msg):
-        self.textWidget.Destroy()
-        self.textWidget = wx.StaticText(self, -1, '\n'+msg)
-
-class TabPanel_Results(wx.Panel):
-    def __init__(self, parent, info):
-        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
-
-        runLabel = wx.StaticText(self, -1, "Run:")
-        runname = '' if info['run'].startswith('NoName') else info['run']
-        runEntry = wx.TextCtrl(self, -1, runname)
-        statusLabel = wx.StaticText(self, -1, "Status:")
-        statusEntry = wx.Choice(self, -1, choices=['PASS', 'FAIL'])
-        statusEntry.SetSelection(0 if info['run_status']=='PASS' else 1)
-        parent.entries.append({'run': runEntry, 'run_status': statusEntry})
-        infostr = 'Total reads: {:9d}\n'.format(info['total_reads'])
-        for barcode in info['bc_counts']:
-            count = info['bc_counts'][barcode]['count']
-            perc = count*100.0/info['total_reads']
-            infostr += '{}: {:8d} reads ({:6.4f}%)'.format(
-                        barcode, count, perc)
-            if perc < LIMIT*100.0: 
-                infostr += '    Good\n'
-            else:
-                infostr += '    Above limit!!!\n'
-        infoText = wx.StaticText(self, -1, infostr)
-
-        panelSizer = wx.BoxSizer(wx.VERTICAL)
-        infoSizer = wx.BoxSizer(wx.HORIZONTAL)
-#        infoSizer.Add(infoText, 1, wx.ALL, 8)
-        infoSizer.Add(infoText, 1, wx.EXPAND|wx.ALL, 8)
-        entrySizer = wx.FlexGridSizer(cols=2, hgap=5, vgap=5)
-        entrySizer.AddGrowableCol(1)
-        entrySizer.Add(runLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(runEntry, 0, wx.EXPAND)
-        entrySizer.Add(statusLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
-        entrySizer.Add(statusEntry, 0)
-        panelSizer.Add(entrySizer, 0, wx.EXPAND|wx.ALL, 10)
-        panelSizer.Add(infoSizer, 0, wx.ALIGN_LEFT)
-        self.SetSizer(panelSizer)
-
-def run_gui(dbh, msgs, spreadsheet):
-    msg = '\n'.join(msgs)
-    app = StampWaterBarcode_App(dbh, msg=msg, spreadsheet=spreadsheet)
-    app.MainLoop()
-
 #-----------------------------------------------------------------------------
 
 if __name__=='__main__':
@@ -645,14 +397,21 @@ if __name__=='__main__':
                         help="Directory to find db schema")
     parser.add_argument("--status", default='PASS',
                         help="Status to use for all reports (default: PASS)")
+    parser.add_argument("--journal-mode", default=DB_JOURNAL_MODE,
+                        help="SQLite journal mode for the db.  WAL is "+\
+                             "only safe for a db on a local disk, not on a "+\
+                             "network drive shared between computers "+\
+                             "(default: {})".format(DB_JOURNAL_MODE))
 
     args = parser.parse_args()
     WATERBC = BARCODES.keys()[0]
     spreadsheet = os.path.join(args.datadir, REFS['SPREADSHEET'])
-    dbh, msgs = check_db(args.datadir, args.docsdir)
+    pool, msgs = check_db(args.datadir, args.docsdir, args.journal_mode)
     sys.stderr.write('\n'.join(msgs)+'\n\n')
     if len(args.bc_files)==0:
-        run_gui(dbh, msgs, spreadsheet)
+        # wx is only needed for the GUI so keep it out of command line runs
+        from stamp_water_barcode_gui import run_gui
+        run_gui(pool, msgs, spreadsheet, args.status)
     else:
         outfile = {}
         rundata = {} 
@@ -672,11 +431,11 @@ if __name__=='__main__':
 #            sys.stderr.write("Run: {}\ttotal_reads: {}\tbc_counts: {} {}\n".\
 #                             format(run, total, results, flag))
         if args.save:
-            save_rundata_db(dbh, rundata, status=args.status)
+            save_rundata_db(pool, rundata, status=args.status)
         if args.excel:
-            allrundata = get_rundata_from_db(dbh)
+            allrundata = get_rundata_from_db(pool)
             allrundata.update(rundata)
             create_excel_spreadsheet(allrundata, spreadsheet)
-    dbh.close()
+    pool.close()
 
 
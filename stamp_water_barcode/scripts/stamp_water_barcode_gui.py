@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+
+"""
+wxPython interface for stamp_water_barcode.py.  Only imported when
+stamp_water_barcode.py is started without any barcode counts files.
+"""
+
+import sys
+import wx
+import wx.lib.agw.flatnotebook as fnb
+
+from stamp_water_barcode import LIMIT, VERSION, analyze_barcode_data, \
+     create_excel_spreadsheet, get_file_run, get_run, get_rundata_from_db, \
+     parse_barcode_file, save_rundata_db, stamp_run_sortkey
+
+#----gui.py-------------------------------------------------------------------
+
+class StampWaterBarcode_App(wx.App):
+    def __init__(self, pool, msg=None, spreadsheet=None, status='PASS',
+                 **kwargs):
+        self.pool = pool
+        self.msg = msg
+        self.spreadsheet = spreadsheet
+        self.status = status
+        wx.App.__init__(self, kwargs)
+
+    def OnInit(self):
+        self.frame = StampFrame(self.pool, msg=self.msg,
+                                spreadsheet=self.spreadsheet,
+                                status=self.status)
+        self.frame.Show()
+        self.SetTopWindow(self.frame)
+        return True
+
+class StampFrame(wx.Frame):
+    def __init__(self, pool, msg=None, spreadsheet=None, status='PASS'):
+        wx.Frame.__init__(self, None, title="STAMP Water Barcode v{}".format(
+                          VERSION), size=(550,425))
+        self.pool = pool
+        self.spreadsheet = spreadsheet
+        self.status = status
+        panel = wx.Panel(self)
+        label = wx.StaticText(panel, -1, 
+            "Drop barcode_counts.txt file(s) here:")
+        self.text = wx.TextCtrl(panel,-1, "",style=wx.TE_READONLY|
+                                wx.TE_MULTILINE|wx.HSCROLL)
+        button_save = wx.Button(panel, -1, "Update spreadsheet and DB")
+        save_tooltip = "Update spreadsheet and database with data entered.\n"
+        button_save.SetToolTip(wx.ToolTip(save_tooltip))
+        self.Bind(wx.EVT_BUTTON, self.UpdateSpreadsheetAndDB, button_save)
+        button_quit = wx.Button(panel, -1, "Quit", style=wx.BU_EXACTFIT)
+        self.Bind(wx.EVT_BUTTON, self.OnCloseMe, button_quit)
+        self.Bind(wx.EVT_CLOSE, self.OnCloseWindow)
+        self.notebook = StampNotebook(panel, msg=msg)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(label, 0, wx.ALL, 5)
+        sizer.Add(self.text, 1, wx.EXPAND|wx.ALL, 5)
+        sizer.Add(self.notebook, 0, wx.EXPAND|wx.ALL, 5)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(button_save, 0, wx.ALIGN_CENTER_VERTICAL)
+        button_sizer.AddStretchSpacer()
+        button_sizer.Add(button_quit, 0, wx.ALIGN_CENTER_VERTICAL)
+        sizer.Add(button_sizer, 0, wx.ALL|wx.EXPAND, 5)
+        panel.SetSizer(sizer)
+
+        dt = FileDrop(self.text, self.notebook, self.status)
+        self.text.SetDropTarget(dt)
+
+    def UpdateSpreadsheetAndDB(self, event):
+        self.text.AppendText("\nUpdating data:\n")
+        if not self.notebook.results:
+            self.text.AppendText("  No data to save to db.\n")
+        else:
+            for i, info in enumerate(self.notebook.results):
+                if not info: continue
+                entries = self.notebook.entries[i]
+                run = entries['run'].GetValue()
+                filenum = info['num']
+                if not run:
+                    msg = "    {}: Not saved.".format(filenum)
+                    msg += "  Need run name\n"
+                    self.text.AppendText(msg)
+                    continue
+                statusnum = entries['run_status'].GetSelection()
+                status = entries['run_status'].GetString(statusnum)
+                save_rundata_db(self.pool, {run: info}, status=status)
+                with self.pool.connection() as dbh:
+                    saved = get_run(dbh.cursor(), run)
+                if saved:
+                    self.text.AppendText(
+                        "    {}: Saved {} data to db.\n".format(filenum, run))
+                else:
+                    self.text.AppendText(
+                        "    {}: {} not saved to db.\n".format(filenum, run))
+            allrundata = get_rundata_from_db(self.pool)
+            numruns = len(allrundata)
+            msg = "    {} runs saved".format(numruns)
+            self.notebook.tabOne.ChangeMessage(msg)
+            if numruns:
+                try:
+                    self.text.AppendText("  Updating spreadsheet.\n")
+                    create_excel_spreadsheet(allrundata, self.spreadsheet)
+                    self.text.AppendText(
+                        "      Spreadsheet now contains {} runs\n".format(numruns))
+                except Exception, e:
+                    self.text.AppendText("    ERROR: {}{}\n\n".format(
+                                         type(e).__name__, e))
+        self.text.AppendText("\n")
+
+    def OnCloseMe(self, event):
+        self.Close(True)
+
+    def OnCloseWindow(self, event):
+        self.Destroy()
+        
+class FileDrop(wx.FileDropTarget):
+    def __init__(self, window, notebook, status='PASS'):
+        wx.FileDropTarget.__init__(self)
+        self.window = window
+        self.notebook = notebook
+        self.status = status
+        self.num_runs = 0
+
+    def OnDropFiles(self, x, y, filenames):
+        oldfiles = self.notebook.ReportFiles(include_num=True)
+        oldruns2files = dict([ [get_file_run(f[0],f[1]), f[0]] for f in oldfiles ])
+        runs2files = dict([ [get_file_run(f, self.num_runs+1+i), f] \
+                            for (i,f) in enumerate(filenames) ])
+        for run in sorted(runs2files.keys(), key=stamp_run_sortkey):
+            if run in oldruns2files and oldruns2files[run] == runs2files[run]:
+                continue # no need to update
+            else:
+                self.notebook.DeletePageRun(run)
+            # add new entry
+            try:
+                bcdata = parse_barcode_file(runs2files[run])
+                total, results = analyze_barcode_data(bcdata)
+                self.num_runs += 1
+                run_name = get_file_run(runs2files[run], self.num_runs)
+                title = "{}: {}".format(self.num_runs, run_name)
+                info = {'num': self.num_runs, 'file': runs2files[run],
+                    'run': run_name, 'run_status': self.status,
+                    'total_reads': total, 'bc_counts': results, }
+                # add msg to drop window showing file was processed
+                self.window.AppendText("Barcode counts file {}:    {}\n".format(
+                                   self.num_runs, info['file']))
+                self.notebook.AddResultsTab(info, title=title)
+            except ValueError:
+                self.window.AppendText(
+                    "ERROR Could not parse file: {}\n".format(runs2files[run]))
+
+
+class StampNotebook(fnb.FlatNotebook):
+    def __init__(self, parent, msg=None):
+        fnb.FlatNotebook.__init__(self, parent, id=wx.ID_ANY, size=(500, 170),
+            agwStyle=fnb.FNB_VC8|fnb.FNB_X_ON_TAB|fnb.FNB_NO_X_BUTTON|
+            fnb.FNB_NAV_BUTTONS_WHEN_NEEDED)
+
+        self.tabOne = TabPanel_Text(self, msg=msg)
+        self.AddPage(self.tabOne, "DB content")
+        self.results = ['',]
+        self.entries = ['',]
+        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_CLOSING, self.OnTabClosing)
+        self.Bind(fnb.EVT_FLATNOTEBOOK_PAGE_DROPPED, self.OnTabDrop)
+
+    def AddResultsTab(self, info, title=None):
+        if not title:
+            num = info['num'] if 'num' in info else ''
+            title = "Run {}".format(num)
+        newTab = TabPanel_Results(self, info)
+        self.AddPage(newTab, title)
+        numpages = self.GetPageCount()
+        self.SetSelection(numpages-1)
+        self.results.append(info)
+
+    def OnTabClosing(self, event):
+        selected = self.GetSelection()
+        res = self.results.pop(selected)
+        ent = self.entries.pop(selected)
+        txt = self.GetPageText(selected)
+        sys.stderr.flush()
+
+    def OnTabDrop(self, event):
+        selected = self.GetSelection()
+        oldselected = event.GetOldSelection()
+        res = self.results.pop(oldselected)
+        ent = self.entries.pop(oldselected)
+        self.results.insert(selected, res)
+        self.entries.insert(selected, ent)
+
+    def ReportFiles(self, include_num=False):
+        """Return list of files in notebook"""
+        reports = []
+        for info in self.results:
+            if not info: continue
+            if 'file' in info:
+                if include_num:
+                    entry = (info['file'], info['num'])
+                else:
+                    entry = info['file']
+                reports.append(entry)
+        return reports
+
+    def DeletePageRun(self, run):
+        """Delete pages where run is given run"""
+        numpages = 0
+        for i, info in enumerate(self.results):
+            if not info: continue
+            if 'run' in info and info['run']==run:
+                self.SetSelection(i)
+                self.DeletePage(i)
+                self.SendSizeEvent()
+                numpages += 1
+        return numpages
+
+class TabPanel_Text(wx.Panel):
+    def __init__(self, parent, msg="\n\n\n\n"):
+        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
+        self.textWidget = wx.StaticText(self, -1, '\n'+msg, pos=(15,10))
+#        font = wx.Font(8, wx.FONTFAMILY_TELETYPE, wx.FONTSTYLE_NORMAL,
+#                       wx.FONTWEIGHT_NORMAL)
+#        self.textWidget.SetFont(font)
+
+    def ChangeMessage(self, msg):
+        self.textWidget.Destroy()
+        self.textWidget = wx.StaticText(self, -1, '\n'+msg)
+
+class TabPanel_Results(wx.Panel):
+    def __init__(self, parent, info):
+        wx.Panel.__init__(self, parent=parent, id=wx.ID_ANY)
+
+        runLabel = wx.StaticText(self, -1, "Run:")
+        runname = '' if info['run'].startswith('NoName') else info['run']
+        runEntry = wx.TextCtrl(self, -1, runname)
+        statusLabel = wx.StaticText(self, -1, "Status:")
+        statusEntry = wx.Choice(self, -1, choices=['PASS', 'FAIL'])
+        statusEntry.SetSelection(0 if info['run_status']=='PASS' else 1)
+        parent.entries.append({'run': runEntry, 'run_status': statusEntry})
+        infostr = 'Total reads: {:9d}\n'.format(info['total_reads'])
+        for barcode in info['bc_counts']:
+            count = info['bc_counts'][barcode]['count']
+            perc = count*100.0/info['total_reads']
+            infostr += '{}: {:8d} reads ({:6.4f}%)'.format(
+                        barcode, count, perc)
+            if perc < LIMIT*100.0: 
+                infostr += '    Good\n'
+            else:
+                infostr += '    Above limit!!!\n'
+        infoText = wx.StaticText(self, -1, infostr)
+
+        panelSizer = wx.BoxSizer(wx.VERTICAL)
+        infoSizer = wx.BoxSizer(wx.HORIZONTAL)
+#        infoSizer.Add(infoText, 1, wx.ALL, 8)
+        infoSizer.Add(infoText, 1, wx.EXPAND|wx.ALL, 8)
+        entrySizer = wx.FlexGridSizer(cols=2, hgap=5, vgap=5)
+        entrySizer.AddGrowableCol(1)
+        entrySizer.Add(runLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        entrySizer.Add(runEntry, 0, wx.EXPAND)
+        entrySizer.Add(statusLabel, 0, wx.ALIGN_RIGHT|wx.ALIGN_CENTER_VERTICAL)
+        entrySizer.Add(statusEntry, 0)
+        panelSizer.Add(entrySizer, 0, wx.EXPAND|wx.ALL, 10)
+        panelSizer.Add(infoSizer, 0, wx.ALIGN_LEFT)
+        self.SetSizer(panelSizer)
+
+def run_gui(pool, msgs, spreadsheet, status='PASS'):
+    msg = '\n'.join(msgs)
+    app = StampWaterBarcode_App(pool, msg=msg, spreadsheet=spreadsheet,
+                                status=status)
+    app.MainLoop()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+"""
+Stress test for the shared db access in stamp_common.dbops.
+
+Starts several processes that save water barcode runs to one new db at
+the same time, each opening the db with check_db (a ConnectionPool) and
+saving with save_rundata_db (a write_transaction per run).  Each process
+saves runs of its own and runs shared by all processes, so they race to
+create the db and the same run and barcode rows.  The db is then checked
+against the db made by saving the same runs one process after another.
+
+    python stress_test_db.py [-p PROCESSES] [-r RUNS] [--journal-mode WAL]
+
+Prints PASS and exits 0 if the dbs hold the same data.
+"""
+
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import traceback
+from argparse import ArgumentParser
+
+from stamp_water_barcode import BARCODES, DEFAULT_DOCS_DIR, REFS, check_db, \
+     save_rundata_db
+from stamp_common.dbops import DB_JOURNAL_MODE
+
+SHARED_RUNS = 5 # runs saved by every process
+
+def process_rundata(num, numruns):
+    """Runs saved by process num: numruns runs of its own and the shared
+    runs, with barcode counts that only depend on the run"""
+    runs = [ "STAMP2-{:03d}".format(num*1000 + i) for i in range(numruns) ]
+    runs.extend([ "STAMP2-{:03d}".format(900 + i) \
+                  for i in range(SHARED_RUNS) ])
+    rundata = {}
+    for run in runs:
+        runnum = int(run.split('-')[1])
+        counts = dict([ (barcode, {'count': runnum*10 + i}) \
+                        for i, barcode in \
+                        enumerate(sorted(BARCODES) + ['ACGTACGT']) ])
+        rundata[run] = {'total_reads': runnum*1000, 'bc_counts': counts}
+    return rundata
+
+def save_runs(datadir, num, numruns, journal_mode, start=None):
+    """Open the db and save the runs of process num; waits for start so
+    all processes begin together"""
+    if start is not None:
+        start.wait()
+    stderr = sys.stderr
+    sys.stderr = open(os.devnull, 'w')
+    try:
+        pool, msgs = check_db(datadir, DEFAULT_DOCS_DIR, journal_mode)
+        save_rundata_db(pool, process_rundata(num, numruns))
+        pool.close()
+    finally:
+        sys.stderr.close()
+        sys.stderr = stderr
+
+def save_runs_worker(datadir, num, numruns, journal_mode, start, errors):
+    try:
+        save_runs(datadir, num, numruns, journal_mode, start)
+    except Exception:
+        errors.put((num, traceback.format_exc()))
+        sys.exit(1)
+
+def dump_db(datadir):
+    """Sorted rows of the run, barcode and barcode count tables, with
+    names instead of ids"""
+    dbh = sqlite3.connect(os.path.join(datadir, REFS['SQLITEDB']))
+    cursor = dbh.cursor()
+    cursor.execute("SELECT run_name, total_reads, run_status FROM run")
+    runs = sorted(cursor.fetchall())
+    cursor.execute("SELECT barcode FROM barcode")
+    barcodes = sorted(cursor.fetchall())
+    cursor.execute("SELECT r.run_name, b.barcode, bc.bc_count "+\
+                   "FROM barcode_counts bc, run r, barcode b "+\
+                   "WHERE bc.run_id=r.id AND bc.barcode_id=b.id")
+    counts = sorted(cursor.fetchall())
+    dbh.close()
+    return runs, barcodes, counts
+
+def stress_test(processes, numruns, journal_mode):
+    tmpdir = tempfile.mkdtemp(prefix='stress_test_db')
+    try:
+        serialdir = os.path.join(tmpdir, 'serial')
+        concurrentdir = os.path.join(tmpdir, 'concurrent')
+        os.mkdir(serialdir)
+        os.mkdir(concurrentdir)
+        for num in range(processes):
+            save_runs(serialdir, num, numruns, journal_mode)
+        start = multiprocessing.Event()
+        errors = multiprocessing.Queue()
+        procs = [ multiprocessing.Process(target=save_runs_worker,
+                      args=(concurrentdir, num, numruns, journal_mode,
+                            start, errors)) for num in range(processes) ]
+        for p in procs:
+            p.start()
+        start.set()
+        for p in procs:
+            p.join()
+        failed = [ p for p in procs if p.exitcode ]
+        while not errors.empty():
+            num, error = errors.get()
+            sys.stderr.write("Process {} failed:\n{}".format(num, error))
+        serial = dump_db(serialdir)
+        concurrent = dump_db(concurrentdir)
+        for label, s, c in zip(('runs', 'barcodes', 'barcode counts'),
+                               serial, concurrent):
+            sys.stderr.write("{}: {} serial, {} concurrent\n".format(
+                             label, len(s), len(c)))
+        return not failed and serial==concurrent
+    finally:
+        shutil.rmtree(tmpdir)
+
+if __name__=='__main__':
+    multiprocessing.freeze_support()
+    parser = ArgumentParser(description="Save water barcode runs to one "+\
+                            "db from several processes at once and check "+\
+                            "the db against a serial run.")
+    parser.add_argument("-p", "--processes", type=int, default=6,
+                        help="Number of processes saving runs (default: 6)")
+    parser.add_argument("-r", "--runs", type=int, default=20,
+                        help="Runs of its own saved by each process "+\
+                             "(default: 20)")
+    parser.add_argument("--journal-mode", default=DB_JOURNAL_MODE,
+                        help="SQLite journal mode for the db "+\
+                             "(default: {})".format(DB_JOURNAL_MODE))
+    args = parser.parse_args()
+    if stress_test(args.processes, args.runs, args.journal_mode):
+        print "PASS"
+    else:
+        print "FAIL"
+        sys.exit(1)